@@ -0,0 +1,112 @@
+"""
+Measures address parsing throughput on a corpus of spoken-address variants:
+a new StreetAddressParser per address (as the intents used to do), one
+shared parser, and the memoized parse_address and canonicalize_address of
+address_utils. A request parses a handful of addresses, most of them asked
+about before, so the corpus repeats each address several times in random
+order.
+"""
+
+import argparse
+import itertools
+import random
+import time
+from streetaddress import StreetAddressParser
+import mycity.utilities.address_utils as address_utils
+
+HOUSES = ['1', '46', '100', '1000', '2201']
+STREETS = ['Everdean', 'Dorchester', 'Washington', 'Blue Hill', 'Tremont']
+STREET_TYPES = ['St', 'St.', 'Street', 'street', 'Ave', 'Avenue', 'Rd',
+                'Road']
+SUFFIXES = ['', ' Boston', ', Boston MA', ' 02125', ', Boston, 02122',
+            ' Apt 3']
+
+
+def spoken_variants():
+    """
+    :return: list of distinct ways the addresses of the corpus are said
+    """
+    variants = []
+    for house, street, street_type, suffix in itertools.product(
+            HOUSES, STREETS, STREET_TYPES, SUFFIXES):
+        address = '{} {} {}{}'.format(house, street, street_type, suffix)
+        variants.extend([address, address.lower(), address.upper(),
+                         '  ' + address.replace(' ', '  ')])
+    return variants
+
+
+def make_corpus(size, repeat, seed):
+    """
+    :param size: number of distinct addresses
+    :param repeat: times each address occurs
+    :return: shuffled list of addresses
+    """
+    rng = random.Random(seed)
+    variants = spoken_variants()
+    distinct = rng.sample(variants, min(size, len(variants)))
+    corpus = distinct * repeat
+    rng.shuffle(corpus)
+    return corpus
+
+
+def new_parser_per_address(corpus):
+    for address in corpus:
+        StreetAddressParser().parse(address)
+
+
+def shared_parser(corpus):
+    parser = StreetAddressParser()
+    for address in corpus:
+        parser.parse(address)
+
+
+def memoized_parse(corpus):
+    for address in corpus:
+        address_utils.parse_address(address)
+
+
+def memoized_canonicalize(corpus):
+    for address in corpus:
+        address_utils.canonicalize_address(address)
+
+
+def measure(function, corpus, runs):
+    """
+    :return: addresses per second, the best of runs
+    """
+    best = None
+    for _ in range(runs):
+        address_utils.clear_parse_cache()
+        start = time.perf_counter()
+        function(corpus)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return len(corpus) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--addresses', type=int, default=500,
+                        help='distinct addresses in the corpus')
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='times each address occurs in the corpus')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.addresses, args.repeat, args.seed)
+    print('{} addresses, {} distinct'.format(len(corpus), len(set(corpus))))
+    print('{:<26} {:>14}'.format('method', 'addresses/s'))
+    for name, function in (('new parser per address', new_parser_per_address),
+                           ('shared parser', shared_parser),
+                           ('memoized parse_address', memoized_parse),
+                           ('memoized canonicalize', memoized_canonicalize)):
+        print('{:<26} {:>14,.0f}'.format(name,
+                                         measure(function, corpus, args.runs)))
+    canonical = set(address_utils.canonicalize_address(address)
+                    for address in corpus)
+    print('{} canonical addresses'.format(len(canonical)))
+
+
+if __name__ == '__main__':
+    main()
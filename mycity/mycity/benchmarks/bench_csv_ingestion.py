@@ -0,0 +1,100 @@
+"""
+Compares peak memory and parse time of the old FinderCSV ingestion (decode
+the whole body, splitlines, full csv.DictReader rows) with streaming
+ingestion that keeps only the columns a Finder needs.
+"""
+
+import argparse
+import csv
+import os
+import time
+import tracemalloc
+
+# google_maps_utils reads the API key at import time
+os.environ.setdefault('GOOGLE_MAPS_API_KEY', 'benchmark')
+
+import mycity.intents.intent_constants as intent_constants
+import mycity.utilities.snapshot_utils as snapshot_utils
+from mycity.mycity_request_data_model import MyCityRequestDataModel
+from mycity.utilities.finder.FinderCSV import FinderCSV
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), os.path.pardir,
+                         'test', 'test_data')
+DATASETS = [
+    # (file name, address column, output speech)
+    ('Snow_Emergency_Parking.csv', 'Address',
+     '{Name} at {Address}. {Fee} {Comments} {Phone} {Spaces}'),
+    ('Open_Space.csv', 'ADDRESS', '{SITE_NAME} at {ADDRESS}, {DISTRICT}'),
+]
+
+
+def make_finder(address_key, output_speech):
+    request = MyCityRequestDataModel()
+    request.session_attributes[intent_constants.CURRENT_ADDRESS_KEY] = \
+        '1 City Hall Square'
+    return FinderCSV(request, 'http://localhost/dataset.csv', address_key,
+                     output_speech, lambda record: record)
+
+
+def load_body(file_name, repeat):
+    """
+    Read a test csv and repeat its rows to make a larger file
+
+    :param file_name: name of a file in test/test_data
+    :param repeat: number of copies of the rows to include
+    :return: bytes of the csv file
+    """
+    with open(os.path.join(TEST_DATA, file_name), 'rb') as f:
+        header, rows = f.read().split(b'\n', 1)
+    return header + b'\n' + rows * repeat
+
+
+def linear_ingestion(body, finder):
+    text = body.decode('utf-8-sig')
+    return list(filter(finder._filter,
+                       csv.DictReader(text.splitlines(), delimiter=',')))
+
+
+def streaming_ingestion(body, finder):
+    snapshot = snapshot_utils.Snapshot('http://localhost/dataset.csv', body)
+    return finder.file_to_filtered_records(snapshot.iter_lines())
+
+
+def measure(function, *args):
+    """
+    Time function without tracing (tracemalloc slows allocation down), then
+    run it again under tracemalloc to find its peak memory
+
+    :return: tuple (seconds, peak bytes allocated, number of records)
+    """
+    start = time.perf_counter()
+    records = function(*args)
+    elapsed = time.perf_counter() - start
+    del records
+    tracemalloc.start()
+    records = function(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='copies of each test csv to parse')
+    args = parser.parse_args()
+    print('{:<28} {:>8} {:>10} {:>13} {:>10} {:>13}'.format(
+        'dataset', 'records', 'old (ms)', 'old peak (KB)', 'new (ms)',
+        'new peak (KB)'))
+    for file_name, address_key, output_speech in DATASETS:
+        body = load_body(file_name, args.repeat)
+        finder = make_finder(address_key, output_speech)
+        old_time, old_peak, count = measure(linear_ingestion, body, finder)
+        new_time, new_peak, _ = measure(streaming_ingestion, body, finder)
+        print('{:<28} {:>8} {:>10.1f} {:>13.0f} {:>10.1f} {:>13.0f}'.format(
+            file_name, count, old_time * 1000, old_peak / 1024,
+            new_time * 1000, new_peak / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Measures wall-clock time of google_maps_utils._get_driving_info for a large
+destination set split into different numbers of chunks, against a local
+stand-in for the Distance Matrix API that adds a fixed latency per request
+plus a small latency per element.
+"""
+
+import argparse
+import json
+import os
+import socketserver
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+# google_maps_utils reads the API key at import time
+os.environ.setdefault('GOOGLE_MAPS_API_KEY', 'benchmark')
+
+import mycity.utilities.google_maps_utils as g_maps_utils
+
+
+class StandInServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_latency = 0.1
+    element_latency = 0.001
+
+
+class DistanceMatrixHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        destinations = query['destinations'][0].split('|')
+        time.sleep(self.server.request_latency +
+                   self.server.element_latency * len(destinations))
+        elements = [
+            {'distance': {'value': position, 'text': str(position) + ' mi'},
+             'duration': {'value': position, 'text': str(position) + ' mins'},
+             'status': 'OK'}
+            for position, _ in enumerate(destinations)
+        ]
+        body = json.dumps({'rows': [{'elements': elements}],
+                           'status': 'OK'}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def time_driving_info(destinations, chunk_size, repeat):
+    """
+    :return: best wall-clock seconds of repeat uncached _get_driving_info
+        calls with destinations split into chunks of chunk_size
+    """
+    g_maps_utils.MAX_MATRIX_DESTINATIONS = chunk_size
+    best = None
+    for _ in range(repeat):
+        g_maps_utils._driving_info_cache.clear()
+        start = time.perf_counter()
+        driving_infos = g_maps_utils._get_driving_info(
+            '1 City Hall Square Boston MA', 'Address', destinations
+        )
+        elapsed = time.perf_counter() - start
+        assert len(driving_infos) == len(destinations)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--destinations', type=int, default=200,
+                        help='number of destinations to get driving info to')
+    parser.add_argument('--request-latency', type=float, default=0.1,
+                        help='seconds the stand-in server takes per request')
+    parser.add_argument('--element-latency', type=float, default=0.001,
+                        help='seconds the stand-in server takes per element')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs per chunk count, the best is reported')
+    args = parser.parse_args()
+
+    server = StandInServer(('127.0.0.1', 0), DistanceMatrixHandler)
+    server.request_latency = args.request_latency
+    server.element_latency = args.element_latency
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    g_maps_utils.GOOGLE_MAPS_URL = 'http://127.0.0.1:{}/distancematrix/json' \
+        .format(server.server_address[1])
+    # the stand-in server has no url length limit, so chunk size alone
+    # decides the chunk count
+    g_maps_utils.MAX_URL_LENGTH = float('inf')
+
+    destinations = ['{} Main St Boston, MA'.format(number)
+                    for number in range(args.destinations)]
+    print('{:>8} {:>11} {:>10}'.format('chunks', 'chunk size', 'time (ms)'))
+    chunk_size = args.destinations
+    while chunk_size >= 1:
+        chunk_count = -(-args.destinations // chunk_size)
+        elapsed = time_driving_info(destinations, chunk_size, args.repeat)
+        print('{:>8} {:>11} {:>10.0f}'.format(chunk_count, chunk_size,
+                                              elapsed * 1000))
+        if chunk_size == 1:
+            break
+        chunk_size = max(1, chunk_size // 2)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Measures cold import time of modules in fresh interpreters and the size on
+disk of the packages they come from, e.g. to compare the arcgis package
+with the plain-HTTP FeatureServer client in gis_utils.
+
+    python -m mycity.benchmarks.bench_gis_import \
+        mycity.utilities.gis_utils arcgis.features --path /tmp/arcgis-target
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                            os.path.pardir, os.path.pardir))
+IMPORT_TIMER = ('import time; start = time.perf_counter(); import {}; '
+                'print(time.perf_counter() - start)')
+PACKAGE_LOCATOR = ('import importlib.util; spec = importlib.util.find_spec('
+                   '"{}"); print(spec.submodule_search_locations[0] '
+                   'if spec.submodule_search_locations else spec.origin)')
+
+
+def run_python(python, path, code):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(path + [PROJECT_ROOT])
+    # modules of the skill read these at import time
+    env.setdefault('GOOGLE_MAPS_API_KEY', 'benchmark')
+    env.setdefault('SLACK_WEBHOOKS_URL', 'benchmark')
+    result = subprocess.run([python, '-c', code], env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip()
+
+
+def import_time(python, path, module, runs):
+    """
+    :return: median seconds to import module in a fresh interpreter, None
+        if it can't be imported
+    """
+    times = []
+    for _ in range(runs):
+        output = run_python(python, path, IMPORT_TIMER.format(module))
+        if output is None:
+            return None
+        times.append(float(output))
+    return statistics.median(times)
+
+
+def package_size(python, path, module):
+    """
+    :return: bytes on disk of the top-level package of module, None if it
+        can't be found
+    """
+    location = run_python(python, path,
+                          PACKAGE_LOCATOR.format(module.split('.')[0]))
+    if not location:
+        return None
+    if os.path.isfile(location):
+        return os.path.getsize(location)
+    total = 0
+    for root, _, files in os.walk(location):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('modules', nargs='+', help='modules to import')
+    parser.add_argument('--python', default=sys.executable,
+                        help='interpreter to measure with')
+    parser.add_argument('--path', action='append', default=[],
+                        help='extra directory to import from, e.g. a pip '
+                             'install --target directory')
+    parser.add_argument('--runs', type=int, default=5,
+                        help='imports per module, the median is reported')
+    args = parser.parse_args()
+    print('{:<32} {:>12} {:>16}'.format('module', 'import (ms)',
+                                        'package (KB)'))
+    for module in args.modules:
+        seconds = import_time(args.python, args.path, module, args.runs)
+        size = package_size(args.python, args.path, module)
+        print('{:<32} {:>12} {:>16}'.format(
+            module,
+            'n/a' if seconds is None else '{:.0f}'.format(seconds * 1000),
+            'n/a' if size is None else '{:.0f}'.format(size / 1024)
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Measures sequential HTTPS requests made with a new connection each time, as
+requests.get does, against the pooled connections of http_utils, using a
+local stand-in server with a self-signed certificate. Needs the openssl
+command line tool to create the certificate.
+"""
+
+import argparse
+import os
+import shutil
+import socketserver
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import requests
+import mycity.utilities.http_utils as http_utils
+
+
+class StandInServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    connections = 0
+
+    def get_request(self):
+        connection = super().get_request()
+        self.connections += 1
+        return connection
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # send headers and body together, without waiting for delayed ACKs
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_certificate(directory):
+    """
+    :return: tuple (certificate path, key path) of a self-signed certificate
+        for localhost
+    """
+    certificate = os.path.join(directory, 'cert.pem')
+    key = os.path.join(directory, 'key.pem')
+    subprocess.run(
+        ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes',
+         '-keyout', key, '-out', certificate, '-days', '1',
+         '-subj', '/CN=localhost', '-addext', 'subjectAltName=DNS:localhost'],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    return certificate, key
+
+
+def time_requests(get, url, count, certificate):
+    """
+    :return: seconds taken by count sequential requests made with get
+    """
+    start = time.perf_counter()
+    for _ in range(count):
+        response = get(url, verify=certificate)
+        assert response.status_code == 200
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=200,
+                        help='sequential requests per client')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        certificate, key = make_certificate(directory)
+        server = StandInServer(('127.0.0.1', 0), Handler)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certificate, key)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = 'https://localhost:{}/'.format(server.server_address[1])
+
+        print('{:<22} {:>10} {:>14} {:>12}'.format(
+            'client', 'total (ms)', 'per call (ms)', 'connections'))
+        for name, get in (('requests.get', requests.get),
+                          ('http_utils.get', http_utils.get)):
+            server.connections = 0
+            elapsed = time_requests(get, url, args.requests, certificate)
+            print('{:<22} {:>10.0f} {:>14.2f} {:>12}'.format(
+                name, elapsed * 1000, elapsed * 1000 / args.requests,
+                server.connections
+            ))
+        server.shutdown()
+    finally:
+        http_utils.close()
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
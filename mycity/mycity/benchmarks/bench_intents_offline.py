@@ -0,0 +1,95 @@
+"""
+Measures the latency of every intent that calls an upstream service, run
+end to end through lambda_handler against the local stand-ins of
+mycity.test.stand_ins. Each upstream response is delayed by a lognormal
+draw, and a fraction of requests can be made to fail. Runs are warm (caches
+kept between invocations, as in a warm Lambda container) unless --cold is
+given.
+"""
+
+import argparse
+import logging
+import time
+from mycity.test.stand_ins import alexa, fixtures
+from mycity.test.stand_ins.server import lognormal_latency
+
+
+def percentile(values, fraction):
+    """
+    :return: value below which fraction of the sorted values lie
+    """
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def time_scenario(event, runs, cold):
+    """
+    :return: sorted list of seconds taken by each run, and the number of
+        runs that ran out of time
+    """
+    timings = []
+    timeouts = 0
+    for _ in range(runs):
+        if cold:
+            fixtures.reset_caches()
+        start = time.perf_counter()
+        response = alexa.invoke(event)
+        timings.append(time.perf_counter() - start)
+        # lambda_handler sets up logging again on every call
+        logging.disable(logging.CRITICAL)
+        speech = response['response'].get('outputSpeech', {}).get('text', '')
+        if speech and speech.startswith('Sorry, that is taking longer'):
+            timeouts += 1
+    return sorted(timings), timeouts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=50,
+                        help='invocations per intent')
+    parser.add_argument('--median-latency', type=float, default=0.05,
+                        help='median seconds an upstream takes to respond')
+    parser.add_argument('--sigma', type=float, default=0.75,
+                        help='spread of the lognormal upstream latency')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of upstream requests that fail')
+    parser.add_argument('--cassettes',
+                        help='directory of recorded cassette files, see '
+                             'mycity.test.stand_ins.record')
+    parser.add_argument('--cold', action='store_true',
+                        help='reset every cache before each invocation')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed for the latency and error draws')
+    parser.add_argument('--scenarios', nargs='+',
+                        default=sorted(alexa.SCENARIOS),
+                        choices=sorted(alexa.SCENARIOS))
+    args = parser.parse_args()
+
+    stand_ins = fixtures.make_stand_ins(
+        args.cassettes,
+        latency=lognormal_latency(args.median_latency, args.sigma),
+        error_rate=args.error_rate,
+        seed=args.seed
+    )
+    print('{:<14} {:>8} {:>8} {:>8} {:>8} {:>9}'.format(
+        'intent', 'p50 (ms)', 'p90 (ms)', 'p99 (ms)', 'max (ms)', 'timeouts'))
+    with fixtures.offline_upstreams(stand_ins) as upstreams:
+        for scenario in args.scenarios:
+            timings, timeouts = time_scenario(alexa.SCENARIOS[scenario],
+                                              args.runs, args.cold)
+            print('{:<14} {:>8.0f} {:>8.0f} {:>8.0f} {:>8.0f} {:>9}'.format(
+                scenario, percentile(timings, 0.5) * 1000,
+                percentile(timings, 0.9) * 1000,
+                percentile(timings, 0.99) * 1000, timings[-1] * 1000,
+                timeouts
+            ))
+        requests = {host: stand_in.requests
+                    for host, stand_in in upstreams.items()}
+    logging.disable(logging.NOTSET)
+    print()
+    print('{:<44} {:>9}'.format('upstream', 'requests'))
+    for host, count in requests.items():
+        print('{:<44} {:>9}'.format(host, count))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Compares the memory held by Finder records stored as csv.DictReader rows
+with the compact namedtuple records FinderCSV builds, and the time to find
+the closest record by address with a linear scan and with a RecordStore.
+"""
+
+import argparse
+import csv
+import os
+import random
+import time
+import tracemalloc
+
+# google_maps_utils reads the API key at import time
+os.environ.setdefault('GOOGLE_MAPS_API_KEY', 'benchmark')
+
+import mycity.utilities.csv_utils as csv_utils
+from mycity.utilities.finder.RecordStore import RecordStore
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), os.path.pardir,
+                         'test', 'test_data')
+DATASETS = [
+    # (file name, address column)
+    ('Snow_Emergency_Parking.csv', 'Address'),
+    ('Open_Space.csv', 'ADDRESS'),
+]
+
+
+def load_rows(file_name, repeat):
+    """
+    Read a test csv and repeat its rows, giving each copy its own addresses
+
+    :param file_name: name of a file in test/test_data
+    :param repeat: number of copies of the rows to include
+    :return: tuple (header, list of rows)
+    """
+    with open(os.path.join(TEST_DATA, file_name), encoding='utf-8-sig',
+              newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        rows = [row for row in reader if row]
+    return header, [[value + ' ' + str(copy) for value in row]
+                    for copy in range(repeat) for row in rows]
+
+
+def dict_records(header, rows):
+    return [dict(zip(header, row)) for row in rows]
+
+
+def compact_records(header, rows):
+    make_record = csv_utils.create_mapping_record_model('Record', header)._make
+    return [make_record(row) for row in rows]
+
+
+def measure_memory(function, *args):
+    """
+    :return: tuple (records, bytes still allocated by the records)
+    """
+    tracemalloc.start()
+    records = function(*args)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return records, size
+
+
+def linear_lookup(records, address_key, addresses):
+    for address in addresses:
+        for record in records:
+            if record[address_key] == address:
+                break
+
+
+def indexed_lookup(records, address_key, addresses):
+    store = RecordStore(records, address_key)
+    for address in addresses:
+        store.find_by_address(address)
+
+
+def measure_time(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='copies of each test csv to load')
+    parser.add_argument('--lookups', type=int, default=200,
+                        help='closest-record lookups to time')
+    args = parser.parse_args()
+    generator = random.Random(311)
+    print('{:<28} {:>8} {:>10} {:>13} {:>11} {:>12}'.format(
+        'dataset', 'records', 'dict (KB)', 'compact (KB)', 'scan (ms)',
+        'index (ms)'))
+    for file_name, address_key in DATASETS:
+        header, rows = load_rows(file_name, args.repeat)
+        dicts, dict_size = measure_memory(dict_records, header, rows)
+        compact, compact_size = measure_memory(compact_records, header, rows)
+        addresses = [generator.choice(compact)[address_key]
+                     for _ in range(args.lookups)]
+        scan_time = measure_time(linear_lookup, dicts, address_key,
+                                 addresses)
+        index_time = measure_time(indexed_lookup, compact, address_key,
+                                  addresses)
+        print('{:<28} {:>8} {:>10.0f} {:>13.0f} {:>11.1f} {:>12.1f}'.format(
+            file_name, len(rows), dict_size / 1024, compact_size / 1024,
+            scan_time * 1000, index_time * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Compares k-nearest queries against a cached SpatialIndex with ranking every
+record by great-circle distance on each request (the linear pipeline).
+"""
+
+import argparse
+import random
+import timeit
+import mycity.utilities.geo_utils as geo_utils
+from mycity.utilities.finder.SpatialIndex import SpatialIndex
+
+# bounding box around Boston used to generate synthetic facilities
+MIN_LATITUDE, MAX_LATITUDE = 42.227, 42.397
+MIN_LONGITUDE, MAX_LONGITUDE = -71.191, -70.986
+
+
+def make_records(count, generator):
+    """
+    Generate synthetic facility records shaped like the snow parking csv
+
+    :param count: number of records to generate
+    :param generator: random.Random instance
+    :return: list of record dictionaries
+    """
+    return [
+        {
+            'Address': '{} Fake St'.format(number),
+            'Y': str(generator.uniform(MIN_LATITUDE, MAX_LATITUDE)),
+            'X': str(generator.uniform(MIN_LONGITUDE, MAX_LONGITUDE))
+        }
+        for number in range(count)
+    ]
+
+
+def run(sizes, k, queries, seed):
+    """
+    Time index build and per-query latency for each dataset size
+
+    :param sizes: list of dataset sizes
+    :param k: number of nearest records to find per query
+    :param queries: number of queries to average over
+    :param seed: random seed
+    :return: None
+    """
+    generator = random.Random(seed)
+    print('{:>8} {:>12} {:>14} {:>14} {:>9}'.format(
+        'records', 'build (ms)', 'linear (ms/q)', 'index (ms/q)', 'speedup'))
+    for size in sizes:
+        records = make_records(size, generator)
+        origins = [
+            (generator.uniform(MIN_LATITUDE, MAX_LATITUDE),
+             generator.uniform(MIN_LONGITUDE, MAX_LONGITUDE))
+            for _ in range(queries)
+        ]
+        build_time = timeit.timeit(
+            lambda: SpatialIndex.from_records(records, 'Y', 'X'), number=1
+        )
+        index = SpatialIndex.from_records(records, 'Y', 'X')
+
+        def linear():
+            for origin in origins:
+                ranked, _ = geo_utils.rank_records_by_distance(
+                    origin, records, 'Y', 'X'
+                )
+                ranked[:k]
+
+        def indexed():
+            for origin in origins:
+                index.nearest(origin, k)
+
+        linear_time = timeit.timeit(linear, number=1) / queries
+        index_time = timeit.timeit(indexed, number=1) / queries
+        print('{:>8} {:>12.1f} {:>14.3f} {:>14.3f} {:>8.0f}x'.format(
+            size, build_time * 1000, linear_time * 1000, index_time * 1000,
+            linear_time / index_time))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 50000, 100000])
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=311)
+    args = parser.parse_args()
+    run(args.sizes, args.k, args.queries, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -13,6 +13,7 @@ import errno
 import time
 import re
 import json
+import sys
 
 # path constants
 PROJECT_ROOT = os.path.join(os.getcwd(), os.path.pardir, os.path.pardir)
@@ -23,6 +24,10 @@ INTERACTION_MODEL_REL_PATH = 'platforms/amazon/models/en_US.json'
 INTERACTION_MODEL_PATH = os.path.join(PROJECT_ROOT, INTERACTION_MODEL_REL_PATH)
 MYCITY_PATH = os.path.join(PROJECT_ROOT, 'mycity')
 ZIP_FILE_NAME = "lambda_function.zip"
+# area covered by precomputed nearest-location tables
+# (south, west, north, east)
+BOSTON_BOUNDS = (42.227, -71.191, 42.397, -70.986)
+DEFAULT_TABLE_PRECISION = 6
 HORIZONTAL_RULE = '* ---------------------------------------'
 
 
@@ -99,14 +104,21 @@ def print_package_names(install_output):
         print('*   ' + name, end='\n')
 
 
-def package_lambda_function():
+def package_lambda_function(table_precision=None):
     """
     Creates a temporary directory where the lambda file and all of its
     dependencies are copied before being compressed. Removes the temporary
     directory after creating the .zip file.
 
+    :param table_precision: geohash length of the cells of a snow parking
+        table to build first, so the package ships one made from the current
+        list of lots. None packages the table as it is.
     :return: None
     """
+    if table_precision is not None \
+            and not build_snow_parking_table(table_precision):
+        sys.exit('! Error: Not packaging without the requested snow '
+                 'parking table.')
     print(HORIZONTAL_RULE)
     print('* Creating temporary build directory ... ')
     # remove/create the temporary directory for the zip file's contents
@@ -263,6 +275,59 @@ def update_interaction_model(provided_skill_id):
     print(HORIZONTAL_RULE)
 
 
+def build_snow_parking_table(precision):
+    """
+    Precompute the closest snow emergency parking lot to the center of each
+    geohash cell covering Boston, and the driving distance and time to it,
+    and write the table into the mycity
+    package, so it is shipped with the lambda function. Requires a
+    GOOGLE_MAPS_API_KEY environment variable; the Distance Matrix requests
+    are billed to that key.
+
+    :param precision: length of the geohashes naming the cells. Each extra
+        character makes cells about 4 to 8 times smaller.
+    :return: True if the table was written
+    """
+    if 'GOOGLE_MAPS_API_KEY' not in os.environ:
+        print('! Error: Unable to build snow parking table.\n'
+              '! Please define a GOOGLE_MAPS_API_KEY environment variable.')
+        print(HORIZONTAL_RULE)
+        return False
+    sys.path.insert(0, PROJECT_ROOT)
+    import mycity.intents.snow_parking_intent as snow_parking_intent
+    import mycity.intents.speech_constants.snow_parking_intent as constants
+    import mycity.utilities.geo_utils as geo_utils
+    import mycity.utilities.nearest_table_utils as nearest_table_utils
+    from mycity.utilities.finder.FinderCSV import FinderCSV
+
+    geohashes = geo_utils.get_geohashes_in_bounds(*BOSTON_BOUNDS,
+                                                  precision=precision)
+    print('* Finding the closest snow emergency parking lot for {} cells ...'
+          .format(len(geohashes)))
+    finder = FinderCSV(None,
+                       snow_parking_intent.PARKING_INFO_URL,
+                       snow_parking_intent.ADDRESS_KEY,
+                       constants.OUTPUT_SPEECH_FORMAT,
+                       snow_parking_intent.format_record_fields,
+                       candidate_count=snow_parking_intent.CANDIDATE_LOT_COUNT)
+    origins = []
+    for geohash in geohashes:
+        center = geo_utils.get_geohash_center(geohash)
+        origins.append(('{:.6f},{:.6f}'.format(*center), center))
+    closest_records = (record for _, record in
+                       finder.find_closest_records(origins))
+    table = nearest_table_utils.NearestTable.from_closest_records(
+        precision, zip(geohashes, closest_records)
+    )
+    nearest_table_utils.write_table(snow_parking_intent.PARKING_TABLE_PATH,
+                                    table)
+    print('* Wrote {} cells to {}'.format(
+        len(table), os.path.abspath(snow_parking_intent.PARKING_TABLE_PATH)))
+    print('* DONE')
+    print(HORIZONTAL_RULE)
+    return True
+
+
 def handle_remove_readonly(func, path, execinfo):
     """
     Passed as the onerror parameter when calling shutil.rmtree.
@@ -325,21 +390,47 @@ def main():
              "BOSTON_INFO_SKILL_ID environment variable."
     )
 
+    parser.add_argument(
+        '-s',
+        '--build-snow-parking-table',
+        help="Precomputes the closest snow emergency parking lot for each " +
+             "part of Boston and writes the table into the mycity package. " +
+             "With -p or -f, the table is built before packaging.",
+        action='store_true'
+    )
+
+    parser.add_argument(
+        '--precision',
+        type=int,
+        help="Geohash length of the cells in precomputed tables " +
+             "(default: {}). Implies -s.".format(DEFAULT_TABLE_PRECISION)
+    )
+
     args = parser.parse_args()
 
     is_interaction_model_updated = False
 
+    # the table is only built on request, as it makes billed Distance
+    # Matrix calls for every cell
+    table_precision = None
+    if args.build_snow_parking_table or args.precision is not None:
+        table_precision = args.precision or DEFAULT_TABLE_PRECISION
+    is_packaging = args.function or args.package
+    if table_precision is not None and not is_packaging:
+        if not build_snow_parking_table(table_precision):
+            sys.exit(1)
+
     if args.function:
-        package_lambda_function()
+        package_lambda_function(table_precision)
         update_lambda_code(args.function)
     elif args.package:
-        package_lambda_function()
+        package_lambda_function(table_precision)
     elif args.interaction:
         # Handles the case that we want to update the interaction model without
         # uploading a new lambda zip.
         update_interaction_model(args.interaction)
         is_interaction_model_updated = True
-    else:
+    elif table_precision is None:
         print("No known option selected")
 
     # Handle the interaction model option when we are uploading a zip file.
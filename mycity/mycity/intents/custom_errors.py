@@ -12,6 +12,15 @@ class BadAPIResponse(Exception):
 
 
 class MultipleAddressError(Exception):
-    """Error for finding multiple addresses with the current info"""
-    pass
+    """
+    Error for finding multiple addresses with the current info
+
+    @property: trash_days_by_zip ::= dictionary mapping the zip codes the
+        address was found in to their trash days, for those that could be
+        looked up before asking the user for the zip code
+    """
+
+    def __init__(self, *args, trash_days_by_zip=None):
+        super().__init__(*args)
+        self.trash_days_by_zip = trash_days_by_zip or {}
 
@@ -5,7 +5,7 @@ including bug reports and suggestions for new intents.
 
 from mycity.mycity_response_data_model import MyCityResponseDataModel
 import mycity.intents.speech_constants.feedback_intent as speech_constants
-import requests
+import mycity.utilities.http_utils as http_utils
 import json
 import os
 
@@ -74,7 +74,7 @@ def send_to_slack(message):
     )
     data = json.dumps({'text': message})
     headers = {'Content-Type': 'application/json'}
-    request = requests.post(SLACK_WEBHOOKS_URL, data, headers)
+    request = http_utils.post(SLACK_WEBHOOKS_URL, data, headers=headers)
     return request.status_code
 
 
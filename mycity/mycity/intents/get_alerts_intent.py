@@ -17,10 +17,10 @@ and street cleaning is running on a normal schedule."
 """
 
 from bs4 import BeautifulSoup
-from urllib import request
 from enum import Enum
 from mycity.mycity_response_data_model import MyCityResponseDataModel
 import mycity.intents.speech_constants.get_alerts_intent as constants
+import mycity.utilities.http_utils as http_utils
 import logging
 
 logger = logging.getLogger(__name__)
@@ -44,6 +44,10 @@ class Services(Enum):
 
 # constants for scraping boston.gov                                                                   
 BOSTON_GOV = "https://www.boston.gov"
+# alerts change a few times a day, so the page is served from cache for two
+# minutes and, while it is refreshed, for up to half an hour more
+ALERTS_FRESH_FOR = 2 * 60
+ALERTS_STALE_FOR = 30 * 60
 SERVICE_NAMES = "cds-t t--upper t--sans m-b300"
 SERVICE_INFO = "cds-d t--subinfo"
 HEADER_1 = "t--upper t--sans lh--000 t--cb"
@@ -127,17 +131,17 @@ def prune_normal_responses(service_alerts):
 def get_alerts():
     """
     Checks Boston.gov for alerts, and if present scrapes them and returns
-    them as a dictionary
+    them as a dictionary. Concurrent requests share one fetch of the page,
+    see http_utils.get_cached.
     
     :return: a dictionary that maps alert names to detailed alert message
     """
     logger.debug('')
-
-    # get boston.gov as an httpResponse object
-    url = request.urlopen(BOSTON_GOV)
-    # feed the url object into beautiful soup
-    soup = BeautifulSoup(url, "html.parser")
-    url.close()
+    # get the html of boston.gov
+    page = http_utils.get_cached(BOSTON_GOV, ALERTS_FRESH_FOR,
+                                 ALERTS_STALE_FOR)
+    # feed the page into beautiful soup
+    soup = BeautifulSoup(page, "html.parser")
 
     # parse, sanitize returned strings, place in dictionary
     services = [s.text.strip() for s in soup.find_all(class_= SERVICE_NAMES)]
@@ -3,3 +3,5 @@
 # The key used for the current address in session attributes
 CURRENT_ADDRESS_KEY = "currentAddress"
 ZIP_CODE_KEY = "Zipcode"
+# trash days prefetched for each zip code of an address found in several
+TRASH_DAYS_BY_ZIP_KEY = "trashDaysByZip"
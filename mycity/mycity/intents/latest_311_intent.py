@@ -1,4 +1,5 @@
 import requests
+import mycity.utilities.http_utils as http_utils
 from mycity.mycity_response_data_model import MyCityResponseDataModel
 from mycity.intents.custom_errors import BadAPIResponse
 from mycity.intents.speech_constants.latest_311_constants import *
@@ -7,6 +8,10 @@ DEFAULT_NUMBER_OF_REPORTS = 3
 
 BOSTON_311_URL = "https://data.boston.gov/api/3/action/datastore_search"
 BOSTON_RESOURCE_ID = "2968e2c0-d479-49ba-a884-4ef523ada3c0"
+# new reports come in every few minutes, so a cached list is served for a
+# minute and, while it is refreshed, for up to ten more
+REPORTS_FRESH_FOR = 60
+REPORTS_STALE_FOR = 10 * 60
 
 
 def get_311_requests(mycity_request):
@@ -79,16 +84,18 @@ def get_raw_311_reports_json(number_entries):
         "limit": number_entries
     }
 
-    response = requests.get(data_url, parameters)
-    if response.status_code != requests.codes.ok:
+    try:
+        reports = http_utils.get_cached(data_url, REPORTS_FRESH_FOR,
+                                        REPORTS_STALE_FOR, params=parameters,
+                                        parse=http_utils.get_json)
+    except (requests.exceptions.HTTPError, ValueError):
         raise BadAPIResponse
 
-    if "result" not in response.json() or \
-            "records" not in response.json()["result"]:
+    if "result" not in reports or "records" not in reports["result"]:
         # Unexpected JSON format. Missing expected keys
         raise BadAPIResponse
 
-    return response.json()
+    return reports
 
 
 def build_speech_from_311_report(report):
@@ -1,8 +1,12 @@
 """Alexa intent used to find snow emergency parking"""
 
 
+import os
 import mycity.intents.intent_constants as intent_constants
 import mycity.intents.speech_constants.snow_parking_intent as constants
+import mycity.utilities.deadline_utils as deadline_utils
+import mycity.utilities.nearest_table_utils as nearest_table_utils
+import mycity.utilities.finder.DistanceProvider as distance_providers
 from mycity.utilities.finder.FinderCSV import FinderCSV
 from mycity.mycity_response_data_model import MyCityResponseDataModel
 import logging
@@ -10,6 +14,19 @@ import logging
 PARKING_INFO_URL = "http://bostonopendata-boston.opendata.arcgis.com/datasets/53ebc23fcc654111b642f70e61c63852_0.csv"
 SNOW_PARKING_CARD_TITLE = "Snow Parking"
 ADDRESS_KEY = "Address"
+# number of lots closest to the user in a straight line that we ask Google
+# Maps for driving directions to
+CANDIDATE_LOT_COUNT = 10
+# closest lot for every geohash cell of Boston and the driving distance and
+# time to it from the cell's center, built by deploy_tools.py when the lambda
+# function is packaged
+PARKING_TABLE_PATH = os.path.join(os.path.dirname(__file__), os.path.pardir,
+                                  'data', 'snow_parking_table.bin')
+# longest time in seconds we give the lookup, for when the invocation has
+# no deadline of its own. AWS stops the function after 3 seconds
+PARKING_LOOKUP_DEADLINE = 2.5
+# answers with approximate driving info when Google Maps is too slow
+DRIVING_INFO_ESTIMATE = distance_providers.EstimatedDistanceProvider()
 
 logger = logging.getLogger(__name__)
 
@@ -42,13 +59,22 @@ def get_snow_emergency_parking_intent(mycity_request):
     mycity_response = MyCityResponseDataModel()
     if intent_constants.CURRENT_ADDRESS_KEY in mycity_request.session_attributes:
         finder = FinderCSV(mycity_request, PARKING_INFO_URL, ADDRESS_KEY, 
-                           constants.OUTPUT_SPEECH_FORMAT, format_record_fields)
-        print("Finding snow emergency parking for {}".format(finder.origin_address))
-        finder.start()
+                           constants.OUTPUT_SPEECH_FORMAT, format_record_fields,
+                           candidate_count=CANDIDATE_LOT_COUNT,
+                           fallback_provider=DRIVING_INFO_ESTIMATE)
+        logger.debug('Finding snow emergency parking for ' +
+                     str(finder.origin_address))
+        table = nearest_table_utils.get_table(PARKING_TABLE_PATH)
+        finder.start_concurrently(
+            deadline_utils.get_current_deadline(PARKING_LOOKUP_DEADLINE), table
+        )
         mycity_response.output_speech = finder.get_output_speech()
+        if finder.approximate:
+            mycity_response.output_speech += \
+                " " + constants.ESTIMATED_DRIVING_INFO
 
     else:
-        print("Error: Called snow_parking_intent with no address")
+        logger.error('Called snow_parking_intent with no address')
         mycity_response.output_speech = constants.ERROR_SPEECH
 
     # Setting reprompt_text to None signifies that we do not want to reprompt
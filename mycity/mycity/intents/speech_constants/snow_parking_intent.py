@@ -17,4 +17,8 @@ FEE_PREPARED_STRING = " The fee is {}. "
 NO_PHONE = ""
 NO_FEE = " There is no fee. "
 
+# added when the driving info was estimated rather than asked of Google Maps
+ESTIMATED_DRIVING_INFO = ("Driving directions were not available, so the "
+                          "distance and time are estimates.")
+
 ERROR_SPEECH = "I need a valid address to find the closest parking"
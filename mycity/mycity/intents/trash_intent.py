@@ -3,11 +3,20 @@ Functions for Alexa responses related to trash day
 """
 from .custom_errors import \
     InvalidAddressError, BadAPIResponse, MultipleAddressError
-from streetaddress import StreetAddressParser
 from mycity.mycity_response_data_model import MyCityResponseDataModel
 from mycity.intents.user_address_intent import clear_address_from_mycity_object
+import concurrent.futures
+import datetime
+import os
 import re
+import tempfile
+import threading
 import requests
+import mycity.utilities.address_utils as address_utils
+import mycity.utilities.cache_utils as cache_utils
+import mycity.utilities.deadline_utils as deadline_utils
+import mycity.utilities.http_utils as http_utils
+import mycity.utilities.invocation_utils as invocation_utils
 from . import intent_constants
 import mycity.intents.speech_constants.trash_intent as speech_constants
 import logging
@@ -16,6 +25,45 @@ logger = logging.getLogger(__name__)
 
 DAY_CODE_REGEX = r'\d+A? - '
 CARD_TITLE = "Trash Day"
+# seconds ReCollect's suggestions for an address are reused. The places
+# behind an address practically never change
+ADDRESS_CACHE_TTL = 30 * 24 * 60 * 60
+# /tmp on Lambda, which survives for as long as the container does
+ADDRESS_CACHE_PATH = os.path.join(tempfile.gettempdir(),
+                                  'mycity_recollect_addresses.sqlite3')
+# addresses kept in the cache file, which shares /tmp's 512 MB
+MAX_CACHED_ADDRESSES = 50000
+# seconds the zone of a ReCollect place is reused
+PLACE_ZONE_TTL = 7 * 24 * 60 * 60
+# seconds the pickup days of a zone are reused. Once they expire, the next
+# request in the zone asks ReCollect again, which also finds holiday shifts
+ZONE_SCHEDULE_TTL = 24 * 60 * 60
+MAX_CACHED_PLACES = 4096
+MAX_CACHED_ZONES = 256
+# zip codes whose trash days are looked up at once when an address is
+# found in several
+MAX_CONCURRENT_PREFETCHES = 4
+# seconds the zip code prompt waits for those lookups. The user may never
+# pick most of the zip codes, so they don't get the invocation's whole
+# budget
+PREFETCH_BUDGET = 0.5
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday',
+            'Saturday', 'Sunday')
+
+_address_cache = cache_utils.PersistentCache(
+    cache_utils.SQLiteStorage(ADDRESS_CACHE_PATH, MAX_CACHED_ADDRESSES,
+                              ADDRESS_CACHE_TTL),
+    ADDRESS_CACHE_TTL
+)
+# place -> zone id, and zone id -> tuple of pickup days. Thousands of
+# addresses share a zone, so most requests need no ReCollect call for them
+_place_zones = cache_utils.LRUCache(MAX_CACHED_PLACES, PLACE_ZONE_TTL)
+_zone_schedules = cache_utils.LRUCache(MAX_CACHED_ZONES, ZONE_SCHEDULE_TTL)
+
+# the thread pool lives in module scope so threads are reused across warm
+# Lambda invocations
+_prefetch_executor = None
+_pool_lock = threading.Lock()
 
 
 def get_trash_day_info(mycity_request):
@@ -33,8 +81,7 @@ def get_trash_day_info(mycity_request):
             mycity_request.session_attributes[intent_constants.CURRENT_ADDRESS_KEY]
 
         # grab relevant information from session address
-        address_parser = StreetAddressParser()
-        a = address_parser.parse(current_address)
+        a = address_utils.parse_address(current_address)
         # currently assumes that trash day is the same for all units at
         # the same street address
         address = str(a['house']) + " " + str(a['street_full'])
@@ -46,7 +93,11 @@ def get_trash_day_info(mycity_request):
             zip_code = mycity_request.session_attributes[zip_code_key]
 
         try:
-            trash_days = get_trash_and_recycling_days(address, zip_code)
+            trash_days = get_prefetched_trash_days(
+                mycity_request.session_attributes, address, zip_code
+            )
+            if trash_days is None:
+                trash_days = get_trash_and_recycling_days(address, zip_code)
             trash_days_speech = build_speech_from_list_of_days(trash_days)
 
             mycity_response.output_speech = speech_constants.PICK_UP_DAY.format(trash_days_speech)
@@ -67,7 +118,13 @@ def get_trash_day_info(mycity_request):
 
         except BadAPIResponse:
             mycity_response.output_speech = speech_constants.BAD_API_RESPONSE
-        except MultipleAddressError:
+        except MultipleAddressError as e:
+            if e.trash_days_by_zip:
+                mycity_request.session_attributes[
+                    intent_constants.TRASH_DAYS_BY_ZIP_KEY] = {
+                        'address': address,
+                        'days': e.trash_days_by_zip
+                    }
             mycity_response.output_speech = speech_constants.MULTIPLE_ADDRESS_ERROR.format(address)
             mycity_response.dialog_directive = "ElicitSlotZipCode"
 
@@ -96,23 +153,220 @@ def get_trash_and_recycling_days(address, zip_code=None):
     :raises: InvalidAddressError, BadAPIResponse
     """
     logger.debug('address: ' + str(address) + ', zip_code: ' + str(zip_code))
-    api_params = get_address_api_info(address, zip_code)
-    if not api_params:
-        raise InvalidAddressError
+    try:
+        api_params = get_address_api_info(address, zip_code)
+        if not api_params:
+            raise InvalidAddressError
+
+        if not validate_found_address(api_params["name"], address):
+            logger.debug("InvalidAddressError")
+            raise InvalidAddressError
+
+        return get_place_trash_days(api_params)
+    except http_utils.CircuitOpen:
+        # ReCollect is down, don't wait for it
+        logger.warning('ReCollect circuit is open')
+        raise BadAPIResponse
+    except requests.exceptions.Timeout:
+        # answered by the controller as running out of time
+        raise
+    except requests.exceptions.RequestException as e:
+        logger.warning('ReCollect request failed: ' + str(e))
+        raise BadAPIResponse
+
+
+def get_place_trash_days(api_parameters):
+    """
+    Determines the trash and recycling days of a ReCollect place, from the
+    cached schedule of its zone if there is one
 
-    if not validate_found_address(api_params["name"], address):
-        logger.debug("InvalidAddressError")
-        raise InvalidAddressError
+    :param api_parameters: Parameters for ReCollect API of the place
+    :return: array containing next trash and recycling days
+    :raises: BadAPIResponse, http_utils.CircuitOpen
+    """
+    place_key = get_place_key(api_parameters)
+    trash_and_recycling_days = get_cached_trash_days(place_key)
+    if trash_and_recycling_days is not None:
+        return trash_and_recycling_days
 
-    trash_data = get_trash_day_data(api_params)
+    trash_data = get_trash_day_data(api_parameters)
     if not trash_data:
         raise BadAPIResponse
 
     trash_and_recycling_days = get_trash_days_from_trash_data(trash_data)
+    cache_trash_days(place_key, trash_data, trash_and_recycling_days)
 
     return trash_and_recycling_days
 
 
+def get_prefetched_trash_days(session_attributes, address, zip_code):
+    """
+    Gets the trash days prefetched for address and zip_code by the turn
+    that asked the user for their zip code, and forgets them
+
+    :param session_attributes: session attributes of the request
+    :param address: Street number and name provided by user
+    :param zip_code: zip code provided by user, or None
+    :return: array containing trash and recycling days, None if none were
+        prefetched
+    """
+    prefetched = session_attributes.get(intent_constants.TRASH_DAYS_BY_ZIP_KEY)
+    if not prefetched or not zip_code or prefetched.get('address') != address:
+        return None
+    trash_days = prefetched.get('days', {}).get(zip_code)
+    if trash_days is not None:
+        logger.debug('Using prefetched trash days for ' + zip_code)
+        del session_attributes[intent_constants.TRASH_DAYS_BY_ZIP_KEY]
+    return trash_days
+
+
+def prefetch_trash_days(address, address_request_json, unique_zip_codes):
+    """
+    Looks up the trash days of the address in every zip code it was found
+    in at once, so the answer is ready when the user says their zip code.
+    Zip codes whose lookup fails or doesn't finish within PREFETCH_BUDGET
+    seconds are left out; a lookup still running goes on filling the zone
+    schedule cache, so the next turn may find it there.
+
+    :param address: Street number and name provided by user
+    :param address_request_json: json object returned from ReCollect address
+        request service
+    :param unique_zip_codes: dictionary with zip code keys and value list of
+        indexes with that zip code, see find_unique_zipcodes
+    :return: dictionary mapping zip codes to arrays of trash days
+    """
+    candidates = {}
+    for zip_code, indexes in unique_zip_codes.items():
+        api_params = address_request_json[indexes[0]]
+        if validate_found_address(api_params["name"], address):
+            candidates[zip_code] = api_params
+    executor = _get_prefetch_executor()
+    futures = {invocation_utils.submit(executor, get_place_trash_days,
+                                       api_params): zip_code
+               for zip_code, api_params in candidates.items()}
+    done, _ = concurrent.futures.wait(
+        futures,
+        timeout=deadline_utils.get_current_deadline(
+            limit=PREFETCH_BUDGET
+        ).remaining()
+    )
+
+    trash_days_by_zip = {}
+    for future in done:
+        try:
+            trash_days_by_zip[futures[future]] = future.result()
+        except Exception as e:
+            logger.debug('Could not prefetch trash days for ' +
+                         futures[future] + ': ' + str(e))
+    return trash_days_by_zip
+
+
+def _get_prefetch_executor():
+    """
+    Return the thread pool that prefetches trash days
+
+    :return: concurrent.futures.ThreadPoolExecutor
+    """
+    global _prefetch_executor
+    if _prefetch_executor is None:
+        with _pool_lock:
+            if _prefetch_executor is None:
+                _prefetch_executor = concurrent.futures.ThreadPoolExecutor(
+                    MAX_CONCURRENT_PREFETCHES
+                )
+    return _prefetch_executor
+
+
+def get_place_key(api_parameters):
+    """
+    :param api_parameters: Parameters for ReCollect API of a place
+    :return: hashable key identifying the place
+    """
+    return (api_parameters.get('service_id'), api_parameters.get('parcel_id'),
+            api_parameters.get('place_id'))
+
+
+def get_cached_trash_days(place_key):
+    """
+    Gets the pickup days of a place from the schedule of its zone, if both
+    the place's zone and the zone's schedule are cached
+
+    :param place_key: key of the place, see get_place_key
+    :return: list of days trash and recycling are picked up, None if they
+        are not cached
+    """
+    zone_id = _place_zones.get(place_key)
+    if zone_id is None:
+        return None
+    trash_days = _zone_schedules.get(zone_id)
+    if trash_days is None:
+        return None
+    logger.debug('Using cached schedule of zone ' + str(zone_id))
+    return list(trash_days)
+
+
+def cache_trash_days(place_key, trash_data, trash_days):
+    """
+    Remembers the zone of a place and the pickup days of the zone. While the
+    next pickup of the zone is shifted off its usual days, e.g. by a
+    holiday, the zone's schedule is dropped instead so the zone keeps
+    asking ReCollect until the shift has passed.
+
+    :param place_key: key of the place, see get_place_key
+    :param trash_data: Trash data provided from ReCollect API
+    :param trash_days: days the zone's trash and recycling are picked up
+    :return: None
+    """
+    try:
+        zone_id = trash_data["next_event"]["zone"]["id"]
+        next_pickup = trash_data["next_event"]["day"]
+    except KeyError:
+        return
+    _place_zones.set(place_key, zone_id)
+    if is_shifted_pickup(next_pickup, trash_days):
+        logger.debug('Pickup of zone ' + str(zone_id) + ' on ' +
+                     str(next_pickup) + ' is shifted')
+        _zone_schedules.delete(zone_id)
+    else:
+        _zone_schedules.set(zone_id, tuple(trash_days))
+
+
+def is_shifted_pickup(pickup_day, trash_days):
+    """
+    :param pickup_day: date of a pickup as "YYYY-MM-DD"
+    :param trash_days: days pickups usually happen, e.g. ["Tuesday", "Friday"]
+    :return: True if the pickup isn't on one of its usual days
+    """
+    usual_days = [day.capitalize() for day in trash_days
+                  if day.capitalize() in WEEKDAYS]
+    if not usual_days:
+        # the zone's days could not be read, so there is nothing to compare
+        return False
+    try:
+        weekday = datetime.datetime.strptime(pickup_day, '%Y-%m-%d').weekday()
+    except (TypeError, ValueError):
+        return True
+    return WEEKDAYS[weekday] not in usual_days
+
+
+def get_schedule_cache_stats():
+    """
+    :return: tuple of dictionaries with hits, misses, evictions and size of
+        the cached zones of places and of the cached schedules of zones
+    """
+    return _place_zones.stats(), _zone_schedules.stats()
+
+
+def clear_schedule_cache():
+    """
+    Forget every cached zone and zone schedule
+
+    :return: None
+    """
+    _place_zones.clear()
+    _zone_schedules.clear()
+
+
 def find_unique_zipcodes(address_request_json):
     """
     Finds unique zip codes in a provided address request json returned
@@ -147,9 +401,8 @@ def validate_found_address(found_address, user_provided_address):
     """
     logger.debug('found_address: ' + str(found_address) +
                  'user_provided_address: ' + str(user_provided_address))
-    address_parser = StreetAddressParser()
-    found_address = address_parser.parse(found_address)
-    user_provided_address = address_parser.parse(user_provided_address)
+    found_address = address_utils.parse_address(found_address)
+    user_provided_address = address_utils.parse_address(user_provided_address)
 
     if found_address["house"] != user_provided_address["house"]:
         return False
@@ -193,20 +446,13 @@ def get_address_api_info(address, provided_zip_code):
         'name': value
     }
 
+    :raises: MultipleAddressError with the prefetched trash days of each
+        zip code if the address is found in several and provided_zip_code
+        is None
     """
     logger.debug('address: ' + address +
                  'provided_zip_code: ' + str(provided_zip_code))
-    base_url = "https://recollect.net/api/areas/" \
-               "Boston/services/310/address-suggest"
-    url_params = {'q': address, 'locale': 'en-US'}
-    request_result = requests.get(base_url, url_params)
-
-    if request_result.status_code != requests.codes.ok:
-        logger.debug('Error getting ReCollect API info. Got response: {}'
-                     .format(request_result.status_code))
-        return {}
-
-    result_json = request_result.json()
+    result_json = get_address_suggestions(address)
     if not result_json:
         return {}
 
@@ -220,11 +466,62 @@ def get_address_api_info(address, provided_zip_code):
             else:
                 return {}
 
-        raise MultipleAddressError
+        raise MultipleAddressError(trash_days_by_zip=prefetch_trash_days(
+            address, result_json, unique_zip_codes
+        ))
 
     return result_json[0]
 
 
+def get_address_suggestions(address):
+    """
+    Gets the places ReCollect suggests for an address, for every zip code
+    it is found in. Suggestions are cached by address, so a repeat question
+    about the same address doesn't ask ReCollect again.
+
+    :param address: Address to get suggestions for
+    :return: list of JSON objects with the API parameters of each place,
+        empty if ReCollect found none or failed
+    """
+    key = address_utils.canonicalize_address(address)
+    suggestions = _address_cache.get(key)
+    if suggestions is not None:
+        logger.debug('Using cached ReCollect suggestions for ' + key)
+        return suggestions
+
+    base_url = "https://recollect.net/api/areas/" \
+               "Boston/services/310/address-suggest"
+    url_params = {'q': address, 'locale': 'en-US'}
+    request_result = http_utils.get_hedged(base_url, url_params)
+
+    if request_result.status_code != requests.codes.ok:
+        logger.debug('Error getting ReCollect API info. Got response: {}'
+                     .format(request_result.status_code))
+        return []
+
+    suggestions = request_result.json()
+    if suggestions:
+        _address_cache.set(key, suggestions)
+    return suggestions
+
+
+def get_address_cache_stats():
+    """
+    :return: dictionary with hits, misses and size of the cache of
+        ReCollect address suggestions
+    """
+    return _address_cache.stats()
+
+
+def clear_address_cache():
+    """
+    Forget every cached ReCollect address suggestion
+
+    :return: None
+    """
+    _address_cache.clear()
+
+
 def get_trash_day_data(api_parameters):
     """
     Gets the trash day data from ReCollect using the provided API parameters
@@ -238,7 +535,7 @@ def get_trash_day_data(api_parameters):
         api_parameters["formatted_address"] = api_parameters.pop("name")
 
     base_url = "https://recollect.net/api/places"
-    request_result = requests.get(base_url, api_parameters)
+    request_result = http_utils.get_hedged(base_url, api_parameters)
 
     if request_result.status_code != requests.codes.ok:
         logger.debug("Error getting trash info from ReCollect API info. " \
@@ -4,7 +4,7 @@ Functions for setting and getting the current user address
 
 from . import intent_constants
 from mycity.mycity_response_data_model import MyCityResponseDataModel
-import requests
+import mycity.utilities.http_utils as http_utils
 import logging
 
 logger = logging.getLogger(__name__)
@@ -58,7 +58,7 @@ def get_address_from_user_device(mycity_request):
         "/settings/address".format(mycity_request.device_id)
     head_info = {'Accept': 'application/json',
                 'Authorization': 'Bearer {}'.format(mycity_request.api_access_token)}
-    response_object = requests.get(base_url, headers=head_info)
+    response_object = http_utils.get(base_url, headers=head_info)
 
     if response_object.status_code == 200:
         res = response_object.json()
@@ -136,4 +136,7 @@ def clear_address_from_mycity_object(mycity_object):
         del(mycity_object.session_attributes[
             intent_constants.CURRENT_ADDRESS_KEY])
 
+    mycity_object.session_attributes.pop(
+        intent_constants.TRASH_DAYS_BY_ZIP_KEY, None)
+
     return mycity_object
\ No newline at end of file
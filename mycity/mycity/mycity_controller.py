@@ -4,6 +4,7 @@ Controller for mycity voice app.
 This class handles all voice requests.
 """
 
+import requests
 from mycity.mycity_response_data_model import MyCityResponseDataModel
 from .intents.user_address_intent import set_address_in_session, \
     get_address_from_session, request_user_address_response, \
@@ -15,6 +16,7 @@ from .intents.get_alerts_intent import get_alerts_intent
 from .intents.snow_parking_intent import get_snow_emergency_parking_intent
 from .intents.feedback_intent import submit_feedback
 from .intents import intent_constants
+import mycity.utilities.deadline_utils as deadline_utils
 import logging
 
 logger = logging.getLogger(__name__)
@@ -25,6 +27,10 @@ def execute_request(mycity_request):
     Route the incoming request based on type (LaunchRequest, IntentRequest,
     etc.) The JSON body of the request is provided in the event parameter.
 
+    Requests that run out of time, either because the invocation deadline
+    passed or because an upstream service did not answer in time, get
+    get_timeout_response instead of failing.
+
     :param mycity_request: MyCityRequestDataModel object
     :return: MyCityRequestDataModel object corresponding to the request_type
     """
@@ -42,15 +48,20 @@ def execute_request(mycity_request):
     #         "amzn1.echo-sdk-ams.app.[unique-value-here]"):
     #     raise ValueError("Invalid Application ID")
 
-    if mycity_request.is_new_session:
-        mycity_request = on_session_started(mycity_request)
+    try:
+        if mycity_request.is_new_session:
+            mycity_request = on_session_started(mycity_request)
 
-    if mycity_request.request_type == "LaunchRequest":
-        return on_launch(mycity_request)
-    elif mycity_request.request_type == "IntentRequest":
-        return on_intent(mycity_request)
-    elif mycity_request.request_type == "SessionEndedRequest":
-        return on_session_ended(mycity_request)
+        if mycity_request.request_type == "LaunchRequest":
+            return on_launch(mycity_request)
+        elif mycity_request.request_type == "IntentRequest":
+            return on_intent(mycity_request)
+        elif mycity_request.request_type == "SessionEndedRequest":
+            return on_session_ended(mycity_request)
+    except (deadline_utils.DeadlineExceeded, requests.exceptions.Timeout):
+        logger.warning('Ran out of time for intent: ' +
+                       str(mycity_request.intent_name))
+        return get_timeout_response(mycity_request)
 
 
 def on_session_started(mycity_request):
@@ -182,6 +193,26 @@ def get_help_response(mycity_request):
 
 
 
+def get_timeout_response(mycity_request):
+    """
+    Apologizes for not answering in time. Used for any request that runs
+    out of time, so the session stays open and the user can simply ask
+    again.
+
+    :param mycity_request: MyCityRequestDataModel object
+    :return: MyCityResponseDataModel object
+    """
+    logger.debug('')
+    mycity_response = MyCityResponseDataModel()
+    mycity_response.session_attributes = mycity_request.session_attributes
+    mycity_response.card_title = "Boston Info"
+    mycity_response.output_speech = \
+        "Sorry, that is taking longer than expected. Please try again."
+    mycity_response.reprompt_text = None
+    mycity_response.should_end_session = False
+    return mycity_response
+
+
 def get_welcome_response(mycity_request):
     """
     Welcomes the user and sets initial session attributes. Is triggered on
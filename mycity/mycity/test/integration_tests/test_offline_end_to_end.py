@@ -0,0 +1,169 @@
+import copy
+import json
+import logging
+import time
+import unittest
+import mycity.intents.intent_constants as intent_constants
+import mycity.intents.trash_intent as trash_intent
+import mycity.test.test_constants as test_constants
+import mycity.utilities.http_utils as http_utils
+from mycity.test.stand_ins import alexa, fixtures
+from mycity.test.stand_ins.cassette import Cassette
+from mycity.test.stand_ins.server import StandIn, running
+import mycity.intents.speech_constants.snow_parking_intent as \
+    snow_parking_speech
+import mycity.intents.speech_constants.trash_intent as trash_speech
+
+
+##############################################################################
+# Every intent that calls an upstream service, run through lambda_handler    #
+# against local stand-ins of the upstream services                           #
+##############################################################################
+
+class OfflineEndToEndTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # lambda_handler sets up logging at DEBUG level on every call
+        self.root_handlers = list(logging.root.handlers)
+        self.root_level = logging.root.level
+        logging.disable(logging.CRITICAL)
+        self.stand_ins = fixtures.make_stand_ins()
+        self.offline = fixtures.offline_upstreams(self.stand_ins)
+        self.upstreams = self.offline.__enter__()
+
+    def tearDown(self):
+        self.offline.__exit__(None, None, None)
+        logging.disable(logging.NOTSET)
+        logging.root.handlers = self.root_handlers
+        logging.root.setLevel(self.root_level)
+
+    def _speech(self, scenario, context=None):
+        response = alexa.invoke(alexa.SCENARIOS[scenario], context)
+        return response['response']['outputSpeech']['text']
+
+    def test_launch_reads_device_address(self):
+        response = alexa.invoke(alexa.SCENARIOS['launch'])
+        self.assertEqual('866 Huntington ave',
+                         response['sessionAttributes']['currentAddress'])
+
+    def test_trash_day(self):
+        self.assertIn('Friday', self._speech('trash_day'))
+        self.assertEqual(2, self.upstreams[fixtures.RECOLLECT_HOST].requests)
+
+    def test_repeat_trash_day_needs_no_recollect_calls(self):
+        self._speech('trash_day')
+        self.assertIn('Friday', self._speech('trash_day'))
+        self.assertEqual(2, self.upstreams[fixtures.RECOLLECT_HOST].requests)
+
+    def test_expired_schedule_reuses_address_suggestions(self):
+        self._speech('trash_day')
+        trash_intent.clear_schedule_cache()
+        self.assertIn('Friday', self._speech('trash_day'))
+        self.assertEqual(3, self.upstreams[fixtures.RECOLLECT_HOST].requests)
+
+    def test_zip_code_turn_answers_from_prefetched_trash_days(self):
+        places = []
+        for parcel_id, zip_code in ((1, '02125'), (2, '02126')):
+            place = copy.deepcopy(test_constants.GET_ADDRESS_API_MOCK)
+            place['parcel_id'] = parcel_id
+            place['name'] = '1000 Dorchester Ave, Boston, ' + zip_code
+            places.append(place)
+        self.upstreams[fixtures.RECOLLECT_HOST].route(
+            'GET', '/api/areas/Boston/services/310/address-suggest',
+            lambda query, body: (200, fixtures.JSON_HEADERS,
+                                 json.dumps(places).encode())
+        )
+        first = alexa.invoke(alexa.SCENARIOS['trash_day'])
+        self.assertEqual(
+            trash_speech.MULTIPLE_ADDRESS_ERROR.format(alexa.ADDRESS),
+            first['response']['outputSpeech']['text']
+        )
+        self.assertEqual(3, self.upstreams[fixtures.RECOLLECT_HOST].requests)
+
+        # the next turn may run in another container
+        trash_intent.clear_address_cache()
+        trash_intent.clear_schedule_cache()
+        second = alexa.invoke(alexa.intent_request(
+            'TrashDayIntent', {'Zipcode': '02126'},
+            first['sessionAttributes']
+        ))
+        self.assertIn('Friday', second['response']['outputSpeech']['text'])
+        self.assertEqual(3, self.upstreams[fixtures.RECOLLECT_HOST].requests)
+        self.assertNotIn(intent_constants.TRASH_DAYS_BY_ZIP_KEY,
+                         second['sessionAttributes'])
+
+    def test_trash_day_writes_upstream_metrics(self):
+        _, records = alexa.invoke_with_metrics(alexa.SCENARIOS['trash_day'])
+        upstreams = {record['Upstream']: record for record in records
+                     if 'Upstream' in record}
+        self.assertEqual(2, upstreams['ReCollect']['Requests'])
+        self.assertEqual(2, len(upstreams['ReCollect']['Latency']))
+
+    def test_snow_parking(self):
+        speech = self._speech('snow_parking')
+        self.assertIn('Municipal Lot', speech)
+        self.assertIn('mi away', speech)
+        self.assertNotIn(snow_parking_speech.ESTIMATED_DRIVING_INFO, speech)
+
+    def test_alerts(self):
+        self.assertIn('Godzilla inbound', self._speech('alerts'))
+
+    def test_latest_311(self):
+        self.assertIn("Jamie's House", self._speech('latest_311'))
+
+    def test_feedback(self):
+        self._speech('feedback')
+        self.assertEqual(1, self.upstreams[fixtures.SLACK_HOST].requests)
+
+    def test_trash_day_while_recollect_is_down(self):
+        self.upstreams[fixtures.RECOLLECT_HOST].error_rate = 1.0
+        for _ in range(http_utils.CIRCUIT_FAILURE_THRESHOLD):
+            alexa.invoke(alexa.SCENARIOS['trash_day'])
+        requests_before = self.upstreams[fixtures.RECOLLECT_HOST].requests
+        self.assertEqual(trash_speech.BAD_API_RESPONSE,
+                         self._speech('trash_day'))
+        self.assertEqual(requests_before,
+                         self.upstreams[fixtures.RECOLLECT_HOST].requests)
+
+    def test_trash_day_while_recollect_drops_connections(self):
+        recollect = self.upstreams[fixtures.RECOLLECT_HOST]
+        recollect.error_rate = 1.0
+        recollect.error_status = None
+        for _ in range(http_utils.CIRCUIT_FAILURE_THRESHOLD - 1):
+            requests_before = recollect.requests
+            self.assertEqual(trash_speech.BAD_API_RESPONSE,
+                             self._speech('trash_day'))
+            # the circuit is still closed, so ReCollect was asked
+            self.assertLess(requests_before, recollect.requests)
+
+    def test_snow_parking_estimates_when_google_maps_is_slow(self):
+        def slow_distance_matrix(query, body):
+            time.sleep(2)
+            return 503, {}, b''
+
+        self.upstreams[fixtures.GOOGLE_MAPS_HOST].route(
+            'GET', '/maps/api/distancematrix/json', slow_distance_matrix
+        )
+        speech = self._speech('snow_parking', alexa.LambdaContext(1))
+        self.assertIn('about', speech)
+        self.assertIn(snow_parking_speech.ESTIMATED_DRIVING_INFO, speech)
+
+
+class RecordModeTestCase(unittest.TestCase):
+
+    def test_responses_are_recorded_and_replayed(self):
+        upstream = StandIn('upstream.test')
+        upstream.cassette.add('GET', '/a', {'q': '1'}, 200, 'recorded',
+                              {'Content-Type': 'text/plain'})
+        with running([upstream]):
+            recorder = StandIn(upstream.base_url.split('//')[1],
+                               record=True, scheme='http')
+            with running([recorder]):
+                response = http_utils.get(upstream.base_url + '/a',
+                                          params={'q': '1'})
+        self.assertEqual('recorded', response.text)
+        replayed = Cassette(recorder.cassette.interactions)
+        self.assertEqual(
+            (200, {'Content-Type': 'text/plain'}, b'recorded'),
+            replayed.find('GET', '/a', 'q=1')
+        )
@@ -49,13 +49,20 @@ class SnowEmergencyTestCase(mix_ins.RepromptTextTestMixIn,
                 'mycity.utilities.finder.Finder.g_maps_utils._get_driving_info',
                 return_value=mock_get_driving_info_return
             )
+        self.geocode_patch = \
+            mock.patch(
+                'mycity.utilities.finder.Finder.g_maps_utils.geocode_address',
+                return_value=None
+            )
         self.mock_filtered_record.start()
         self.get_driving_info_patch.start()
+        self.geocode_patch.start()
 
     def tearDown(self):
         super().tearDown()
         self.csv_file.close()
         self.mock_filtered_record.stop()
         self.get_driving_info_patch.stop()
+        self.geocode_patch.stop()
 
 
@@ -1,8 +1,12 @@
+import copy
+import threading
 import unittest.mock as mock
 import mycity.test.test_constants as test_constants
 import mycity.test.integration_tests.intent_base_case as base_case
 import mycity.test.integration_tests.intent_test_mixins as mix_ins
 import mycity.intents.trash_intent as trash_intent
+import mycity.intents.speech_constants.trash_intent as speech_constants
+import mycity.utilities.http_utils as http_utils
 
 
 ###################################
@@ -24,6 +28,7 @@ class TrashDayTestCase(mix_ins.RepromptTextTestMixIn,
         Patching out the functions in TrashDayIntent that use requests.get
         """
         super().setUp()
+        trash_intent.clear_schedule_cache()
         self.get_address_api_patch = \
             mock.patch('mycity.intents.trash_intent.get_address_api_info',
                        return_value = test_constants.GET_ADDRESS_API_MOCK)
@@ -37,4 +42,65 @@ class TrashDayTestCase(mix_ins.RepromptTextTestMixIn,
         super().tearDown()
         self.get_address_api_patch.stop()
         self.get_trash_day_data_patch.stop()
+        trash_intent.clear_schedule_cache()
 
+    def test_recollect_circuit_open(self):
+        self.get_address_api_patch.stop()
+        with mock.patch('mycity.intents.trash_intent.get_address_api_info',
+                        side_effect=http_utils.CircuitOpen):
+            response = self.controller.on_intent(self.request)
+        self.get_address_api_patch.start()
+        self.assertEqual(speech_constants.BAD_API_RESPONSE,
+                         response.output_speech)
+
+    def test_zone_schedule_is_reused(self):
+        self.controller.on_intent(self.request)
+        with mock.patch('mycity.intents.trash_intent.get_trash_day_data') \
+                as get_trash_day_data:
+            response = self.controller.on_intent(self.request)
+        get_trash_day_data.assert_not_called()
+        self.assertIn('Friday', response.output_speech)
+
+    def test_shifted_pickup_is_not_cached(self):
+        shifted = copy.deepcopy(test_constants.GET_TRASH_DAY_MOCK)
+        # the Saturday after a Friday holiday
+        shifted['next_event']['day'] = '2018-05-05'
+        self.get_trash_day_data_patch.stop()
+        with mock.patch('mycity.intents.trash_intent.get_trash_day_data',
+                        return_value=shifted) as get_trash_day_data:
+            self.controller.on_intent(self.request)
+            self.controller.on_intent(self.request)
+        self.get_trash_day_data_patch.start()
+        self.assertEqual(2, get_trash_day_data.call_count)
+
+    def test_is_shifted_pickup(self):
+        self.assertFalse(trash_intent.is_shifted_pickup(
+            '2018-05-01', ['Tuesday', 'Friday']))
+        self.assertTrue(trash_intent.is_shifted_pickup(
+            '2018-05-02', ['Tuesday', 'Friday']))
+        self.assertFalse(trash_intent.is_shifted_pickup(
+            '2018-05-02', ['Unknown']))
+
+    def test_prefetch_does_not_wait_for_slow_zip_codes(self):
+        release = threading.Event()
+
+        def get_place_trash_days(api_params):
+            if api_params['zip'] == '02116':
+                release.wait(5)
+            return ['Monday']
+
+        suggestions = [{'name': '46 Everdean St', 'zip': '02122'},
+                       {'name': '46 Everdean St', 'zip': '02116'}]
+        unique_zip_codes = {'02122': [0], '02116': [1]}
+        try:
+            with mock.patch.object(trash_intent, 'PREFETCH_BUDGET', 0.05), \
+                    mock.patch.object(trash_intent, 'validate_found_address',
+                                      return_value=True), \
+                    mock.patch.object(trash_intent, 'get_place_trash_days',
+                                      side_effect=get_place_trash_days):
+                trash_days_by_zip = trash_intent.prefetch_trash_days(
+                    '46 Everdean St', suggestions, unique_zip_codes
+                )
+        finally:
+            release.set()
+        self.assertEqual({'02122': ['Monday']}, trash_days_by_zip)
@@ -0,0 +1,17 @@
+"""
+Local stand-ins for the upstream services of the skill (ReCollect, Google
+Maps, CKAN, boston.gov, the ArcGIS open data site, Slack and the Alexa
+device address API), so intents can run end to end, and be benchmarked,
+on a machine without network access.
+
+    with fixtures.offline_upstreams():
+        alexa.invoke(alexa.intent_request('GetAlertsIntent'))
+
+"""
+
+import os
+
+# the skill reads these when it is imported; no real request is made offline
+os.environ.setdefault('GOOGLE_MAPS_API_KEY', 'stand-in')
+os.environ.setdefault('SLACK_WEBHOOKS_URL',
+                      'https://hooks.slack.com/services/STAND/IN/WEBHOOK')
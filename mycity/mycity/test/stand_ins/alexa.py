@@ -0,0 +1,163 @@
+"""
+Alexa events for driving the skill through the Lambda entry point, the way
+the Alexa service calls it
+
+"""
+
+import contextlib
+import copy
+import importlib.util
+import io
+import json
+import os
+import time
+
+
+LAMBDA_FUNCTION_PATH = os.path.join(
+    os.path.dirname(__file__), os.path.pardir, os.path.pardir, os.path.pardir,
+    'platforms', 'amazon', 'lambda', 'custom', 'lambda_function.py'
+)
+DEVICE_ID = 'amzn1.ask.device.STANDIN'
+ADDRESS = '1000 Dorchester Ave'
+# seconds AWS gives the function to run
+LAMBDA_TIMEOUT = 3
+
+_lambda_function = None
+
+
+class LambdaContext(object):
+
+    """
+    The part of the AWS LambdaContext the skill uses
+
+    @property: timeout ::= seconds the invocation may run
+
+    """
+
+    def __init__(self, timeout=LAMBDA_TIMEOUT, clock=time.monotonic):
+        """
+        :param timeout: seconds the invocation may run
+        :param clock: function returning the current time in seconds
+        """
+        self.timeout = timeout
+        self._clock = clock
+        self._started_at = clock()
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self.timeout - (self._clock() - self._started_at))
+                          * 1000))
+
+
+def intent_request(intent_name, slots=None, attributes=None, new=False):
+    """
+    :param intent_name: name of the intent, e.g. "TrashDayIntent"
+    :param slots: dictionary mapping slot names to their values
+    :param attributes: session attributes; by default the session knows
+        ADDRESS as the user's address
+    :param new: True if the request starts the session
+    :return: Alexa IntentRequest event
+    """
+    if attributes is None:
+        attributes = {'currentAddress': ADDRESS}
+    event = _event('IntentRequest', attributes, new)
+    event['request']['intent'] = {
+        'name': intent_name,
+        'slots': {name: {'name': name, 'value': value}
+                  for name, value in (slots or {}).items()}
+    }
+    return event
+
+
+def launch_request():
+    """
+    :return: Alexa LaunchRequest event that starts a session
+    """
+    return _event('LaunchRequest', {}, True)
+
+
+def _event(request_type, attributes, new):
+    return {
+        'version': '1.0',
+        'session': {
+            'new': new,
+            'sessionId': 'amzn1.echo-api.session.STANDIN',
+            'application': {'applicationId': 'amzn1.ask.skill.STANDIN'},
+            'attributes': dict(attributes)
+        },
+        'context': {
+            'System': {
+                'device': {'deviceId': DEVICE_ID},
+                'apiAccessToken': 'stand-in-token'
+            }
+        },
+        'request': {
+            'type': request_type,
+            'requestId': 'amzn1.echo-api.request.STANDIN',
+            'locale': 'en-US'
+        }
+    }
+
+
+# one event per intent that calls an upstream service
+SCENARIOS = {
+    'launch': launch_request(),
+    'trash_day': intent_request('TrashDayIntent'),
+    'snow_parking': intent_request('SnowParkingIntent'),
+    'alerts': intent_request('GetAlertsIntent'),
+    'latest_311': intent_request('LatestThreeOneOne'),
+    'feedback': intent_request('FeedbackIntent', {
+        'FeedbackType': 'suggestion',
+        'Feedback': 'tell me when the library opens'
+    })
+}
+
+
+def get_lambda_function():
+    """
+    The Lambda entry point isn't inside a package, so it is loaded from its
+    file
+
+    :return: the lambda_function module
+    """
+    global _lambda_function
+    if _lambda_function is None:
+        spec = importlib.util.spec_from_file_location(
+            'lambda_function', os.path.normpath(LAMBDA_FUNCTION_PATH)
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _lambda_function = module
+    return _lambda_function
+
+
+def invoke(event, context=None):
+    """
+    Call lambda_handler the way the Alexa service does, see
+    invoke_with_metrics
+
+    :param event: Alexa event
+    :param context: LambdaContext, a new one if None
+    :return: response JSON object
+    """
+    return invoke_with_metrics(event, context)[0]
+
+
+def invoke_with_metrics(event, context=None):
+    """
+    Call lambda_handler the way the Alexa service does. The skill modifies
+    the session attributes it is given, so it gets a copy of event. The
+    metric lines it writes to stdout are returned instead of printed.
+
+    :param event: Alexa event
+    :param context: LambdaContext, a new one if None
+    :return: tuple (response JSON object, list of EMF records)
+    """
+    if context is None:
+        context = LambdaContext()
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        response = get_lambda_function().lambda_handler(copy.deepcopy(event),
+                                                        context)
+    records = [json.loads(line) for line in output.getvalue().splitlines()
+               if line.startswith('{')]
+    return response, records
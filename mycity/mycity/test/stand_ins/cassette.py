@@ -0,0 +1,141 @@
+"""
+Recorded upstream responses, saved as JSON cassette files so stand-in
+servers can replay them offline
+
+"""
+
+import base64
+import json
+import threading
+import urllib.parse
+
+
+class Cassette(object):
+
+    """
+    Thread-safe list of recorded requests and the responses they got. A
+    cassette file looks like:
+
+    {
+        "interactions": [
+            {
+                "request": {"method": "GET", "path": "/api/places",
+                            "query": {"q": ["1000 Dorchester Ave"]}},
+                "response": {"status": 200,
+                             "headers": {"Content-Type": "application/json"},
+                             "body": "..."}
+            }
+        ]
+    }
+
+    Bodies that aren't UTF-8 text are stored base64 encoded under
+    "body_base64" instead of "body".
+
+    @property: interactions ::= list of recorded interactions, as above
+
+    """
+
+    def __init__(self, interactions=None):
+        """
+        :param interactions: list of interactions, as stored in a cassette
+            file
+        """
+        self.interactions = list(interactions or [])
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.interactions)
+
+    @classmethod
+    def load(cls, path):
+        """
+        :param path: path of a cassette file
+        :return: Cassette
+        """
+        with open(path, encoding='utf-8') as cassette_file:
+            return cls(json.load(cassette_file)['interactions'])
+
+    def save(self, path):
+        """
+        :param path: path to write the cassette file to
+        :return: None
+        """
+        with self._lock:
+            interactions = list(self.interactions)
+        with open(path, 'w', encoding='utf-8') as cassette_file:
+            json.dump({'interactions': interactions}, cassette_file,
+                      indent=2, sort_keys=True)
+
+    def add(self, method, path, query, status, body, headers=None):
+        """
+        Record an interaction
+
+        :param method: HTTP method of the request, e.g. "GET"
+        :param path: path of the request url
+        :param query: query string of the request url, or a dictionary of
+            url parameters
+        :param status: status code of the response
+        :param body: body of the response, bytes or str
+        :param headers: dictionary of response headers to replay
+        :return: None
+        """
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        response = {'status': status, 'headers': dict(headers or {})}
+        try:
+            response['body'] = body.decode('utf-8')
+        except UnicodeDecodeError:
+            response['body_base64'] = base64.b64encode(body).decode('ascii')
+        interaction = {
+            'request': {'method': method.upper(), 'path': path,
+                        'query': _parse_query(query)},
+            'response': response
+        }
+        with self._lock:
+            self.interactions.append(interaction)
+
+    def find(self, method, path, query):
+        """
+        Find the response recorded for a request. Method and path must
+        match; of the interactions that do, the one sharing the most url
+        parameters with the request wins, the earliest one on a tie.
+
+        :param method: HTTP method of the request
+        :param path: path of the request url
+        :param query: query string of the request url, or a dictionary of
+            url parameters
+        :return: tuple (status, headers, body bytes), None if nothing was
+            recorded for method and path
+        """
+        query = _parse_query(query)
+        best, best_score = None, -1
+        with self._lock:
+            for interaction in self.interactions:
+                request = interaction['request']
+                if request['method'] != method.upper() \
+                        or request['path'] != path:
+                    continue
+                score = sum(1 for key, values in request['query'].items()
+                            if query.get(key) == values)
+                if score > best_score:
+                    best, best_score = interaction, score
+        if best is None:
+            return None
+        response = best['response']
+        if 'body_base64' in response:
+            body = base64.b64decode(response['body_base64'])
+        else:
+            body = response.get('body', '').encode('utf-8')
+        return response['status'], dict(response.get('headers', {})), body
+
+
+def _parse_query(query):
+    """
+    :param query: query string or dictionary of url parameters
+    :return: dictionary mapping each parameter to its list of values
+    """
+    if isinstance(query, str):
+        return urllib.parse.parse_qs(query, keep_blank_values=True)
+    return {str(key): [str(v) for v in value]
+            if isinstance(value, (list, tuple)) else [str(value)]
+            for key, value in (query or {}).items()}
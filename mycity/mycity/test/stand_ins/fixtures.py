@@ -0,0 +1,257 @@
+"""
+Stand-ins for every upstream of the skill, answering from cassettes built
+from the fixtures in test_data and test_constants, or from cassette files
+recorded with mycity.test.stand_ins.record
+
+"""
+
+import ast
+import contextlib
+import json
+import os
+import shutil
+import tempfile
+import urllib.parse
+import unittest.mock as mock
+import mycity.intents.feedback_intent as feedback_intent
+import mycity.intents.get_alerts_intent as get_alerts_intent
+import mycity.intents.latest_311_intent as latest_311_intent
+import mycity.intents.snow_parking_intent as snow_parking_intent
+import mycity.intents.trash_intent as trash_intent
+import mycity.test.test_constants as test_constants
+import mycity.test.test_data.latest_311_fake_data as latest_311_fake_data
+import mycity.utilities.address_utils as address_utils
+import mycity.utilities.cache_utils as cache_utils
+import mycity.utilities.finder.RecordStore as record_store
+import mycity.utilities.finder.SpatialIndex as spatial_index
+import mycity.utilities.google_maps_utils as g_maps_utils
+import mycity.utilities.http_utils as http_utils
+import mycity.utilities.metrics_utils as metrics_utils
+import mycity.utilities.snapshot_utils as snapshot_utils
+from mycity.test.stand_ins import alexa
+from mycity.test.stand_ins.cassette import Cassette
+from mycity.test.stand_ins.server import StandIn, running
+
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), os.path.pardir,
+                             'test_data')
+SLACK_WEBHOOKS_URL = 'https://hooks.slack.com/services/STAND/IN/WEBHOOK'
+RECOLLECT_HOST = 'recollect.net'
+GOOGLE_MAPS_HOST = urllib.parse.urlsplit(g_maps_utils.GOOGLE_MAPS_URL).netloc
+BOSTON_311_HOST = urllib.parse.urlsplit(latest_311_intent.BOSTON_311_URL).netloc
+BOSTON_GOV_HOST = urllib.parse.urlsplit(get_alerts_intent.BOSTON_GOV).netloc
+OPEN_DATA_HOST = urllib.parse.urlsplit(
+    snow_parking_intent.PARKING_INFO_URL).netloc
+SLACK_HOST = urllib.parse.urlsplit(SLACK_WEBHOOKS_URL).netloc
+ALEXA_API_HOST = 'api.amazonalexa.com'
+UPSTREAM_HOSTS = (RECOLLECT_HOST, GOOGLE_MAPS_HOST, BOSTON_311_HOST,
+                  BOSTON_GOV_HOST, OPEN_DATA_HOST, SLACK_HOST, ALEXA_API_HOST)
+# where 1000 Dorchester Ave is, the address the Alexa events use
+ORIGIN_LOCATION = {'lat': 42.3162, 'lng': -71.0567}
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+
+def _json(data):
+    return json.dumps(data).encode('utf-8')
+
+
+def _read_test_data(name):
+    with open(os.path.join(TEST_DATA_DIR, name), 'rb') as data_file:
+        return data_file.read()
+
+
+def _read_python_literal(name):
+    """
+    Read a test_data file holding a Python literal, skipping # comments
+    """
+    lines = _read_test_data(name).decode('utf-8').splitlines()
+    return ast.literal_eval('\n'.join(
+        line for line in lines if not line.startswith('#')
+    ))
+
+
+def _alerts_page():
+    """
+    :return: boston.gov front page markup carrying the alerts of
+        test_constants.GET_ALERTS_MOCK_SOME_ALERTS
+    """
+    alerts = dict(test_constants.GET_ALERTS_MOCK_SOME_ALERTS)
+    header = alerts.pop('Alert header')
+    services = ''.join(
+        '<div class="{}">{}</div><div class="{}">{}</div>'.format(
+            get_alerts_intent.SERVICE_NAMES, service,
+            get_alerts_intent.SERVICE_INFO, info
+        )
+        for service, info in alerts.items()
+    )
+    return (
+        '<html><body><div class="{}">{}</div><div class="{}">Stay inside'
+        '</div><div class="{}">Updates will follow.</div>{}</body></html>'
+        .format(get_alerts_intent.HEADER_1, header.rstrip('!'),
+                get_alerts_intent.HEADER_2, get_alerts_intent.HEADER_3,
+                services)
+    ).encode('utf-8')
+
+
+def distance_matrix_responder():
+    """
+    Answer Distance Matrix requests for any origins and destinations with
+    the elements of the response recorded in test_data
+
+    :return: responder for StandIn.route
+    """
+    recorded = _read_python_literal('google_maps_json_response')
+    elements = recorded['rows'][0]['elements']
+
+    def respond(query, body):
+        origins = query.get('origins', [''])[0].split('|')
+        destinations = query.get('destinations', [''])[0].split('|')
+        return 200, JSON_HEADERS, _json({
+            'origin_addresses': origins,
+            'destination_addresses': destinations,
+            'rows': [
+                {'elements': [elements[i % len(elements)]
+                              for i in range(len(destinations))]}
+                for _ in origins
+            ],
+            'status': 'OK'
+        })
+
+    return respond
+
+
+def default_cassettes():
+    """
+    :return: dictionary mapping each upstream host to a Cassette built from
+        the test fixtures
+    """
+    cassettes = {host: Cassette() for host in UPSTREAM_HOSTS}
+    cassettes[RECOLLECT_HOST].add(
+        'GET', '/api/areas/Boston/services/310/address-suggest', {}, 200,
+        _json([test_constants.GET_ADDRESS_API_MOCK]), JSON_HEADERS
+    )
+    cassettes[RECOLLECT_HOST].add(
+        'GET', '/api/places', {}, 200,
+        _json(test_constants.GET_TRASH_DAY_MOCK), JSON_HEADERS
+    )
+    cassettes[GOOGLE_MAPS_HOST].add(
+        'GET', urllib.parse.urlsplit(g_maps_utils.GOOGLE_GEOCODING_URL).path,
+        {}, 200,
+        _json({'results': [{'geometry': {'location': ORIGIN_LOCATION}}],
+               'status': 'OK'}),
+        JSON_HEADERS
+    )
+    cassettes[BOSTON_311_HOST].add(
+        'GET', urllib.parse.urlsplit(latest_311_intent.BOSTON_311_URL).path,
+        {}, 200, _json(latest_311_fake_data.FAKE_JSON_RESPONSE_3),
+        JSON_HEADERS
+    )
+    cassettes[BOSTON_GOV_HOST].add(
+        'GET', '/', {}, 200, _alerts_page(),
+        {'Content-Type': 'text/html; charset=utf-8'}
+    )
+    cassettes[OPEN_DATA_HOST].add(
+        'GET', urllib.parse.urlsplit(snow_parking_intent.PARKING_INFO_URL).path,
+        {}, 200, _read_test_data('Snow_Emergency_Parking.csv'),
+        {'Content-Type': 'text/csv; charset=utf-8', 'ETag': '"stand-in"'}
+    )
+    cassettes[SLACK_HOST].add(
+        'POST', urllib.parse.urlsplit(SLACK_WEBHOOKS_URL).path, {}, 200, 'ok'
+    )
+    cassettes[ALEXA_API_HOST].add(
+        'GET', '/v1/devices/{}/settings/address'.format(alexa.DEVICE_ID), {},
+        200, _json(test_constants.ALEXA_DEVICE_ADDRESS), JSON_HEADERS
+    )
+    return cassettes
+
+
+def make_stand_ins(cassette_dir=None, latency=None, error_rate=0.0,
+                   seed=None):
+    """
+    Create a stand-in for every upstream host. A host with a cassette file
+    in cassette_dir, named <host>.json, replays that file; the others
+    replay the default cassettes.
+
+    :param cassette_dir: directory of recorded cassette files, or None
+    :param latency: latency function for every stand-in, or a dictionary
+        mapping hosts to latency functions
+    :param error_rate: fraction of failed requests for every stand-in, or a
+        dictionary mapping hosts to fractions
+    :param seed: seed for the latency and error draws
+    :return: list of StandIn
+    """
+    defaults = default_cassettes()
+    stand_ins = []
+    for number, host in enumerate(UPSTREAM_HOSTS):
+        path = os.path.join(cassette_dir or '', host + '.json')
+        recorded = cassette_dir is not None and os.path.exists(path)
+        stand_in = StandIn(
+            host,
+            Cassette.load(path) if recorded else defaults[host],
+            latency=latency.get(host) if isinstance(latency, dict)
+            else latency,
+            error_rate=error_rate.get(host, 0.0)
+            if isinstance(error_rate, dict) else error_rate,
+            seed=None if seed is None else seed + number
+        )
+        if host == GOOGLE_MAPS_HOST and not recorded:
+            stand_in.route('GET',
+                           urllib.parse.urlsplit(g_maps_utils.GOOGLE_MAPS_URL)
+                           .path,
+                           distance_matrix_responder())
+        stand_ins.append(stand_in)
+    return stand_ins
+
+
+def reset_caches():
+    """
+    Forget everything the skill keeps between invocations, so the next one
+    runs cold
+
+    :return: None
+    """
+    http_utils.clear_cache()
+    http_utils.close()
+    snapshot_utils.clear_snapshots(remove_files=True)
+    record_store.clear_store_cache()
+    spatial_index.clear_index_cache()
+    g_maps_utils._driving_info_cache.clear()
+    trash_intent.clear_address_cache()
+    trash_intent.clear_schedule_cache()
+    address_utils.clear_parse_cache()
+    metrics_utils.clear_metrics()
+
+
+@contextlib.contextmanager
+def offline_upstreams(stand_ins=None):
+    """
+    Run the skill against stand-ins for the duration of a with block.
+    Snapshots and the ReCollect address cache go to a temporary directory,
+    feedback to the Slack stand-in, and the caches are reset on the way in
+    and out.
+
+    :param stand_ins: list of StandIn, make_stand_ins() if None
+    :return: context manager yielding a dictionary mapping each host to its
+        StandIn
+    """
+    snapshot_dir = tempfile.mkdtemp()
+    address_cache = cache_utils.PersistentCache(
+        cache_utils.SQLiteStorage(os.path.join(snapshot_dir,
+                                               'addresses.sqlite3'),
+                                  trash_intent.MAX_CACHED_ADDRESSES,
+                                  trash_intent.ADDRESS_CACHE_TTL),
+        trash_intent.ADDRESS_CACHE_TTL
+    )
+    with mock.patch.object(snapshot_utils, 'SNAPSHOT_DIR', snapshot_dir), \
+            mock.patch.object(trash_intent, '_address_cache', address_cache), \
+            mock.patch.object(feedback_intent, 'SLACK_WEBHOOKS_URL',
+                              SLACK_WEBHOOKS_URL):
+        reset_caches()
+        try:
+            with running(stand_ins if stand_ins is not None
+                         else make_stand_ins()) as upstreams:
+                yield upstreams
+        finally:
+            reset_caches()
+            address_cache.storage.close()
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
@@ -0,0 +1,61 @@
+"""
+Record the responses of the real upstream services into cassette files, by
+running scenarios of alexa.SCENARIOS through lambda_handler with every
+stand-in in record mode. Needs network access, and a real key in
+GOOGLE_MAPS_API_KEY for the Google Maps responses. Feedback and launch are
+not recorded by default: one would post to Slack, the other needs a real
+Alexa access token.
+
+    (PROJECT_ROOT)$ python -m mycity.test.stand_ins.record CASSETTE_DIR
+
+Replay the cassettes with fixtures.make_stand_ins(CASSETTE_DIR), or with
+--cassettes in mycity.benchmarks.bench_intents_offline.
+"""
+
+import argparse
+import logging
+import os
+from mycity.test.stand_ins import alexa, fixtures
+from mycity.test.stand_ins.server import StandIn
+
+DEFAULT_SCENARIOS = ('trash_day', 'snow_parking', 'alerts', 'latest_311')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.
+                                     RawDescriptionHelpFormatter)
+    parser.add_argument('cassette_dir',
+                        help='directory the cassette files are written to')
+    parser.add_argument('--scenarios', nargs='+', default=DEFAULT_SCENARIOS,
+                        choices=sorted(alexa.SCENARIOS),
+                        help='scenarios to run')
+    args = parser.parse_args()
+
+    os.makedirs(args.cassette_dir, exist_ok=True)
+    stand_ins = [StandIn(host, record=True)
+                 for host in fixtures.UPSTREAM_HOSTS]
+    with fixtures.offline_upstreams(stand_ins):
+        for scenario in args.scenarios:
+            try:
+                response = alexa.invoke(alexa.SCENARIOS[scenario])
+            except Exception as e:
+                # keep what the other scenarios record
+                print('{:<14} failed: {!r}'.format(scenario, e))
+                continue
+            finally:
+                logging.disable(logging.INFO)
+            speech = response['response'].get('outputSpeech', {})
+            print('{:<14} {}'.format(scenario, speech.get('text')))
+    logging.disable(logging.NOTSET)
+
+    for stand_in in stand_ins:
+        if len(stand_in.cassette):
+            path = os.path.join(args.cassette_dir, stand_in.host + '.json')
+            stand_in.cassette.save(path)
+            print('{:<44} {:>3} responses -> {}'.format(
+                stand_in.host, len(stand_in.cassette), path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+"""
+Local HTTP servers that stand in for the upstream services of the skill.
+Each StandIn answers for one upstream host from a cassette, optionally with
+added latency and errors, or records the real host's responses into its
+cassette. Starting a StandIn points http_utils at it with a host override.
+
+"""
+
+import contextlib
+import math
+import random
+import socketserver
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import requests
+import mycity.utilities.http_utils as http_utils
+from mycity.test.stand_ins.cassette import Cassette
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# request headers passed on to the real host in record mode
+RECORDED_REQUEST_HEADERS = ('Accept', 'Authorization', 'Content-Type')
+# response headers kept in cassettes, the others describe the transfer
+RECORDED_RESPONSE_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+# url parameters holding credentials, which are not saved in cassettes
+SCRUBBED_PARAMETERS = ('key',)
+# seconds between checks for a shutdown request, which stop waits for
+POLL_INTERVAL = 0.01
+
+
+def constant_latency(seconds):
+    """
+    :param seconds: delay of every response
+    :return: latency function for StandIn
+    """
+    return lambda rng: seconds
+
+
+def lognormal_latency(median, sigma):
+    """
+    Response times of real services are skewed: most responses are quick
+    and a few are very slow. A lognormal distribution models that.
+
+    :param median: median delay in seconds
+    :param sigma: spread of the distribution; 0.5 puts the 99th percentile
+        at about 3 times the median, 1.0 at about 10 times
+    :return: latency function for StandIn
+    """
+    return lambda rng: rng.lognormvariate(math.log(median), sigma)
+
+
+class _Server(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    stand_in = None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # send headers and body together, without waiting for delayed ACKs
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._respond()
+
+    def do_POST(self):
+        self._respond()
+
+    def _respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        status, headers, body = self.server.stand_in.handle(
+            self.command, self.path, self.headers, body
+        )
+        if status is None:
+            # drop the connection, which the client sees as a connection
+            # error
+            self.close_connection = True
+            return
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandIn(object):
+
+    """
+    Local HTTP server answering for one upstream host.
+
+    @property: host ::= upstream host name, as it appears in request urls
+    @property: cassette ::= Cassette the responses are replayed from, or
+        recorded to in record mode
+    @property: latency ::= function taking a random.Random and returning
+        the seconds each response is delayed, None for no delay
+    @property: error_rate ::= fraction of requests answered with
+        error_status instead of the recorded response
+    @property: error_status ::= status code of failed requests, None to
+        close the connection without answering
+    @property: record ::= True to forward requests to the real host and
+        record its responses in the cassette
+    @property: requests ::= number of requests served since start
+
+    """
+
+    def __init__(self, host, cassette=None, latency=None, error_rate=0.0,
+                 error_status=503, record=False, seed=None, scheme='https'):
+        """
+        :param host: upstream host name
+        :param cassette: Cassette to replay or record to, a new one if None
+        :param latency: latency function, see constant_latency and
+            lognormal_latency
+        :param error_rate: fraction of requests that fail
+        :param error_status: status code of failed requests, None to close
+            the connection without answering
+        :param record: forward requests to the real host and record them
+        :param seed: seed for the latency and error draws
+        :param scheme: scheme of the real host, for record mode
+        """
+        self.host = host
+        self.cassette = cassette if cassette is not None else Cassette()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.record = record
+        self.scheme = scheme
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._responders = {}
+        self._server = None
+
+    @property
+    def base_url(self):
+        """
+        :return: scheme and address of the running server
+        """
+        return 'http://{}:{}'.format(*self._server.server_address[:2])
+
+    def route(self, method, path, responder):
+        """
+        Answer requests for path with a function instead of the cassette,
+        for responses that depend on the request
+
+        :param method: HTTP method, e.g. "GET"
+        :param path: path of the request url
+        :param responder: function taking the dictionary of url parameters
+            and the request body and returning a tuple (status, headers,
+            body bytes)
+        :return: None
+        """
+        self._responders[(method.upper(), path)] = responder
+
+    def start(self):
+        """
+        Start serving and send every request for host here
+
+        :return: None
+        """
+        self._server = _Server(('127.0.0.1', 0), _Handler)
+        self._server.stand_in = self
+        threading.Thread(target=self._server.serve_forever,
+                         args=(POLL_INTERVAL,), daemon=True).start()
+        http_utils.set_host_override(self.host, self.base_url)
+
+    def stop(self):
+        """
+        Stop serving and send requests for host to the real host again
+
+        :return: None
+        """
+        http_utils.set_host_override(self.host, None)
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def handle(self, method, target, headers, body):
+        """
+        Answer one request
+
+        :param method: HTTP method of the request
+        :param target: path and query string of the request
+        :param headers: request headers
+        :param body: request body bytes
+        :return: tuple (status, headers, body bytes), status None to close
+            the connection without answering
+        """
+        parts = urllib.parse.urlsplit(target)
+        with self._lock:
+            self.requests += 1
+            delay = self.latency(self._random) if self.latency else 0
+            failed = self._random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if failed:
+            return self.error_status, {}, b''
+        if self.record:
+            return self._forward(method, target, headers, body)
+
+        responder = self._responders.get((method, parts.path))
+        if responder is not None:
+            return responder(
+                urllib.parse.parse_qs(parts.query, keep_blank_values=True),
+                body
+            )
+        found = self.cassette.find(method, parts.path, parts.query)
+        if found is None:
+            logger.warning('No recorded response for {} {}{}'
+                           .format(method, self.host, target))
+            return 404, {}, b''
+        status, response_headers, response_body = found
+        etag = response_headers.get('ETag')
+        if etag is not None and headers.get('If-None-Match') == etag:
+            return 304, {'ETag': etag}, b''
+        return status, response_headers, response_body
+
+    def _forward(self, method, target, headers, body):
+        """
+        Send a request on to the real host and record its response
+        """
+        forwarded = {name: headers[name] for name in RECORDED_REQUEST_HEADERS
+                     if name in headers}
+        try:
+            response = requests.request(
+                method, '{}://{}{}'.format(self.scheme, self.host, target),
+                headers=forwarded, data=body or None, timeout=30
+            )
+        except requests.exceptions.RequestException as e:
+            logger.warning('Could not record {} {}{}: {}'
+                           .format(method, self.host, target, e))
+            return 502, {}, b''
+        kept = {name: response.headers[name]
+                for name in RECORDED_RESPONSE_HEADERS
+                if name in response.headers}
+        parts = urllib.parse.urlsplit(target)
+        query = urllib.parse.parse_qs(parts.query, keep_blank_values=True)
+        for name in SCRUBBED_PARAMETERS:
+            if name in query:
+                query[name] = ['scrubbed']
+        self.cassette.add(method, parts.path, query, response.status_code,
+                          response.content, kept)
+        return response.status_code, kept, response.content
+
+
+@contextlib.contextmanager
+def running(stand_ins):
+    """
+    Run stand-ins for the duration of a with block
+
+    :param stand_ins: iterable of StandIn
+    :return: context manager yielding a dictionary mapping each host to its
+        StandIn
+    """
+    started = []
+    try:
+        for stand_in in stand_ins:
+            stand_in.start()
+            started.append(stand_in)
+        yield {stand_in.host: stand_in for stand_in in started}
+    finally:
+        for stand_in in started:
+            stand_in.stop()
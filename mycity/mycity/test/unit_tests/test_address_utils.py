@@ -16,3 +16,33 @@ class AddressUtilitiesTestCase(base.BaseTestCase):
     def test_build_origin_address_with_normal_address(self):
         self.change_address("46 Everdean St.")
         self.compare_built_address("46 Everdean St Boston MA")
+
+    def test_parsed_address_is_a_copy(self):
+        address_utils.parse_address("46 Everdean St")["house"] = "1"
+        self.assertEqual("46",
+                         address_utils.parse_address("46 Everdean St")["house"])
+
+    def test_parses_are_memoized(self):
+        address_utils.clear_parse_cache()
+        address_utils.parse_address("46 Everdean St")
+        address_utils.parse_address("46 Everdean St")
+        stats = address_utils.get_parse_cache_stats()
+        self.assertEqual(1, stats["hits"])
+        self.assertEqual(1, stats["size"])
+
+    def test_canonical_address_ignores_how_it_is_said(self):
+        for variant in ("46 Everdean Street", "46 everdean st.",
+                        "  46  EVERDEAN St "):
+            self.assertEqual("46 everdean st",
+                             address_utils.canonicalize_address(variant))
+
+    def test_canonical_address_keeps_unit_and_zip(self):
+        self.assertEqual(
+            "1000 dorchester ave apt 3 boston 02125",
+            address_utils.canonicalize_address(
+                "1000 Dorchester Avenue Apt 3, Boston, 02125")
+        )
+
+    def test_canonical_address_without_house_number(self):
+        self.assertEqual("boston city hall",
+                         address_utils.canonicalize_address("Boston, City Hall"))
@@ -0,0 +1,241 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest.mock as mock
+import mycity.test.unit_tests.base as base
+import mycity.utilities.cache_utils as cache_utils
+import mycity.utilities.deadline_utils as deadline_utils
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class LRUCacheTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.clock = FakeClock()
+        self.cache = cache_utils.LRUCache(2, 60, clock=self.clock)
+
+    def test_get_returns_stored_value(self):
+        self.cache.set('a', 1)
+        self.assertEqual(1, self.cache.get('a'))
+        self.assertEqual({'hits': 1, 'misses': 0, 'evictions': 0, 'size': 1},
+                         self.cache.stats())
+
+    def test_entries_expire_after_ttl(self):
+        self.cache.set('a', 1)
+        self.clock.now = 61
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(1, self.cache.misses)
+        self.assertEqual(0, len(self.cache))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.assertEqual(1, self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(1, self.cache.evictions)
+
+
+class StaleWhileRevalidateCacheTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.clock = FakeClock()
+        self.cache = cache_utils.StaleWhileRevalidateCache(2, clock=self.clock)
+        self.loads = []
+        self.refresh_patch = mock.patch.object(cache_utils,
+                                               'refresh_in_background')
+        self.mock_refresh = self.refresh_patch.start()
+        self.mock_refresh.side_effect = \
+            lambda key, function, *args: function(*args)
+
+    def tearDown(self):
+        self.refresh_patch.stop()
+        super().tearDown()
+
+    def _load(self):
+        self.loads.append(self.clock.now)
+        return len(self.loads)
+
+    def test_fresh_entry_is_not_loaded_again(self):
+        self.assertEqual(1, self.cache.get('a', self._load, 60, 60))
+        self.clock.now = 59
+        self.assertEqual(1, self.cache.get('a', self._load, 60, 60))
+        self.assertEqual(1, len(self.loads))
+        self.assertEqual({'hits': 1, 'stale_hits': 0, 'misses': 1,
+                          'refresh_failures': 0, 'shared_loads': 0,
+                          'size': 1},
+                         self.cache.stats())
+
+    def test_stale_entry_is_returned_and_refreshed(self):
+        self.cache.get('a', self._load, 60, 60)
+        self.clock.now = 90
+        self.assertEqual(1, self.cache.get('a', self._load, 60, 60))
+        self.assertEqual(1, self.mock_refresh.call_count)
+        self.assertEqual(2, self.cache.get('a', self._load, 60, 60))
+        self.assertEqual(1, self.cache.stale_hits)
+
+    def test_expired_entry_is_loaded(self):
+        self.cache.get('a', self._load, 60, 60)
+        self.clock.now = 120
+        self.assertEqual(2, self.cache.get('a', self._load, 60, 60))
+        self.mock_refresh.assert_not_called()
+        self.assertEqual(2, self.cache.misses)
+
+    def test_failed_refresh_keeps_stale_entry(self):
+        self.cache.get('a', self._load, 60, 60)
+        self.clock.now = 90
+
+        def fail():
+            raise ValueError('upstream down')
+
+        self.assertEqual(1, self.cache.get('a', fail, 60, 60))
+        self.assertEqual(1, self.cache.get('a', self._load, 60, 60))
+        self.assertEqual(1, self.cache.refresh_failures)
+
+
+class PersistentCacheTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.clock = FakeClock()
+        self.cache = cache_utils.PersistentCache(
+            cache_utils.MemoryStorage(2), 60, clock=self.clock
+        )
+
+    def test_values_are_copies(self):
+        self.cache.set('a', {'name': 'x'})
+        self.cache.get('a').pop('name')
+        self.assertEqual({'name': 'x'}, self.cache.get('a'))
+
+    def test_entries_expire(self):
+        self.cache.set('a', [1])
+        self.clock.now = 60
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(0, self.cache.stats()['size'])
+        self.assertEqual(1, self.cache.misses)
+
+    def test_memory_storage_evicts_least_recently_used(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(1, self.cache.get('a'))
+
+
+class SQLiteStorageTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache', 'test.sqlite3')
+        self.storage = cache_utils.SQLiteStorage(self.path, 3, ttl=60)
+
+    def tearDown(self):
+        super().tearDown()
+        self.storage.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_entries_survive_a_new_storage(self):
+        cache_utils.PersistentCache(self.storage, 60).set('a', {'b': [1]})
+        self.storage.close()
+        cache = cache_utils.PersistentCache(
+            cache_utils.SQLiteStorage(self.path, 3), 60
+        )
+        self.assertEqual({'b': [1]}, cache.get('a'))
+        cache.storage.close()
+
+    def test_delete_and_clear(self):
+        self.storage.set('a', 0, '1')
+        self.storage.set('b', 0, '2')
+        self.storage.delete('a')
+        self.assertIsNone(self.storage.get('a'))
+        self.assertEqual(1, len(self.storage))
+        self.storage.clear()
+        self.assertEqual(0, len(self.storage))
+
+    def test_oldest_entries_are_dropped(self):
+        for stored_at, key in enumerate('abcd'):
+            self.storage.set(key, stored_at, key)
+        self.storage.set('b', 5, 'b')
+        self.assertEqual(3, len(self.storage))
+        self.assertIsNone(self.storage.get('a'))
+        self.assertEqual((5, 'b'), self.storage.get('b'))
+
+    def test_expired_entries_are_dropped(self):
+        self.storage.set('a', 0, '1')
+        self.storage.set('b', 30, '2')
+        self.storage.set('c', 70, '3')
+        self.assertEqual(2, len(self.storage))
+        self.assertIsNone(self.storage.get('a'))
+
+    def test_size_is_counted_once(self):
+        self.storage.set('a', 0, '1')
+        self.storage.close()
+        storage = cache_utils.SQLiteStorage(self.path, 3)
+        self.assertEqual(1, len(storage))
+        with mock.patch.object(storage, '_connection') as connection:
+            self.assertEqual(1, len(storage))
+        connection.execute.assert_not_called()
+        storage.close()
+
+    def test_unusable_file_is_a_miss(self):
+        storage = cache_utils.SQLiteStorage(self.directory, 3)
+        cache = cache_utils.PersistentCache(storage, 60)
+        cache.set('a', 1)
+        self.assertIsNone(cache.get('a'))
+
+
+class RefreshInBackgroundTestCase(base.BaseTestCase):
+
+    def test_refresh_runs_once_per_key(self):
+        release = threading.Event()
+        first = cache_utils.refresh_in_background('key', release.wait, 5)
+        self.assertIsNone(
+            cache_utils.refresh_in_background('key', release.wait, 5)
+        )
+        release.set()
+        self.assertTrue(first.result(timeout=5))
+        second = cache_utils.refresh_in_background('key', lambda: 'done')
+        self.assertEqual('done', second.result(timeout=5))
+
+    def test_wait_for_refreshes(self):
+        release = threading.Event()
+        cache_utils.refresh_in_background('key', release.wait, 5)
+        self.assertFalse(cache_utils.wait_for_refreshes(0.01))
+        release.set()
+        self.assertTrue(cache_utils.wait_for_refreshes(5))
+        self.assertTrue(cache_utils.wait_for_refreshes(0))
+
+    def test_refresh_started_again_once_abandoned(self):
+        release = threading.Event()
+        first = cache_utils.refresh_in_background('key', release.wait, 5)
+        with mock.patch.object(cache_utils, 'REFRESH_ABANDON_AFTER', 0):
+            second = cache_utils.refresh_in_background('key', lambda: 'done')
+        self.assertEqual('done', second.result(timeout=5))
+        release.set()
+        self.assertTrue(first.result(timeout=5))
+        self.assertTrue(cache_utils.wait_for_refreshes(0))
+
+    def test_refresh_does_not_inherit_the_deadline(self):
+        deadline_utils.set_current_deadline(deadline_utils.Deadline(0))
+        try:
+            future = cache_utils.refresh_in_background(
+                'key',
+                lambda: deadline_utils.get_current_deadline().remaining()
+            )
+        finally:
+            deadline_utils.set_current_deadline(None)
+        self.assertIsNone(future.result(timeout=5))
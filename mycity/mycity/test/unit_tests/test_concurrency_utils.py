@@ -0,0 +1,169 @@
+import concurrent.futures
+import threading
+import mycity.test.unit_tests.base as base
+import mycity.utilities.concurrency_utils as concurrency_utils
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class RateLimiterTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.clock = FakeClock()
+        self.rate_limiter = concurrency_utils.RateLimiter(
+            4, clock=self.clock, sleep=self.clock.sleep
+        )
+
+    def test_first_call_does_not_wait(self):
+        self.assertEqual(0, self.rate_limiter.acquire())
+
+    def test_calls_are_spaced_out(self):
+        for _ in range(5):
+            self.rate_limiter.acquire()
+        self.assertAlmostEqual(1.0, self.clock.now)
+
+    def test_idle_time_refills_bucket(self):
+        self.rate_limiter.acquire()
+        self.clock.now += 10
+        self.assertEqual(0, self.rate_limiter.acquire())
+
+
+class BoundedMapTestCase(base.BaseTestCase):
+
+    def test_results_in_order(self):
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            to_test = list(concurrency_utils.bounded_map(
+                executor, lambda item: item * 2, range(10), 3
+            ))
+        self.assertEqual([item * 2 for item in range(10)], to_test)
+
+    def test_items_read_lazily(self):
+        read = []
+
+        def items():
+            for item in range(100):
+                read.append(item)
+                yield item
+
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            results = concurrency_utils.bounded_map(
+                executor, lambda item: item, items(), 2
+            )
+            next(results)
+            self.assertLessEqual(len(read), 3)
+            results.close()
+
+    def test_chunks(self):
+        self.assertEqual([[0, 1], [2, 3], [4]],
+                         list(concurrency_utils.chunks(range(5), 2)))
+
+
+class SingleFlightTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.single_flight = concurrency_utils.SingleFlight()
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.executor = concurrent.futures.ThreadPoolExecutor(4)
+
+    def tearDown(self):
+        self.release.set()
+        self.executor.shutdown()
+        super().tearDown()
+
+    def _slow_call(self, result):
+        self.started.set()
+        self.release.wait(5)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _call_concurrently(self, result, callers=4):
+        leader = self.executor.submit(self.single_flight.do, 'key',
+                                      self._slow_call, result)
+        self.started.wait(5)
+        followers = [self.executor.submit(self.single_flight.do, 'key',
+                                          self._slow_call, 'other')
+                     for _ in range(callers - 1)]
+        while self.single_flight.shared < callers - 1:
+            self.release.wait(0.001)
+        self.release.set()
+        return [leader] + followers
+
+    def test_concurrent_calls_share_one_call(self):
+        futures = self._call_concurrently('result')
+        self.assertEqual(['result'] * 4,
+                         [future.result(5) for future in futures])
+        self.assertEqual({'calls': 1, 'shared': 3},
+                         self.single_flight.stats())
+
+    def test_exception_is_shared(self):
+        futures = self._call_concurrently(ValueError('upstream down'))
+        for future in futures:
+            with self.assertRaises(ValueError):
+                future.result(5)
+        self.assertEqual(1, self.single_flight.calls)
+
+    def test_later_call_is_made_again(self):
+        self.release.set()
+        self.assertEqual(1, self.single_flight.do('key', self._slow_call, 1))
+        self.assertEqual(2, self.single_flight.do('key', self._slow_call, 2))
+        self.assertEqual(2, self.single_flight.calls)
+
+
+class CircuitBreakerTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.clock = FakeClock()
+        self.breaker = concurrency_utils.CircuitBreaker(2, 30,
+                                                        clock=self.clock)
+
+    def test_opens_after_failures_in_a_row(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.OPEN, self.breaker.state)
+        self.assertFalse(self.breaker.allow())
+
+    def test_trial_call_after_reset(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.clock.now = 30
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.CLOSED, self.breaker.state)
+
+    def test_failed_trial_call_opens_again(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.clock.now = 30
+        self.breaker.allow()
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.allow())
+        self.clock.now = 60
+        self.assertTrue(self.breaker.allow())
+
+    def test_cancelled_trial_call_lets_another_through(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.clock.now = 30
+        self.breaker.allow()
+        self.breaker.record_cancelled()
+        self.assertEqual(self.breaker.OPEN, self.breaker.state)
+        self.assertTrue(self.breaker.allow())
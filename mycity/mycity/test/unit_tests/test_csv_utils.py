@@ -99,6 +99,41 @@ class CSVUtilitiesTestCase(base.BaseTestCase):
         for record in to_test:
             self.assertIn("Boston, MA", record['Address'])
 
+    def test_add_city_and_state_to_mapping_records(self):
+        Record = csv_utils.create_mapping_record_model(
+            'Record', ['test_field', 'Address']
+        )
+        records = [Record('wes', '1000 Dorchester Ave')]
+        to_test = csv_utils.add_city_and_state_to_records(
+            records,
+            'Address',
+            'Boston',
+            'MA'
+        )
+        self.assertEqual('1000 Dorchester Ave Boston, MA',
+                         to_test[0]['Address'])
+        self.assertEqual('1000 Dorchester Ave', records[0]['Address'])
+
+    def test_mapping_record_model_reads_like_dictionary(self):
+        Record = csv_utils.create_mapping_record_model(
+            'Record', ['Address', 'Spaces (Total)']
+        )
+        record = Record('1 City Hall Square', '60')
+        self.assertEqual('60', record['Spaces (Total)'])
+        self.assertEqual('1 City Hall Square', record.Address)
+        self.assertIn('Address', record)
+        self.assertIsNone(record.get('Fee'))
+        self.assertEqual(
+            {'Address': '1 City Hall Square', 'Spaces (Total)': '60'},
+            {**record}
+        )
+        self.assertEqual('1 City Hall Square', '{Address}'.format(**record))
+
+    def test_mapping_record_model_has_no_instance_dictionary(self):
+        Record = csv_utils.create_mapping_record_model('Record', ['Address'])
+        with self.assertRaises(AttributeError):
+            Record('1 City Hall Square').__dict__
+
     def test_map_attribute_to_record(self):
         Record = collections.namedtuple('Record', ['test_field', 'Address'])
         records = [
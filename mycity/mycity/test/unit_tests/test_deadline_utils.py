@@ -0,0 +1,87 @@
+import concurrent.futures
+import mycity.test.unit_tests.base as base
+import mycity.utilities.deadline_utils as deadline_utils
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class DeadlineTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.clock = FakeClock()
+        self.deadline = deadline_utils.Deadline(2, clock=self.clock)
+
+    def tearDown(self):
+        deadline_utils.set_current_deadline(None)
+        super().tearDown()
+
+    def test_remaining(self):
+        self.clock.now = 0.5
+        self.assertAlmostEqual(1.5, self.deadline.remaining())
+        self.assertFalse(self.deadline.expired)
+
+    def test_expired(self):
+        self.clock.now = 3
+        self.assertEqual(0, self.deadline.remaining())
+        self.assertTrue(self.deadline.expired)
+        with self.assertRaises(deadline_utils.DeadlineExceeded):
+            self.deadline.check()
+
+    def test_no_deadline(self):
+        deadline = deadline_utils.Deadline(None)
+        self.assertIsNone(deadline.remaining())
+        self.assertFalse(deadline.expired)
+        deadline.check()
+
+    def test_wait_returns_result(self):
+        future = concurrent.futures.Future()
+        future.set_result('done')
+        self.assertEqual('done', self.deadline.wait(future))
+
+    def test_wait_raises_when_deadline_passes(self):
+        self.clock.now = 3
+        with self.assertRaises(deadline_utils.DeadlineExceeded):
+            self.deadline.wait(concurrent.futures.Future())
+
+    def test_limit(self):
+        self.assertEqual(1, self.deadline.limit(1).expires_at)
+        self.assertEqual(2, self.deadline.limit(5).expires_at)
+        self.assertEqual(
+            5, deadline_utils.Deadline(None, clock=self.clock)
+            .limit(5).expires_at
+        )
+
+    def test_get_timeout_without_deadline(self):
+        self.assertEqual(deadline_utils.DEFAULT_TIMEOUT,
+                         deadline_utils.get_timeout())
+
+    def test_get_timeout_uses_remaining_time(self):
+        deadline_utils.set_current_deadline(self.deadline)
+        self.clock.now = 0.5
+        self.assertAlmostEqual(1.5, deadline_utils.get_timeout())
+        self.assertEqual(1, deadline_utils.get_timeout(limit=1))
+
+    def test_get_timeout_after_deadline(self):
+        deadline_utils.set_current_deadline(self.deadline)
+        self.clock.now = 3
+        with self.assertRaises(deadline_utils.DeadlineExceeded):
+            deadline_utils.get_timeout()
+
+    def test_current_deadline_is_per_thread(self):
+        deadline_utils.set_current_deadline(self.deadline)
+        executor = concurrent.futures.ThreadPoolExecutor(1)
+        try:
+            other_thread = executor.submit(
+                deadline_utils.get_current_deadline).result()
+        finally:
+            executor.shutdown()
+        self.assertIsNone(other_thread.expires_at)
+        self.assertIs(self.deadline, deadline_utils.get_current_deadline())
@@ -0,0 +1,83 @@
+import ast
+import os
+import unittest.mock as mock
+import mycity.test.unit_tests.base as base
+import mycity.utilities.google_maps_utils as g_maps_utils
+import mycity.utilities.finder.DistanceProvider as distance_providers
+from mycity.utilities.finder.FinderCSV import FinderCSV
+
+
+class EstimatedDistanceProviderTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.finder = FinderCSV(None, "www.fake.com", "Address", "{Address}",
+                                lambda record: record)
+        self.provider = distance_providers.EstimatedDistanceProvider(
+            road_factor=1.5, average_speed=10
+        )
+
+    def test_get_driving_info(self):
+        records = [
+            # about 1111 meters north of the origin
+            {'Address': '1 Near St', 'Y': '42.36', 'X': '-71.06'},
+            {'Address': '1 Nowhere St'}
+        ]
+        with mock.patch.object(self.finder, 'get_origin_coordinates',
+                               return_value=(42.35, -71.06)):
+            to_test = self.provider.get_driving_info(self.finder, records)
+        self.assertEqual(1, len(to_test))
+        self.assertEqual('1 Near St', to_test[0]['Address'])
+        self.assertAlmostEqual(
+            1668, to_test[0][g_maps_utils.DRIVING_DISTANCE_VALUE_KEY],
+            delta=2
+        )
+        self.assertAlmostEqual(
+            167, to_test[0][g_maps_utils.DRIVING_TIME_VALUE_KEY], delta=1
+        )
+        self.assertEqual('about 1.0 mi',
+                         to_test[0][g_maps_utils.DRIVING_DISTANCE_TEXT_KEY])
+        self.assertEqual('about 3 mins',
+                         to_test[0][g_maps_utils.DRIVING_TIME_TEXT_KEY])
+
+    def test_get_driving_info_without_origin(self):
+        with mock.patch.object(self.finder, 'get_origin_coordinates',
+                               return_value=None):
+            self.assertIsNone(self.provider.get_driving_info(
+                self.finder, [{'Address': '1 Near St', 'Y': '42.36',
+                               'X': '-71.06'}]
+            ))
+
+    def test_from_samples_uses_median_ratios(self):
+        provider = distance_providers.EstimatedDistanceProvider.from_samples([
+            (1000, 1300, 130),
+            (1000, 1400, 200),
+            (1000, 5000, 1000),
+            (0, 10, 10)
+        ])
+        self.assertAlmostEqual(1.4, provider.road_factor)
+        self.assertAlmostEqual(7.0, provider.average_speed)
+
+    def test_default_speed_matches_recorded_driving_info(self):
+        path = os.path.join(os.path.dirname(__file__), os.path.pardir,
+                            'test_data', 'google_maps_json_response')
+        with open(path) as data_file:
+            recorded = ast.literal_eval(''.join(
+                line for line in data_file if not line.startswith('#')
+            ))
+        # the origin's coordinates weren't recorded, so only the speed can
+        # be checked
+        provider = distance_providers.EstimatedDistanceProvider.from_samples(
+            (1, element['distance']['value'], element['duration']['value'])
+            for element in recorded['rows'][0]['elements']
+            if element['status'] == 'OK'
+        )
+        self.assertAlmostEqual(
+            distance_providers.EstimatedDistanceProvider.DEFAULT_AVERAGE_SPEED,
+            provider.average_speed, delta=0.1
+        )
+
+    def test_format_duration(self):
+        self.assertEqual('about 1 min', distance_providers.format_duration(5))
+        self.assertEqual('about 2 mins',
+                         distance_providers.format_duration(100))
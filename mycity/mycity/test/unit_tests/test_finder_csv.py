@@ -1,5 +1,12 @@
+import threading
+import unittest.mock as mock
+import mycity.utilities.deadline_utils as deadline_utils
 import mycity.utilities.google_maps_utils as g_maps_utils
+import mycity.test.test_constants as test_constants
 import mycity.test.unit_tests.base as base
+import mycity.utilities.finder.DistanceProvider as distance_providers
+import mycity.utilities.finder.Finder as Finder
+import mycity.utilities.finder.RecordStore as record_store
 from mycity.utilities.finder.FinderCSV import FinderCSV
 
 
@@ -21,6 +28,7 @@ class FinderCSVTestCase(base.BaseTestCase):
 
     def tearDown(self):
         self.finder = None
+        record_store.clear_store_cache()
         super().tearDown()
 
     def test_get_output_speech_with_success(self):
@@ -40,3 +48,359 @@ class FinderCSVTestCase(base.BaseTestCase):
             {'MissingKeys': 'Address, name, distance'}
         )
         self.assertEqual(self.finder.ERROR_MESSAGE, self.finder.output_speech)
+
+    def test_get_candidate_records_keeps_closest_records(self):
+        self.finder.candidate_count = 1
+        near = {'Address': '1 Near St', 'Y': '42.351', 'X': '-71.06'}
+        far = {'Address': '1 Far St', 'Y': '42.40', 'X': '-71.06'}
+        with mock.patch.object(self.finder, 'get_origin_coordinates',
+                               return_value=(42.35, -71.06)):
+            to_test = self.finder.get_candidate_records([far, near])
+        self.assertEqual([near], to_test)
+
+    def test_get_candidate_records_without_coordinates(self):
+        self.finder.candidate_count = 1
+        records = [{'Address': '1 Near St'}, {'Address': '1 Far St'}]
+        with mock.patch.object(self.finder, 'get_origin_coordinates',
+                               return_value=(42.35, -71.06)):
+            to_test = self.finder.get_candidate_records(records)
+        self.assertEqual(records, to_test)
+
+    def test_get_candidate_records_when_origin_not_found(self):
+        self.finder.candidate_count = 1
+        records = [
+            {'Address': '1 Near St', 'Y': '42.351', 'X': '-71.06'},
+            {'Address': '1 Far St', 'Y': '42.40', 'X': '-71.06'}
+        ]
+        with mock.patch.object(self.finder, 'get_origin_coordinates',
+                               return_value=None):
+            to_test = self.finder.get_candidate_records(records)
+        self.assertEqual(records, to_test)
+
+    def test_get_required_columns(self):
+        self.assertEqual(
+            {'name', 'Address', 'X', 'Y',
+             g_maps_utils.DRIVING_DISTANCE_TEXT_KEY},
+            self.finder.get_required_columns()
+        )
+
+    def test_file_to_filtered_records_keeps_required_columns(self):
+        self.finder.extra_columns = ('Spaces',)
+        with open(test_constants.PARKING_LOTS_TEST_CSV,
+                  encoding='utf-8-sig', newline='') as csv_file:
+            records = self.finder.file_to_filtered_records(csv_file)
+        self.assertEqual(56, len(records))
+        self.assertEqual(
+            {'Address': '115 Harvard Ave', 'Spaces': '60',
+             'X': '-71.132325004731754', 'Y': '42.352607196514668'},
+            dict(records[0])
+        )
+
+    def test_file_to_filtered_records_applies_filter(self):
+        self.finder.extra_columns = ('Fee',)
+        self.finder._filter = lambda record: record['Fee'] == 'No Charge'
+        with open(test_constants.PARKING_LOTS_TEST_CSV,
+                  encoding='utf-8-sig', newline='') as csv_file:
+            records = self.finder.file_to_filtered_records(csv_file.read())
+        self.assertTrue(records)
+        for record in records:
+            self.assertEqual('No Charge', record['Fee'])
+
+
+    def test_get_closest_record_with_driving_info(self):
+        store = record_store.RecordStore(
+            [{'Address': '1 Near St', 'name': 'Near'},
+             {'Address': '1 Far St', 'name': 'Far'}],
+            'Address'
+        )
+        driving_info = {'Address': '1 Far St',
+                        g_maps_utils.DRIVING_DISTANCE_TEXT_KEY: '2 mi'}
+        to_test = self.finder.get_closest_record_with_driving_info(
+            driving_info, store
+        )
+        self.assertEqual('Far', to_test['name'])
+        self.assertEqual('2 mi',
+                         to_test[g_maps_utils.DRIVING_DISTANCE_TEXT_KEY])
+
+    def test_get_records_reuses_store_for_same_dataset(self):
+        csv_file = 'Address,name\n1 Near St,Near\n'
+        self.finder.fetch_resource = mock.MagicMock(return_value=csv_file)
+        self.finder.dataset_version = 'v1'
+        records = self.finder.get_records()
+        store = self.finder.get_record_store(records)
+        self.assertEqual('1 Near St Boston, MA', store[0]['Address'])
+        self.assertIs(store, self.finder.get_records())
+        self.assertIs(store, self.finder.get_record_store(store))
+
+    def test_find_closest_records_batches_origins(self):
+        finder = FinderCSV(None, "www.fake.com", "Address", "{Address}",
+                           lambda record: record)
+        records = [{'Address': '1 A St'}, {'Address': '1 B St'},
+                   {'Address': '1 C St'}]
+        origins = ['{} Origin St'.format(number) for number in range(30)]
+        distance = g_maps_utils.DRIVING_DISTANCE_VALUE_KEY
+
+        def get_driving_matrix(batch_origins, location_type, destinations):
+            self.assertLessEqual(
+                len(batch_origins) * len(destinations),
+                g_maps_utils.MAX_MATRIX_ELEMENTS
+            )
+            # the B St record is closest to every origin
+            return [[{location_type: destination,
+                      distance: 1 if destination.startswith('1 B St') else 5}
+                     for destination in destinations]
+                    for _ in batch_origins]
+
+        with mock.patch.object(finder, 'get_records', return_value=records), \
+                mock.patch.object(g_maps_utils, 'get_driving_matrix',
+                                  side_effect=get_driving_matrix) \
+                as mock_matrix:
+            to_test = list(finder.find_closest_records(
+                origins, requests_per_second=1000
+            ))
+        self.assertEqual(2, mock_matrix.call_count)
+        self.assertEqual(origins, [origin for origin, _ in to_test])
+        for _, record in to_test:
+            self.assertEqual('1 B St Boston, MA', record['Address'])
+
+    def test_find_closest_records_with_known_coordinates(self):
+        finder = FinderCSV(None, "www.fake.com", "Address", "{Address}",
+                           lambda record: record, candidate_count=1)
+        records = [
+            {'Address': '1 Near St', 'Y': '42.351', 'X': '-71.06'},
+            {'Address': '1 Far St', 'Y': '42.40', 'X': '-71.06'}
+        ]
+        origins = [('1 City Hall Square', (42.35, -71.06))]
+
+        def get_driving_matrix(batch_origins, location_type, destinations):
+            return [[{location_type: destination,
+                      g_maps_utils.DRIVING_DISTANCE_VALUE_KEY: 1}
+                     for destination in destinations]]
+
+        with mock.patch.object(finder, 'get_records', return_value=records), \
+                mock.patch.object(g_maps_utils, 'geocode_address') \
+                as mock_geocode, \
+                mock.patch.object(g_maps_utils, 'get_driving_matrix',
+                                  side_effect=get_driving_matrix) \
+                as mock_matrix:
+            to_test = list(finder.find_closest_records(origins))
+        mock_geocode.assert_not_called()
+        self.assertEqual(['1 Near St Boston, MA'],
+                         mock_matrix.call_args[0][2])
+        self.assertEqual('1 Near St Boston, MA', to_test[0][1]['Address'])
+
+    def test_start_from_table(self):
+        table = mock.MagicMock()
+        table.lookup.return_value = {
+            'Address': '123 Fake St Boston, MA',
+            'name': 'The Place'
+        }
+        driving_info = [{
+            'Address': '123 Fake St Boston, MA',
+            g_maps_utils.DRIVING_DISTANCE_TEXT_KEY: '1 mi'
+        }]
+        with mock.patch.object(self.finder, 'get_origin_coordinates',
+                               return_value=(42.35, -71.06)), \
+                mock.patch.object(g_maps_utils, '_get_driving_info',
+                                  return_value=driving_info) as mock_driving:
+            self.assertTrue(self.finder.start_from_table(table))
+        self.assertEqual(['123 Fake St Boston, MA'],
+                         mock_driving.call_args[0][2])
+        self.assertEqual("Trying to get The Place, 123 Real St Boston, MA, "
+                         "1 mi.", self.finder.output_speech)
+
+    def test_start_from_table_uses_driving_info_of_the_cell(self):
+        table = mock.MagicMock()
+        table.lookup.return_value = {
+            'Address': '123 Fake St Boston, MA',
+            'name': 'The Place',
+            g_maps_utils.DRIVING_DISTANCE_TEXT_KEY: 'about 1.0 mi'
+        }
+        with mock.patch.object(self.finder, 'get_origin_coordinates',
+                               return_value=(42.35, -71.06)), \
+                mock.patch.object(g_maps_utils,
+                                  '_get_driving_info') as mock_driving:
+            self.assertTrue(self.finder.start_from_table(table))
+        mock_driving.assert_not_called()
+        self.assertEqual("Trying to get The Place, 123 Real St Boston, MA, "
+                         "about 1.0 mi.", self.finder.output_speech)
+
+    def test_start_from_table_without_driving_info(self):
+        table = mock.MagicMock()
+        table.lookup.return_value = {
+            'Address': '123 Fake St Boston, MA',
+            'name': 'The Place'
+        }
+        with mock.patch.object(self.finder, 'get_origin_coordinates',
+                               return_value=(42.35, -71.06)), \
+                mock.patch.object(g_maps_utils, '_get_driving_info',
+                                  return_value=None):
+            self.assertFalse(self.finder.start_from_table(table))
+
+    def test_start_from_table_unknown_cell(self):
+        table = mock.MagicMock()
+        table.lookup.return_value = None
+        with mock.patch.object(self.finder, 'get_origin_coordinates',
+                               return_value=(42.35, -71.06)):
+            self.assertFalse(self.finder.start_from_table(table))
+
+    def test_start_concurrently_loads_records_and_origin_together(self):
+        self.finder.candidate_count = 1
+        records = [
+            {'Address': '1 Near St', 'name': 'Near', 'Y': '42.351',
+             'X': '-71.06'},
+            {'Address': '1 Far St', 'name': 'Far', 'Y': '42.40',
+             'X': '-71.06'}
+        ]
+        # each step waits for the other to start, which only works if they
+        # run at the same time
+        both_started = threading.Barrier(2, timeout=5)
+
+        def get_records():
+            both_started.wait()
+            return records
+
+        def geocode_address(address):
+            both_started.wait()
+            return 42.35, -71.06
+
+        driving_info = [{'Address': '1 Near St Boston, MA',
+                         g_maps_utils.DRIVING_DISTANCE_VALUE_KEY: 1,
+                         g_maps_utils.DRIVING_DISTANCE_TEXT_KEY: '1 mi'}]
+        with mock.patch.object(self.finder, 'get_records',
+                               side_effect=get_records), \
+                mock.patch.object(g_maps_utils, 'geocode_address',
+                                  side_effect=geocode_address) \
+                as mock_geocode, \
+                mock.patch.object(g_maps_utils, '_get_driving_info',
+                                  return_value=driving_info) as mock_driving:
+            self.finder.start_concurrently(deadline_utils.Deadline(5))
+        self.assertEqual(1, mock_geocode.call_count)
+        self.assertEqual(['1 Near St Boston, MA'],
+                         mock_driving.call_args[0][2])
+        self.assertEqual("Trying to get Near, 1 Near St Boston, MA, 1 mi.",
+                         self.finder.output_speech)
+
+    def test_start_concurrently_answers_from_table(self):
+        table = mock.MagicMock()
+        table.lookup.return_value = {
+            'Address': '123 Fake St Boston, MA',
+            'name': 'The Place'
+        }
+        driving_info = [{
+            'Address': '123 Fake St Boston, MA',
+            g_maps_utils.DRIVING_DISTANCE_TEXT_KEY: '1 mi'
+        }]
+        with mock.patch.object(self.finder, 'get_records',
+                               return_value=[]) as mock_get_records, \
+                mock.patch.object(g_maps_utils, 'geocode_address',
+                                  return_value=(42.35, -71.06)), \
+                mock.patch.object(g_maps_utils, '_get_driving_info',
+                                  return_value=driving_info) as mock_driving:
+            self.finder.start_concurrently(table=table)
+        mock_get_records.assert_not_called()
+        self.assertEqual(['123 Fake St Boston, MA'],
+                         mock_driving.call_args[0][2])
+        self.assertEqual("Trying to get The Place, 123 Real St Boston, MA, "
+                         "1 mi.", self.finder.output_speech)
+
+    def test_start_concurrently_loads_records_on_table_miss(self):
+        table = mock.MagicMock()
+        table.lookup.return_value = None
+        records = [{'Address': '1 Near St', 'name': 'Near', 'Y': '42.351',
+                    'X': '-71.06'}]
+        driving_info = [{'Address': '1 Near St Boston, MA',
+                         g_maps_utils.DRIVING_DISTANCE_VALUE_KEY: 1,
+                         g_maps_utils.DRIVING_DISTANCE_TEXT_KEY: '1 mi'}]
+        with mock.patch.object(self.finder, 'get_records',
+                               return_value=records) as mock_get_records, \
+                mock.patch.object(g_maps_utils, 'geocode_address',
+                                  return_value=(42.35, -71.06)), \
+                mock.patch.object(g_maps_utils, '_get_driving_info',
+                                  return_value=driving_info):
+            self.finder.start_concurrently(table=table)
+        mock_get_records.assert_called_once_with()
+        self.assertEqual("Trying to get Near, 1 Near St Boston, MA, 1 mi.",
+                         self.finder.output_speech)
+
+    def test_start_concurrently_raises_when_deadline_passes(self):
+        release = threading.Event()
+
+        def get_records():
+            release.wait(5)
+            return []
+
+        try:
+            with mock.patch.object(self.finder, 'get_records',
+                                   side_effect=get_records):
+                with self.assertRaises(deadline_utils.DeadlineExceeded):
+                    self.finder.start_concurrently(
+                        deadline_utils.Deadline(0.01)
+                    )
+        finally:
+            release.set()
+
+    def test_get_driving_info_to_records_falls_back_when_late(self):
+        self.finder.fallback_provider = \
+            distance_providers.EstimatedDistanceProvider()
+        records = [{'Address': '1 Near St', 'Y': '42.36', 'X': '-71.06'}]
+        release = threading.Event()
+
+        def get_driving_info(origin, location_type, destinations):
+            release.wait(5)
+            return None
+
+        try:
+            with mock.patch.object(self.finder, 'get_origin_coordinates',
+                                   return_value=(42.35, -71.06)), \
+                    mock.patch.object(g_maps_utils, '_get_driving_info',
+                                      side_effect=get_driving_info):
+                to_test = self.finder.get_driving_info_to_records(
+                    records,
+                    deadline_utils.Deadline(self.finder.FALLBACK_MARGIN)
+                )
+        finally:
+            release.set()
+        self.assertTrue(self.finder.approximate)
+        self.assertEqual('1 Near St', to_test[0]['Address'])
+        self.assertTrue(to_test[0][g_maps_utils.DRIVING_TIME_TEXT_KEY]
+                        .startswith('about'))
+
+    def test_late_driving_info_leaves_pipeline_threads_free(self):
+        self.finder.fallback_provider = \
+            distance_providers.EstimatedDistanceProvider()
+        records = [{'Address': '1 Near St', 'Y': '42.36', 'X': '-71.06'}]
+        release = threading.Event()
+
+        def get_driving_info(origin, location_type, destinations):
+            release.wait(5)
+            return None
+
+        try:
+            with mock.patch.object(self.finder, 'get_origin_coordinates',
+                                   return_value=(42.35, -71.06)), \
+                    mock.patch.object(g_maps_utils, '_get_driving_info',
+                                      side_effect=get_driving_info):
+                for _ in range(Finder.PIPELINE_MAX_WORKERS):
+                    self.finder.get_driving_info_to_records(
+                        records,
+                        deadline_utils.Deadline(self.finder.FALLBACK_MARGIN)
+                    )
+                free = Finder._get_pipeline_executor().submit(lambda: True)
+                self.assertTrue(free.result(timeout=1))
+        finally:
+            release.set()
+
+    def test_get_driving_info_to_records_prefers_google_maps(self):
+        self.finder.fallback_provider = \
+            distance_providers.EstimatedDistanceProvider()
+        records = [{'Address': '1 Near St', 'Y': '42.36', 'X': '-71.06'}]
+        driving_info = [{'Address': '1 Near St',
+                         g_maps_utils.DRIVING_DISTANCE_VALUE_KEY: 1}]
+        with mock.patch.object(g_maps_utils, '_get_driving_info',
+                               return_value=driving_info):
+            to_test = self.finder.get_driving_info_to_records(
+                records, deadline_utils.Deadline(5)
+            )
+        self.assertFalse(self.finder.approximate)
+        self.assertEqual(driving_info, to_test)
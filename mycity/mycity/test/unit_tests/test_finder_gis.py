@@ -0,0 +1,80 @@
+import unittest.mock as mock
+import mycity.test.unit_tests.base as base
+import mycity.utilities.google_maps_utils as g_maps_utils
+from mycity.utilities.finder.FinderGIS import FinderGIS
+
+
+FEATURE = {'attributes': {'Address': '1 City Hall Sq', 'Name': 'Hall'},
+           'geometry': {'x': -71.058, 'y': 42.360}}
+
+
+class FinderGISTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.request.session_attributes['currentAddress'] = \
+            '1000 Dorchester Ave'
+        self.finder = FinderGIS(self.request, 'https://example.com/0',
+                                'Address', '{Name}', lambda record: record,
+                                search_radius=500)
+        self.query_patch = mock.patch(
+            'mycity.utilities.finder.FinderGIS.'
+            'get_features_from_feature_server'
+        )
+        self.mock_query = self.query_patch.start()
+        self.coordinates_patch = mock.patch.object(
+            self.finder, 'get_origin_coordinates', return_value=(42.3, -71.0)
+        )
+        self.coordinates_patch.start()
+
+    def tearDown(self):
+        self.query_patch.stop()
+        self.coordinates_patch.stop()
+        super().tearDown()
+
+    def test_get_records_near_origin(self):
+        self.mock_query.return_value = [FEATURE]
+        self.assertEqual([FEATURE], self.finder.get_records())
+        self.assertEqual((42.3, -71.0),
+                         self.mock_query.call_args[1]['origin'])
+        self.assertEqual(500, self.mock_query.call_args[1]['distance'])
+
+    def test_get_records_widens_radius(self):
+        self.mock_query.side_effect = [[], [], [FEATURE]]
+        self.assertEqual([FEATURE], self.finder.get_records())
+        self.assertEqual(
+            [500, 1000, 2000],
+            [call[1]['distance'] for call in self.mock_query.call_args_list]
+        )
+
+    def test_get_records_falls_back_to_every_feature(self):
+        self.mock_query.side_effect = lambda *args, **kwargs: \
+            [] if 'origin' in kwargs else [FEATURE]
+        self.assertEqual([FEATURE], self.finder.get_records())
+        self.assertNotIn('origin', self.mock_query.call_args[1])
+
+    def test_get_records_without_search_radius(self):
+        self.finder.search_radius = None
+        self.mock_query.return_value = [FEATURE]
+        self.finder.get_records()
+        self.mock_query.assert_called_once_with(
+            'https://example.com/0', FinderGIS.DEFAULT_QUERY, '*'
+        )
+
+    def test_start_with_features(self):
+        self.mock_query.return_value = [FEATURE]
+        driving_info = [{'Address': '1 City Hall Sq Boston, MA',
+                         g_maps_utils.DRIVING_DISTANCE_VALUE_KEY: 100}]
+        with mock.patch.object(g_maps_utils, '_get_driving_info',
+                               return_value=driving_info):
+            self.finder.start()
+        self.assertEqual('Hall', self.finder.get_output_speech())
+
+    def test_start_concurrently_with_features(self):
+        self.mock_query.return_value = [FEATURE]
+        driving_info = [{'Address': '1 City Hall Sq Boston, MA',
+                         g_maps_utils.DRIVING_DISTANCE_VALUE_KEY: 100}]
+        with mock.patch.object(g_maps_utils, '_get_driving_info',
+                               return_value=driving_info):
+            self.finder.start_concurrently()
+        self.assertEqual('Hall', self.finder.get_output_speech())
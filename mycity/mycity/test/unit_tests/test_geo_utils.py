@@ -0,0 +1,62 @@
+import mycity.test.unit_tests.base as base
+import mycity.utilities.geo_utils as geo_utils
+
+
+class GeoUtilitiesTestCase(base.BaseTestCase):
+
+    def test_great_circle_distance_between_known_points(self):
+        # Boston City Hall to the Massachusetts State House is about 500m
+        city_hall = (42.3604, -71.0580)
+        state_house = (42.3588, -71.0638)
+        distance = geo_utils.great_circle_distance(city_hall, state_house)
+        self.assertAlmostEqual(distance, 510, delta=50)
+
+    def test_great_circle_distance_to_self_is_zero(self):
+        point = (42.3601, -71.0589)
+        self.assertEqual(0, geo_utils.great_circle_distance(point, point))
+
+    def test_get_record_coordinates(self):
+        record = {'X': '-71.132325', 'Y': '42.352607'}
+        self.assertEqual(
+            (42.352607, -71.132325),
+            geo_utils.get_record_coordinates(record, 'Y', 'X')
+        )
+
+    def test_get_record_coordinates_with_missing_values(self):
+        self.assertIsNone(
+            geo_utils.get_record_coordinates({'X': ' ', 'Y': ''}, 'Y', 'X')
+        )
+        self.assertIsNone(
+            geo_utils.get_record_coordinates({'Address': '1 Main'}, 'Y', 'X')
+        )
+
+    def test_rank_records_by_distance(self):
+        origin = (42.35, -71.06)
+        far = {'name': 'far', 'Y': '42.40', 'X': '-71.06'}
+        near = {'name': 'near', 'Y': '42.351', 'X': '-71.06'}
+        unknown = {'name': 'unknown', 'Y': '', 'X': ''}
+        ranked, unranked = geo_utils.rank_records_by_distance(
+            origin, [far, unknown, near], 'Y', 'X'
+        )
+        self.assertEqual([near, far], ranked)
+        self.assertEqual([unknown], unranked)
+
+    def test_encode_geohash(self):
+        self.assertEqual('ezs42', geo_utils.encode_geohash(42.6, -5.6, 5))
+
+    def test_decode_geohash_contains_point(self):
+        south, west, north, east = geo_utils.decode_geohash('ezs42')
+        self.assertTrue(south <= 42.6 <= north)
+        self.assertTrue(west <= -5.6 <= east)
+
+    def test_geohash_to_int_keeps_order(self):
+        self.assertLess(geo_utils.geohash_to_int('drt2y'),
+                        geo_utils.geohash_to_int('drt2z'))
+
+    def test_get_geohashes_in_bounds_covers_bounds(self):
+        geohashes = geo_utils.get_geohashes_in_bounds(42.3, -71.1, 42.4, -71.0,
+                                                      5)
+        for latitude, longitude in [(42.3, -71.1), (42.4, -71.0),
+                                    (42.35, -71.05)]:
+            self.assertIn(geo_utils.encode_geohash(latitude, longitude, 5),
+                          geohashes)
@@ -1,8 +1,11 @@
+import re
 import unittest.mock as mock
 import mycity.test.test_constants as test_constants
 import mycity.test.unit_tests.base as base
 import mycity.utilities.gis_utils as gis_utils
+import mycity.utilities.http_utils as http_utils
 import mycity.utilities.google_maps_utils as g_maps_utils
+from mycity.intents.custom_errors import BadAPIResponse
 
 
 class GISUtilitiesTestCase(base.BaseTestCase):
@@ -49,6 +52,63 @@ class GISUtilitiesTestCase(base.BaseTestCase):
         for address in to_test:
             self.assertTrue(address.find("Boston, MA"))
 
+    def test_query_feature_server(self):
+        feature = {'attributes': {'Name': 'Lot', 'Spaces': 10}}
+        response = self._mock_response(json_data={'features': [feature]})
+        with mock.patch.object(http_utils, 'get',
+                               return_value=response) as mock_get:
+            to_test = gis_utils.query_feature_server(
+                'https://example.com/FeatureServer/0/',
+                where='Spaces > 0',
+                out_fields=['Name', 'Spaces'],
+                return_geometry=False
+            )
+        self.assertEqual([feature], to_test)
+        url, = mock_get.call_args[0]
+        self.assertEqual('https://example.com/FeatureServer/0/query', url)
+        self.assertEqual(
+            {'where': 'Spaces > 0', 'outFields': 'Name,Spaces',
+             'returnGeometry': 'false', 'outSR': '4326', 'f': 'json'},
+            mock_get.call_args[1]['params']
+        )
+
+    def test_query_feature_server_near_origin(self):
+        response = self._mock_response(json_data={'features': []})
+        with mock.patch.object(http_utils, 'get',
+                               return_value=response) as mock_get:
+            gis_utils.query_feature_server('https://example.com/0',
+                                           origin=(42.36, -71.06),
+                                           distance=500)
+        params = mock_get.call_args[1]['params']
+        self.assertEqual('-71.06,42.36', params['geometry'])
+        self.assertEqual('esriGeometryPoint', params['geometryType'])
+        self.assertEqual(500, params['distance'])
+        self.assertEqual('esriSRUnit_Meter', params['units'])
+
+    def test_feature_to_record(self):
+        feature = {'attributes': {'Address': '1 City Hall Sq'},
+                   'geometry': {'x': -71.06, 'y': 42.36}}
+        self.assertEqual(
+            {'Address': '1 City Hall Sq', 'Y': 42.36, 'X': -71.06},
+            gis_utils.feature_to_record(feature, 'Y', 'X')
+        )
+
+    def test_query_feature_server_error_in_body(self):
+        response = self._mock_response(
+            json_data={'error': {'code': 400, 'message': 'Invalid query'}}
+        )
+        with mock.patch.object(http_utils, 'get',
+                               return_value=response):
+            with self.assertRaises(BadAPIResponse):
+                gis_utils.query_feature_server('https://example.com/0')
+
+    def test_query_feature_server_bad_status(self):
+        response = self._mock_response(status=500)
+        with mock.patch.object(http_utils, 'get',
+                               return_value=response):
+            with self.assertRaises(BadAPIResponse):
+                gis_utils.query_feature_server('https://example.com/0')
+
     ####################################################################
     # Tests that should only be run if we're connected to the Internet #
     ####################################################################
@@ -103,3 +163,80 @@ class GISUtilitiesTestCase(base.BaseTestCase):
 #         self.assertFalse(closest[location_utils.DRIVING_DISTANCE_TEXT_KEY])
 #         self.assertFalse(closest[location_utils.DRIVING_TIME_TEXT_KEY])
 
+
+
+class FeaturePaginationTestCase(base.BaseTestCase):
+
+    MAX_RECORD_COUNT = 400
+    FEATURE_COUNT = 1000
+
+    def setUp(self):
+        super().setUp()
+        self.get_patch = mock.patch.object(http_utils, 'get',
+                                               side_effect=self._respond)
+        self.mock_get = self.get_patch.start()
+
+    def tearDown(self):
+        self.get_patch.stop()
+        super().tearDown()
+
+    def _respond(self, url, params, timeout=None):
+        """Stand-in for a FeatureServer layer with OBJECTIDs 1..1000"""
+        object_ids = list(range(1, self.FEATURE_COUNT + 1))
+        object_id_range = re.search(r'OBJECTID >= (\d+) AND OBJECTID <= (\d+)',
+                                    params['where'])
+        if object_id_range:
+            low, high = map(int, object_id_range.groups())
+            object_ids = [oid for oid in object_ids if low <= oid <= high]
+        if params.get('returnIdsOnly'):
+            return self._mock_response(json_data={
+                'objectIdFieldName': 'OBJECTID', 'objectIds': object_ids
+            })
+        if params.get('returnCountOnly'):
+            return self._mock_response(json_data={'count': len(object_ids)})
+        offset = params.get('resultOffset', 0)
+        count = min(params.get('resultRecordCount', self.MAX_RECORD_COUNT),
+                    self.MAX_RECORD_COUNT)
+        if 'resultOffset' in params and \
+                params.get('orderByFields') != 'OBJECTID':
+            # unsorted, offset pages may come in any order
+            object_ids.reverse()
+        page = object_ids[offset:offset + count]
+        return self._mock_response(json_data={
+            'objectIdFieldName': 'OBJECTID',
+            'features': [{'attributes': {'OBJECTID': oid}} for oid in page],
+            'exceededTransferLimit': offset + count < len(object_ids)
+        })
+
+    def _object_ids(self, features):
+        return [feature['attributes']['OBJECTID'] for feature in features]
+
+    def test_iter_features_by_offset(self):
+        to_test = list(gis_utils.iter_features('https://example.com/0'))
+        self.assertEqual(list(range(1, 1001)), self._object_ids(to_test))
+        pages = [call[1]['params'] for call in self.mock_get.call_args_list
+                 if call[1]['params'].get('orderByFields') == 'OBJECTID']
+        self.assertEqual([0, 400, 800],
+                         [page['resultOffset'] for page in pages])
+
+    def test_iter_features_single_page(self):
+        self.FEATURE_COUNT = 10
+        to_test = list(gis_utils.iter_features('https://example.com/0'))
+        self.assertEqual(10, len(to_test))
+        self.assertEqual(1, self.mock_get.call_count)
+
+    def test_iter_features_by_object_id(self):
+        to_test = list(gis_utils.iter_features(
+            'https://example.com/0',
+            page_size=300,
+            partition=gis_utils.PAGINATE_BY_OBJECT_ID
+        ))
+        self.assertEqual(list(range(1, 1001)), self._object_ids(to_test))
+        # one request for the IDs and one per range of 300
+        self.assertEqual(5, self.mock_get.call_count)
+
+    def test_get_features_from_feature_server_gets_every_page(self):
+        to_test = gis_utils.get_features_from_feature_server(
+            'https://example.com/0', '1=1'
+        )
+        self.assertEqual(1000, len(to_test))
@@ -1,6 +1,9 @@
 import unittest
+import unittest.mock as mock
+import urllib.parse
 import mycity.test.unit_tests.base as base
 import mycity.utilities.google_maps_utils as g_maps_utils
+import mycity.utilities.http_utils as http_utils
 
 
 class TestGoogleMapsUtilities(base.BaseTestCase):
@@ -31,4 +34,189 @@ class TestGoogleMapsUtilities(base.BaseTestCase):
         to_test = g_maps_utils._setup_google_maps_query_params(origin, dests)
         self.assertEqual(origin, to_test["origins"])
         self.assertEqual(dests, to_test["destinations"].split("|"))
-        self.assertEqual("imperial", to_test["units"])    
+        self.assertEqual("imperial", to_test["units"])
+
+
+    def test_get_driving_matrix(self):
+        def element(meters):
+            return {"distance": {"value": meters, "text": str(meters) + " m"},
+                    "duration": {"value": meters, "text": str(meters) + " s"}}
+
+        response = self._mock_response(json_data={"rows": [
+            {"elements": [element(1), element(2)]},
+            {"elements": [element(3), element(4)]}
+        ]})
+        with mock.patch.object(http_utils, 'get') as mock_get:
+            mock_get.return_value = response
+            to_test = g_maps_utils.get_driving_matrix(
+                ["1 First St", "2 Second St"], "Address", ["A St", "B St"]
+            )
+        self.assertEqual("1 First St|2 Second St",
+                         mock_get.call_args[1]["params"]["origins"])
+        self.assertEqual(2, len(to_test))
+        self.assertEqual(
+            [3, 4],
+            [info[g_maps_utils.DRIVING_DISTANCE_VALUE_KEY]
+             for info in to_test[1]]
+        )
+        self.assertEqual("B St", to_test[1][1]["Address"])
+
+    def test_get_driving_matrix_failure(self):
+        response = self._mock_response(status=500)
+        with mock.patch.object(http_utils, 'get') as mock_get:
+            mock_get.return_value = response
+            self.assertIsNone(g_maps_utils.get_driving_matrix(
+                ["1 First St"], "Address", ["A St"]
+            ))
+
+    def test_get_driving_matrix_non_json_response(self):
+        response = self._mock_response(content="<html>Quota</html>")
+        response.json.side_effect = ValueError
+        with mock.patch.object(http_utils, 'get') as mock_get:
+            mock_get.return_value = response
+            self.assertIsNone(g_maps_utils.get_driving_matrix(
+                ["1 First St"], "Address", ["A St"]
+            ))
+
+
+class DrivingInfoCacheTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        g_maps_utils._driving_info_cache.clear()
+        self.get_patch = mock.patch.object(http_utils, 'get')
+        self.mock_get = self.get_patch.start()
+
+    def tearDown(self):
+        self.get_patch.stop()
+        g_maps_utils._driving_info_cache.clear()
+        super().tearDown()
+
+    @staticmethod
+    def _element(meters):
+        return {
+            "distance": {"value": meters, "text": str(meters) + " m"},
+            "duration": {"value": meters, "text": str(meters) + " s"}
+        }
+
+    def _respond_with(self, *meters):
+        self.mock_get.return_value = self._mock_response(
+            json_data={
+                "rows": [
+                    {"elements": [self._element(m) for m in meters]}
+                ]
+            }
+        )
+
+    def test_non_json_response_is_not_cached(self):
+        response = self._mock_response(content="<html>Quota</html>")
+        response.json.side_effect = ValueError
+        self.mock_get.return_value = response
+        self.assertIsNone(g_maps_utils._get_driving_info(
+            "46 Everdean St Boston, MA", "Address", ["1 A St"]
+        ))
+        self.assertEqual(0, g_maps_utils.get_driving_info_cache_stats()['size'])
+
+    def test_partial_hit_only_requests_missing_destinations(self):
+        origin = "46 Everdean St Boston, MA"
+        self._respond_with(100)
+        g_maps_utils._get_driving_info(origin, "Address", ["1 A St"])
+
+        self._respond_with(200)
+        to_test = g_maps_utils._get_driving_info(
+            "46 everdean st  boston MA", "Address", ["1 A St", "2 B St"]
+        )
+        params = self.mock_get.call_args[1]["params"]
+        self.assertEqual("2 B St", params["destinations"])
+        self.assertEqual(
+            [("1 A St", 100), ("2 B St", 200)],
+            [(info["Address"], info[g_maps_utils.DRIVING_DISTANCE_VALUE_KEY])
+             for info in to_test]
+        )
+        stats = g_maps_utils.get_driving_info_cache_stats()
+        self.assertEqual(1, stats["hits"])
+        self.assertEqual(2, stats["misses"])
+
+    def test_full_hit_makes_no_request(self):
+        self._respond_with(100, 200)
+        g_maps_utils._get_driving_info("origin", "Address", ["1 A", "2 B"])
+        self.mock_get.reset_mock()
+        to_test = g_maps_utils._get_driving_info("origin", "Address",
+                                                 ["2 B", "1 A"])
+        self.mock_get.assert_not_called()
+        self.assertEqual(["2 B", "1 A"],
+                         [info["Address"] for info in to_test])
+
+
+class ChunkedDrivingInfoTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        g_maps_utils._driving_info_cache.clear()
+        self.get_patch = mock.patch.object(http_utils, 'get')
+        self.mock_get = self.get_patch.start()
+        self.mock_get.side_effect = self._respond
+
+    def tearDown(self):
+        self.get_patch.stop()
+        g_maps_utils._driving_info_cache.clear()
+        super().tearDown()
+
+    def _respond(self, url, params, timeout=None):
+        destinations = params["destinations"].split("|")
+        if "fail" in destinations[0]:
+            return self._mock_response(status=500)
+        elements = [
+            {"distance": {"value": int(destination.split()[0]), "text": ""},
+             "duration": {"value": 1, "text": ""}}
+            for destination in destinations
+        ]
+        return self._mock_response(json_data={
+            "rows": [{"elements": elements}]
+        })
+
+    def test_chunk_destinations_respects_destination_limit(self):
+        destinations = ["{} Main St".format(n) for n in range(60)]
+        chunks = g_maps_utils._chunk_destinations("origin", destinations)
+        self.assertEqual([25, 25, 10], [len(chunk) for chunk in chunks])
+        self.assertEqual(destinations, sum(chunks, []))
+
+    def test_chunk_destinations_respects_url_length(self):
+        destinations = ["{} {}".format(n, "Long Street Name " * 40)
+                        for n in range(20)]
+        chunks = g_maps_utils._chunk_destinations("origin", destinations)
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            params = g_maps_utils._setup_google_maps_query_params("origin",
+                                                                  chunk)
+            url = g_maps_utils.GOOGLE_MAPS_URL + "?" + \
+                urllib.parse.urlencode(params)
+            self.assertLessEqual(len(url), g_maps_utils.MAX_URL_LENGTH)
+
+    def test_chunks_are_merged_in_order(self):
+        destinations = ["{} Main St".format(n) for n in range(60)]
+        to_test = g_maps_utils._get_driving_info("origin", "Address",
+                                                 destinations)
+        self.assertEqual(3, self.mock_get.call_count)
+        self.assertEqual(destinations,
+                         [info["Address"] for info in to_test])
+        self.assertEqual(
+            list(range(60)),
+            [info[g_maps_utils.DRIVING_DISTANCE_VALUE_KEY]
+             for info in to_test]
+        )
+
+    def test_failed_chunk_fails_the_request(self):
+        destinations = ["{} Main St".format(n) for n in range(25)] + \
+            ["{} fail St".format(n) for n in range(25)]
+        self.assertIsNone(g_maps_utils._get_driving_info("origin", "Address",
+                                                         destinations))
+        # the chunk that succeeded is not requested again
+        self.mock_get.reset_mock()
+        g_maps_utils._get_driving_info("origin", "Address", destinations[:25])
+        self.mock_get.assert_not_called()
+
+    def test_all_chunks_failed(self):
+        self.assertIsNone(g_maps_utils._get_driving_info(
+            "origin", "Address", ["1 fail St"]
+        ))
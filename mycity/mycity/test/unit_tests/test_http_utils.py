@@ -0,0 +1,250 @@
+import threading
+import requests
+import unittest.mock as mock
+import mycity.test.unit_tests.base as base
+import mycity.utilities.concurrency_utils as concurrency_utils
+import mycity.utilities.deadline_utils as deadline_utils
+import mycity.utilities.http_utils as http_utils
+
+
+class HTTPUtilitiesTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        http_utils.close()
+        self.session_patch = mock.patch.object(http_utils, 'get_session')
+        self.mock_request = self.session_patch.start().return_value.request
+        self.mock_request.return_value = self._mock_response()
+
+    def tearDown(self):
+        self.session_patch.stop()
+        deadline_utils.set_current_deadline(None)
+        http_utils.HOST_LIMITS.clear()
+        http_utils.close()
+        super().tearDown()
+
+    def test_get_uses_shared_session(self):
+        http_utils.get("https://example.com/a", params={"q": "1"})
+        self.mock_request.assert_called_with(
+            'GET', "https://example.com/a", params={"q": "1"},
+            timeout=deadline_utils.DEFAULT_TIMEOUT
+        )
+
+    def test_timeout_comes_from_deadline(self):
+        deadline_utils.set_current_deadline(deadline_utils.Deadline(1))
+        http_utils.post("https://example.com/a", data="x")
+        self.assertLessEqual(self.mock_request.call_args[1]['timeout'], 1)
+
+    def test_explicit_timeout_is_kept(self):
+        http_utils.get("https://example.com/a", timeout=2)
+        self.assertEqual(2, self.mock_request.call_args[1]['timeout'])
+
+    def test_host_limit(self):
+        http_utils.HOST_LIMITS['busy.example.com'] = 1
+        in_flight = threading.Event()
+        release = threading.Event()
+
+        def slow_request(*args, **kwargs):
+            in_flight.set()
+            release.wait(5)
+            return self._mock_response()
+
+        self.mock_request.side_effect = slow_request
+        thread = threading.Thread(
+            target=http_utils.get, args=("https://busy.example.com/a",)
+        )
+        thread.start()
+        try:
+            in_flight.wait(5)
+            deadline_utils.set_current_deadline(deadline_utils.Deadline(0.01))
+            with self.assertRaises(deadline_utils.DeadlineExceeded):
+                http_utils.get("https://busy.example.com/b")
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual(1, self.mock_request.call_count)
+
+    def test_host_override(self):
+        http_utils.set_host_override("recollect.net", "http://127.0.0.1:8080")
+        try:
+            http_utils.get("https://recollect.net/api/places?a=1")
+        finally:
+            http_utils.clear_host_overrides()
+        self.assertEqual("http://127.0.0.1:8080/api/places?a=1",
+                         self.mock_request.call_args[0][1])
+
+    def test_hedge_delay_follows_latency_percentile(self):
+        host = "recollect.net"
+        self.assertEqual(http_utils.DEFAULT_HEDGE_DELAY,
+                         http_utils.get_hedge_delay(host))
+        for tenths in range(1, 21):
+            http_utils._record_latency(host, tenths / 10)
+        self.assertEqual(1.9, http_utils.get_hedge_delay(host))
+
+
+class CircuitBreakerTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        http_utils.close()
+        self.session_patch = mock.patch.object(http_utils, 'get_session')
+        self.mock_request = self.session_patch.start().return_value.request
+        self.mock_request.return_value = self._mock_response(status=503)
+
+    def tearDown(self):
+        self.session_patch.stop()
+        http_utils.close()
+        super().tearDown()
+
+    def test_circuit_opens_for_failing_host(self):
+        url = "https://recollect.net/api/places"
+        for _ in range(http_utils.CIRCUIT_FAILURE_THRESHOLD):
+            http_utils.get(url)
+        with self.assertRaises(http_utils.CircuitOpen):
+            http_utils.get(url)
+        self.assertEqual(http_utils.CIRCUIT_FAILURE_THRESHOLD,
+                         self.mock_request.call_count)
+
+    def test_timeouts_cut_short_by_deadline_are_not_failures(self):
+        url = "https://recollect.net/api/places"
+        self.mock_request.side_effect = requests.exceptions.Timeout
+        deadline_utils.set_current_deadline(deadline_utils.Deadline(
+            deadline_utils.DEFAULT_TIMEOUT / 2
+        ))
+        try:
+            for _ in range(http_utils.CIRCUIT_FAILURE_THRESHOLD):
+                with self.assertRaises(requests.exceptions.Timeout):
+                    http_utils.get(url)
+        finally:
+            deadline_utils.set_current_deadline(None)
+        self.assertEqual(concurrency_utils.CircuitBreaker.CLOSED,
+                         http_utils.get_circuit_breaker("recollect.net").state)
+
+    def test_full_timeouts_are_failures(self):
+        url = "https://recollect.net/api/places"
+        self.mock_request.side_effect = requests.exceptions.Timeout
+        for _ in range(http_utils.CIRCUIT_FAILURE_THRESHOLD):
+            with self.assertRaises(requests.exceptions.Timeout):
+                http_utils.get(url)
+        with self.assertRaises(http_utils.CircuitOpen):
+            http_utils.get(url)
+
+    def test_deadline_exceeded_is_not_a_failure(self):
+        url = "https://recollect.net/api/places"
+        self.mock_request.side_effect = deadline_utils.DeadlineExceeded
+        for _ in range(http_utils.CIRCUIT_FAILURE_THRESHOLD):
+            with self.assertRaises(deadline_utils.DeadlineExceeded):
+                http_utils.get(url)
+        self.assertEqual(concurrency_utils.CircuitBreaker.CLOSED,
+                         http_utils.get_circuit_breaker("recollect.net").state)
+
+    def test_hosts_without_breaker_are_not_refused(self):
+        for _ in range(http_utils.CIRCUIT_FAILURE_THRESHOLD + 1):
+            http_utils.get("https://example.com/a")
+        self.assertIsNone(http_utils.get_circuit_breaker("example.com"))
+
+
+class HedgedGetTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        http_utils.close()
+        self.release = threading.Event()
+        self.get_patch = mock.patch.object(http_utils, 'get')
+        self.mock_get = self.get_patch.start()
+        self.delay_patch = mock.patch.object(http_utils, 'get_hedge_delay',
+                                             return_value=0.01)
+        self.delay_patch.start()
+
+    def tearDown(self):
+        self.release.set()
+        self.delay_patch.stop()
+        self.get_patch.stop()
+        http_utils.close()
+        super().tearDown()
+
+    def test_fast_response_is_not_hedged(self):
+        self.mock_get.return_value = self._mock_response()
+        response = http_utils.get_hedged("https://recollect.net/a")
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(1, self.mock_get.call_count)
+
+    def test_slow_request_is_hedged(self):
+        slow = self._mock_response(content=b"slow")
+        fast = self._mock_response(content=b"fast")
+
+        def respond(url, params, **kwargs):
+            if self.mock_get.call_count == 1:
+                self.release.wait(5)
+                return slow
+            return fast
+
+        self.mock_get.side_effect = respond
+        response = http_utils.get_hedged("https://recollect.net/a")
+        self.assertIs(fast, response)
+        self.assertEqual(2, self.mock_get.call_count)
+
+
+class CachedGetTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        http_utils.clear_cache()
+        self.get_patch = mock.patch.object(http_utils, 'get')
+        self.mock_get = self.get_patch.start()
+
+    def tearDown(self):
+        self.get_patch.stop()
+        http_utils.clear_cache()
+        super().tearDown()
+
+    def test_response_is_cached_per_params(self):
+        response = self._mock_response()
+        response.text = "a"
+        self.mock_get.return_value = response
+        first = http_utils.get_cached("https://example.com/a", 60, 60,
+                                      params={"q": "1", "r": "2"})
+        second = http_utils.get_cached("https://example.com/a", 60, 60,
+                                       params={"r": "2", "q": "1"})
+        http_utils.get_cached("https://example.com/a", 60, 60,
+                              params={"q": "2"})
+        self.assertEqual("a", first)
+        self.assertEqual("a", second)
+        self.assertEqual(2, self.mock_get.call_count)
+        self.assertEqual(1, http_utils.get_cache_stats()['hits'])
+
+    def test_parsed_body_is_cached(self):
+        self.mock_get.return_value = self._mock_response(
+            json_data={"result": []}
+        )
+        first = http_utils.get_cached("https://example.com/a", 60, 60,
+                                      parse=http_utils.get_json)
+        second = http_utils.get_cached("https://example.com/a", 60, 60,
+                                       parse=http_utils.get_json)
+        self.assertEqual({"result": []}, first)
+        self.assertIs(first, second)
+        self.assertEqual(1, self.mock_get.call_count)
+
+    def test_error_response_is_not_cached(self):
+        self.mock_get.return_value = self._mock_response(status=500)
+        with self.assertRaises(requests.exceptions.HTTPError) as context:
+            http_utils.get_cached("https://example.com/a", 60, 60)
+        self.assertEqual(500, context.exception.response.status_code)
+        with self.assertRaises(requests.exceptions.HTTPError):
+            http_utils.get_cached("https://example.com/a", 60, 60)
+        self.assertEqual(2, self.mock_get.call_count)
+        self.assertEqual(0, http_utils.get_cache_stats()['size'])
+
+
+class SessionTestCase(base.BaseTestCase):
+
+    def tearDown(self):
+        http_utils.close()
+        super().tearDown()
+
+    def test_session_is_reused(self):
+        session = http_utils.get_session()
+        self.assertIs(session, http_utils.get_session())
+        self.assertIn('gzip', session.headers['Accept-Encoding'])
+        http_utils.close()
+        self.assertIsNot(session, http_utils.get_session())
@@ -0,0 +1,46 @@
+import concurrent.futures
+import threading
+import mycity.test.unit_tests.base as base
+import mycity.utilities.invocation_utils as invocation_utils
+
+
+class InvocationUtilitiesTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.executor = concurrent.futures.ThreadPoolExecutor(2)
+
+    def tearDown(self):
+        self.executor.shutdown()
+        invocation_utils.set_value('name', None)
+        super().tearDown()
+
+    def test_submitted_work_sees_submitter_state(self):
+        invocation_utils.set_value('name', 'first')
+        future = invocation_utils.submit(self.executor,
+                                         invocation_utils.get_value, 'name')
+        self.assertEqual('first', future.result())
+
+    def test_pool_threads_keep_no_state(self):
+        invocation_utils.set_value('name', 'first')
+        invocation_utils.submit(self.executor, lambda: None).result()
+        futures = [self.executor.submit(invocation_utils.get_value, 'name')
+                   for _ in range(2)]
+        self.assertEqual([None, None], [f.result() for f in futures])
+
+    def test_concurrent_invocations_keep_their_own_state(self):
+        barrier = threading.Barrier(2)
+        seen = {}
+
+        def invocation(name):
+            invocation_utils.set_value('name', name)
+            barrier.wait(5)
+            seen[name] = invocation_utils.get_value('name')
+
+        threads = [threading.Thread(target=invocation, args=(name,))
+                   for name in ('first', 'second')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual({'first': 'first', 'second': 'second'}, seen)
@@ -0,0 +1,125 @@
+import concurrent.futures
+import io
+import json
+import unittest.mock as mock
+import mycity.test.unit_tests.base as base
+import mycity.utilities.http_utils as http_utils
+import mycity.utilities.metrics_utils as metrics_utils
+
+
+class MetricsUtilsTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        metrics_utils.clear_metrics()
+
+    def tearDown(self):
+        super().tearDown()
+        metrics_utils.clear_metrics()
+
+    def _records_by_name(self):
+        return {record.get('Upstream', record.get('Cache')): record
+                for record in metrics_utils.get_emf_records(1000)}
+
+    def test_upstream_names(self):
+        self.assertEqual('ReCollect',
+                         metrics_utils.get_upstream_name('recollect.net'))
+        self.assertEqual('ArcGIS', metrics_utils.get_upstream_name(
+            'bostonopendata-boston.opendata.arcgis.com'))
+        self.assertEqual('example.com',
+                         metrics_utils.get_upstream_name('Example.com:443'))
+
+    def test_requests_are_aggregated_per_upstream(self):
+        metrics_utils.record_request('recollect.net', 0.25, 200, 100)
+        metrics_utils.record_request('recollect.net', 0.5, 503, 0)
+        metrics_utils.record_request('recollect.net', 0.1, 404, 0)
+        metrics_utils.record_request('recollect.net', 1.0)
+        metrics_utils.record_retry('recollect.net')
+        record = self._records_by_name()['ReCollect']
+        self.assertEqual([250.0, 500.0, 100.0, 1000.0], record['Latency'])
+        self.assertEqual(4, record['Requests'])
+        self.assertEqual(1, record['Status2xx'])
+        self.assertEqual(0, record['Status3xx'])
+        self.assertEqual(1, record['Status4xx'])
+        self.assertEqual(1, record['Status5xx'])
+        self.assertEqual(1, record['Errors'])
+        self.assertEqual(100, record['Bytes'])
+        self.assertEqual(1, record['Retries'])
+
+    def test_record_is_emf(self):
+        metrics_utils.record_request('hooks.slack.com', 0.1, 200, 2)
+        record = self._records_by_name()['Slack']
+        directive = record['_aws']['CloudWatchMetrics'][0]
+        self.assertEqual(1000, record['_aws']['Timestamp'])
+        self.assertEqual(metrics_utils.NAMESPACE, directive['Namespace'])
+        self.assertEqual([['Upstream']], directive['Dimensions'])
+        units = {metric['Name']: metric['Unit']
+                 for metric in directive['Metrics']}
+        self.assertEqual('Milliseconds', units['Latency'])
+        for name in units:
+            self.assertIn(name, record)
+
+    def test_latency_values_are_capped(self):
+        for _ in range(metrics_utils.MAX_VALUES_PER_METRIC + 5):
+            metrics_utils.record_request('recollect.net', 0.1, 200)
+        record = self._records_by_name()['ReCollect']
+        self.assertEqual(metrics_utils.MAX_VALUES_PER_METRIC,
+                         len(record['Latency']))
+        self.assertEqual(metrics_utils.MAX_VALUES_PER_METRIC + 5,
+                         record['Requests'])
+
+    def test_cache_counters_are_reported_as_growth(self):
+        metrics_utils.record_cache_stats('http', {'hits': 3, 'size': 2})
+        self.assertEqual(3, self._records_by_name()['http']['Hits'])
+        metrics_utils.record_cache_stats('http', {'hits': 5, 'size': 4})
+        record = self._records_by_name()['http']
+        self.assertEqual(2, record['Hits'])
+        self.assertEqual(4, record['Size'])
+
+    def test_flush_writes_lines_and_starts_anew(self):
+        metrics_utils.record_request('recollect.net', 0.1, 200)
+        metrics_utils.record_request('maps.googleapis.com', 0.1, 200)
+        stream = io.StringIO()
+        self.assertEqual(2, metrics_utils.flush(stream))
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(['Google', 'ReCollect'],
+                         [json.loads(line)['Upstream'] for line in lines])
+        self.assertEqual([], metrics_utils.get_emf_records())
+
+    def test_http_requests_are_recorded(self):
+        response = self._mock_response(content=b'four')
+        response.headers = {'Content-Length': '4'}
+        with mock.patch.object(http_utils.get_session(), 'request',
+                               return_value=response):
+            http_utils.get('https://recollect.net/api/places')
+        record = self._records_by_name()['ReCollect']
+        self.assertEqual(1, record['Requests'])
+        self.assertEqual(4, record['Bytes'])
+
+    def test_size_of_responses_without_content_length(self):
+        response = self._mock_response(content=b'chunked')
+        response.headers = {'Transfer-Encoding': 'chunked'}
+        with mock.patch.object(http_utils.get_session(), 'request',
+                               return_value=response):
+            http_utils.get('https://recollect.net/api/places')
+            http_utils.get('https://recollect.net/api/places', stream=True)
+        record = self._records_by_name()['ReCollect']
+        self.assertEqual(2, record['Requests'])
+        self.assertEqual(7, record['Bytes'])
+
+    def test_invocations_flush_their_own_metrics(self):
+        def invocation(host):
+            metrics_utils.start_recording()
+            metrics_utils.record_request(host, 0.1, 200)
+            return metrics_utils.get_emf_records()
+
+        executor = concurrent.futures.ThreadPoolExecutor(2)
+        try:
+            first = executor.submit(invocation, 'recollect.net')
+            second = executor.submit(invocation, 'hooks.slack.com')
+            self.assertEqual(['ReCollect'], [record['Upstream']
+                                             for record in first.result()])
+            self.assertEqual(['Slack'], [record['Upstream']
+                                         for record in second.result()])
+        finally:
+            executor.shutdown()
@@ -4,8 +4,10 @@ unit test for MyCityController
 """
 
 import unittest.mock as mock
+import requests
 import mycity.test.test_constants as test_constants
 import mycity.mycity_controller as my_con
+import mycity.utilities.deadline_utils as deadline_utils
 import mycity.intents.intent_constants as intent_constants
 import mycity.test.unit_tests.base as base
 
@@ -20,6 +22,7 @@ class MyCityControllerUnitTestCase(base.BaseTestCase):
         on_intent
         on_session_ended
         get_welcome_response
+        get_timeout_response
         handle_session_end_request
     """
 
@@ -101,7 +104,7 @@ class MyCityControllerUnitTestCase(base.BaseTestCase):
         self.controller.on_intent(self.request)
         mock_intent.assert_called_with(self.request)
 
-    @mock.patch('requests.get')
+    @mock.patch('mycity.utilities.http_utils.get')
     def test_get_address_from_user_device(self, mock_get):
         mock_resp = self._mock_response(status=200, 
             json_data=test_constants.ALEXA_DEVICE_ADDRESS)
@@ -111,7 +114,7 @@ class MyCityControllerUnitTestCase(base.BaseTestCase):
         self.assertEquals(expected_output_text, 
             result.session_attributes[intent_constants.CURRENT_ADDRESS_KEY])
 
-    @mock.patch('requests.get')
+    @mock.patch('mycity.utilities.http_utils.get')
     def test_get_address_from_user_device_failure(self, mock_get):
         mock_resp = self._mock_response(status=403)
         mock_get.return_value = mock_resp
@@ -125,3 +128,28 @@ class MyCityControllerUnitTestCase(base.BaseTestCase):
         self.request.session_attributes[intent_constants.CURRENT_ADDRESS_KEY] = '46 Everdean St'
         with self.assertRaises(ValueError):
             self.controller.on_intent(self.request)
+
+    def test_execute_request_when_deadline_passes(self):
+        self.request.is_new_session = False
+        self.request.request_type = "IntentRequest"
+        self.request.intent_name = "GetAlertsIntent"
+        with mock.patch.object(my_con, 'get_alerts_intent',
+                               side_effect=deadline_utils.DeadlineExceeded):
+            response = self.controller.execute_request(self.request)
+        self.assertEqual(
+            self.controller.get_timeout_response(self.request).output_speech,
+            response.output_speech
+        )
+        self.assertFalse(response.should_end_session)
+
+    def test_execute_request_when_upstream_times_out(self):
+        self.request.is_new_session = False
+        self.request.request_type = "IntentRequest"
+        self.request.intent_name = "GetAlertsIntent"
+        with mock.patch.object(my_con, 'get_alerts_intent',
+                               side_effect=requests.exceptions.ReadTimeout):
+            response = self.controller.execute_request(self.request)
+        self.assertEqual(
+            self.controller.get_timeout_response(self.request).output_speech,
+            response.output_speech
+        )
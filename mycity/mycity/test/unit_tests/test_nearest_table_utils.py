@@ -0,0 +1,97 @@
+import os
+import tempfile
+import mycity.test.unit_tests.base as base
+import mycity.utilities.geo_utils as geo_utils
+import mycity.utilities.google_maps_utils as g_maps_utils
+import mycity.utilities.nearest_table_utils as nearest_table_utils
+
+
+CITY_HALL = (42.3603, -71.0580)
+FENWAY_PARK = (42.3467, -71.0972)
+
+
+def closest_record(name, meters, seconds):
+    return {
+        'Name': name,
+        'Address': '1 ' + name + ' St Boston, MA',
+        g_maps_utils.DRIVING_DISTANCE_VALUE_KEY: meters,
+        g_maps_utils.DRIVING_DISTANCE_TEXT_KEY: str(meters) + ' m',
+        g_maps_utils.DRIVING_TIME_VALUE_KEY: seconds,
+        g_maps_utils.DRIVING_TIME_TEXT_KEY: str(seconds) + ' s'
+    }
+
+
+class NearestTableTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.table = nearest_table_utils.NearestTable.from_closest_records(
+            6,
+            [
+                (geo_utils.encode_geohash(*FENWAY_PARK, precision=6),
+                 closest_record('Fenway', 300, 60)),
+                (geo_utils.encode_geohash(*CITY_HALL, precision=6),
+                 closest_record('Hall', 200, 30)),
+                ('drt000', None)
+            ]
+        )
+
+    def test_lookup(self):
+        to_test = self.table.lookup(CITY_HALL)
+        self.assertEqual({
+            'Name': 'Hall',
+            'Address': '1 Hall St Boston, MA',
+            g_maps_utils.DRIVING_DISTANCE_VALUE_KEY: 200,
+            g_maps_utils.DRIVING_DISTANCE_TEXT_KEY: 'about 0.1 mi',
+            g_maps_utils.DRIVING_TIME_VALUE_KEY: 30,
+            g_maps_utils.DRIVING_TIME_TEXT_KEY: 'about 1 min'
+        }, to_test)
+
+    def test_lookup_without_driving_info(self):
+        record = {'Name': 'Hall', 'Address': '1 Hall St Boston, MA'}
+        table = nearest_table_utils.NearestTable.from_closest_records(
+            6, [(geo_utils.encode_geohash(*CITY_HALL, precision=6), record)]
+        )
+        self.assertEqual(record, table.lookup(CITY_HALL))
+
+    def test_cells_sharing_a_record_keep_their_own_driving_info(self):
+        near = (42.3603, -71.0580)
+        far = (42.3503, -71.0580)
+        table = nearest_table_utils.NearestTable.from_closest_records(6, [
+            (geo_utils.encode_geohash(*near, precision=6),
+             closest_record('Hall', 200, 30)),
+            (geo_utils.encode_geohash(*far, precision=6),
+             closest_record('Hall', 1500, 240))
+        ])
+        self.assertEqual(1, len(table.records))
+        self.assertEqual(1500, table.lookup(far)[
+            g_maps_utils.DRIVING_DISTANCE_VALUE_KEY])
+
+    def test_lookup_unknown_cell(self):
+        self.assertIsNone(self.table.lookup((42.0, -72.0)))
+
+    def test_cells_without_record_are_skipped(self):
+        self.assertEqual(2, len(self.table))
+
+    def test_round_trip_through_bytes(self):
+        to_test = nearest_table_utils.NearestTable.from_bytes(
+            self.table.to_bytes()
+        )
+        self.assertEqual(self.table.lookup(FENWAY_PARK),
+                         to_test.lookup(FENWAY_PARK))
+        self.assertEqual(self.table.built_at, to_test.built_at)
+
+    def test_from_bytes_rejects_other_files(self):
+        with self.assertRaises(ValueError):
+            nearest_table_utils.NearestTable.from_bytes(b'Address,Name\n')
+
+    def test_write_and_read_table(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'table.bin')
+            nearest_table_utils.write_table(path, self.table)
+            to_test = nearest_table_utils.read_table(path)
+        self.assertEqual(self.table.lookup(CITY_HALL),
+                         to_test.lookup(CITY_HALL))
+
+    def test_read_missing_table(self):
+        self.assertIsNone(nearest_table_utils.read_table('/nonexistent.bin'))
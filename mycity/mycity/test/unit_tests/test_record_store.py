@@ -0,0 +1,37 @@
+import mycity.test.unit_tests.base as base
+import mycity.utilities.finder.RecordStore as record_store
+
+
+class RecordStoreTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.records = [
+            {'Address': '1 City Hall Square', 'name': 'City Hall'},
+            {'Address': '100 Dorchester Ave', 'name': 'Lot A'},
+            {'Address': '100 Dorchester Ave', 'name': 'Lot B'}
+        ]
+        self.store = record_store.RecordStore(self.records, 'Address')
+        record_store.clear_store_cache()
+
+    def tearDown(self):
+        record_store.clear_store_cache()
+        super().tearDown()
+
+    def test_find_by_address(self):
+        self.assertIs(self.records[0],
+                      self.store.find_by_address('1 City Hall Square'))
+
+    def test_find_by_address_returns_first_match(self):
+        self.assertEqual('Lot A',
+                         self.store.find_by_address('100 Dorchester Ave')
+                         ['name'])
+
+    def test_find_by_address_not_found(self):
+        self.assertIsNone(self.store.find_by_address('123 Fake St'))
+
+    def test_cache_store(self):
+        record_store.cache_store('v1', self.store)
+        self.assertIs(self.store, record_store.get_cached_store('v1'))
+        self.assertIsNone(record_store.get_cached_store('v2'))
+        self.assertIsNone(record_store.get_cached_store(None))
@@ -0,0 +1,138 @@
+import codecs
+import os
+import shutil
+import tempfile
+import unittest.mock as mock
+import mycity.test.unit_tests.base as base
+import mycity.utilities.deadline_utils as deadline_utils
+import mycity.utilities.snapshot_utils as snapshot_utils
+
+URL = "http://example.com/dataset.csv"
+
+
+class SnapshotUtilitiesTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.snapshot_dir = tempfile.mkdtemp()
+        self.dir_patch = mock.patch.object(snapshot_utils, 'SNAPSHOT_DIR',
+                                           self.snapshot_dir)
+        self.get_patch = mock.patch(
+            'mycity.utilities.http_utils.get'
+        )
+        self.dir_patch.start()
+        self.mock_get = self.get_patch.start()
+        snapshot_utils.clear_snapshots()
+
+    def tearDown(self):
+        snapshot_utils.clear_snapshots()
+        self.get_patch.stop()
+        self.dir_patch.stop()
+        shutil.rmtree(self.snapshot_dir)
+        super().tearDown()
+
+    def _respond(self, status, content=b"", headers=None):
+        response = self._mock_response(status=status, content=content)
+        response.headers = headers or {}
+        self.mock_get.return_value = response
+
+    def test_fresh_snapshot_makes_no_request(self):
+        self._respond(200, b"a,b\n1,2\n", {'ETag': '"v1"'})
+        snapshot_utils.get_snapshot(URL)
+        snapshot = snapshot_utils.get_snapshot(URL)
+        self.assertEqual(1, self.mock_get.call_count)
+        self.assertEqual("a,b\n1,2\n", snapshot.text)
+        self.assertEqual('"v1"', snapshot.version)
+
+    def test_stale_snapshot_is_revalidated(self):
+        self._respond(200, b"a,b\n", {'ETag': '"v1"',
+                                      'Last-Modified': 'Mon, 01 Jan 2018'})
+        snapshot_utils.get_snapshot(URL, max_age=0)
+        self._respond(304)
+        snapshot = snapshot_utils.get_snapshot(URL, max_age=0)
+        headers = self.mock_get.call_args[1]['headers']
+        self.assertEqual('"v1"', headers['If-None-Match'])
+        self.assertEqual('Mon, 01 Jan 2018', headers['If-Modified-Since'])
+        self.assertEqual("a,b\n", snapshot.text)
+
+    def test_stale_snapshot_is_revalidated_in_background(self):
+        self._respond(200, b"a,b\n", {'ETag': '"v1"'})
+        snapshot_utils.get_snapshot(URL, max_age=0)
+        self._respond(200, b"a,b\n1,2\n", {'ETag': '"v2"'})
+        with mock.patch('mycity.utilities.cache_utils.refresh_in_background') \
+                as mock_refresh:
+            snapshot = snapshot_utils.get_snapshot(URL, max_age=0,
+                                                   stale_for=60)
+        self.assertEqual("a,b\n", snapshot.text)
+        self.assertEqual(1, self.mock_get.call_count)
+        key, revalidate, *args = mock_refresh.call_args[0]
+        revalidate(*args)
+        self.assertEqual("a,b\n1,2\n",
+                         snapshot_utils.get_snapshot(URL, max_age=60).text)
+        self.assertEqual({'hits': 1, 'stale_hits': 1, 'misses': 1},
+                         snapshot_utils.get_snapshot_stats())
+
+    def test_snapshot_is_loaded_from_disk(self):
+        self._respond(200, b"a,b\n")
+        first = snapshot_utils.get_snapshot(URL)
+        snapshot_utils.clear_snapshots()
+        second = snapshot_utils.get_snapshot(URL)
+        self.assertEqual(1, self.mock_get.call_count)
+        self.assertEqual(first.version, second.version)
+
+    def test_last_snapshot_returned_when_server_fails(self):
+        self._respond(200, b"a,b\n")
+        snapshot_utils.get_snapshot(URL, max_age=0)
+        self._respond(500)
+        self.assertEqual("a,b\n",
+                         snapshot_utils.get_snapshot(URL, max_age=0).text)
+
+    def test_last_snapshot_returned_when_out_of_time(self):
+        self._respond(200, b"a,b\n")
+        snapshot_utils.get_snapshot(URL, max_age=0)
+        self.mock_get.side_effect = deadline_utils.DeadlineExceeded
+        snapshot = snapshot_utils.get_snapshot(URL, max_age=0)
+        self.assertEqual("a,b\n", snapshot.text)
+
+    def test_get_encoding(self):
+        bom_body = codecs.BOM_UTF8 + b"X,Y"
+        self.assertEqual('utf-8-sig',
+                         snapshot_utils.get_encoding(None, bom_body))
+        self.assertEqual('utf-8-sig', snapshot_utils.get_encoding(
+            'text/csv; charset=utf-8', bom_body))
+        self.assertEqual('utf-8-sig', snapshot_utils.get_encoding(
+            'text/csv; charset=latin-1', bom_body))
+        self.assertEqual('iso8859-1', snapshot_utils.get_encoding(
+            'text/csv; charset=ISO-8859-1', b"X,Y"))
+        self.assertEqual('utf-8', snapshot_utils.get_encoding(None, b"X,Y"))
+
+    def test_get_encoding_ignores_unknown_charsets(self):
+        self.assertEqual('utf-8', snapshot_utils.get_encoding(
+            'text/csv; charset=x-made-up', b"X,Y"))
+        self.assertEqual('utf-8', snapshot_utils.get_encoding(
+            'text/csv; charset=base64', b"X,Y"))
+        self.assertEqual('utf-16', snapshot_utils.get_encoding(
+            'text/csv; charset=x-made-up', codecs.BOM_UTF16_LE + b"X\x00"))
+
+    def test_saving_leaves_no_temporary_files(self):
+        self._respond(200, b"a,b\n")
+        snapshot_utils.get_snapshot(URL)
+        body_path, metadata_path = snapshot_utils._snapshot_paths(URL)
+        self.assertEqual(sorted([body_path, metadata_path]), sorted(
+            os.path.join(self.snapshot_dir, name)
+            for name in os.listdir(self.snapshot_dir)
+        ))
+
+    def test_body_not_matching_metadata_is_not_loaded(self):
+        self._respond(200, b"a,b\n1,2\n", {'ETag': '"v1"'})
+        snapshot_utils.get_snapshot(URL)
+        body_path, _ = snapshot_utils._snapshot_paths(URL)
+        # as if a save of a newer version had only replaced the body
+        with open(body_path, 'wb') as f:
+            f.write(b"a,b\n3,4\n")
+        snapshot_utils.clear_snapshots()
+        self._respond(200, b"a,b\n3,4\n", {'ETag': '"v2"'})
+        snapshot = snapshot_utils.get_snapshot(URL)
+        self.assertEqual('"v2"', snapshot.version)
+        self.assertNotIn('If-None-Match',
+                         self.mock_get.call_args[1]['headers'])
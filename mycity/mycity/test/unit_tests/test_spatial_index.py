@@ -0,0 +1,51 @@
+import random
+import mycity.test.unit_tests.base as base
+import mycity.utilities.geo_utils as geo_utils
+import mycity.utilities.finder.SpatialIndex as spatial_index
+
+
+class SpatialIndexTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        generator = random.Random(311)
+        self.records = [
+            {
+                'Y': str(generator.uniform(42.23, 42.40)),
+                'X': str(generator.uniform(-71.19, -70.99))
+            }
+            for _ in range(500)
+        ]
+        spatial_index.clear_index_cache()
+
+    def tearDown(self):
+        spatial_index.clear_index_cache()
+        super().tearDown()
+
+    def test_nearest_matches_linear_ranking(self):
+        index = spatial_index.SpatialIndex.from_records(self.records, 'Y', 'X')
+        origin = (42.3601, -71.0589)
+        ranked, _ = geo_utils.rank_records_by_distance(
+            origin, self.records, 'Y', 'X'
+        )
+        expected = [self.records.index(record) for record in ranked[:10]]
+        self.assertEqual(expected, index.nearest(origin, 10))
+
+    def test_nearest_with_k_larger_than_index(self):
+        index = spatial_index.SpatialIndex.from_records(
+            self.records[:3], 'Y', 'X'
+        )
+        self.assertEqual(3, len(index.nearest((42.36, -71.06), 10)))
+
+    def test_records_without_coordinates_are_unindexed(self):
+        records = self.records[:2] + [{'Y': '', 'X': ''}]
+        index = spatial_index.SpatialIndex.from_records(records, 'Y', 'X')
+        self.assertEqual(2, len(index))
+        self.assertEqual([2], index.unindexed_positions)
+
+    def test_get_index_reuses_index_for_same_dataset(self):
+        first = spatial_index.get_index('v1', self.records, 'Y', 'X')
+        second = spatial_index.get_index('v1', self.records, 'Y', 'X')
+        third = spatial_index.get_index('v2', self.records, 'Y', 'X')
+        self.assertIs(first, second)
+        self.assertIsNot(first, third)
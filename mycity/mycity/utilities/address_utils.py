@@ -1,15 +1,89 @@
 """
-Utility function for building an address string from a mycity request
+Utility functions for parsing addresses and building an address string from
+a mycity request.
+
+Every address is parsed with one shared StreetAddressParser, and parses are
+memoized, since the same address is parsed several times per request and
+asked about again across warm invocations. canonicalize_address gives the
+key caches use to store data about an address.
 
 """
 
+import functools
+import re
 from streetaddress import StreetAddressParser
+from streetaddress.abbrevs import USA_ABBREVS
 import mycity.intents.intent_constants as intent_constants
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+# distinct addresses whose parses are kept
+MAX_CACHED_ADDRESSES = 1024
+PUNCTUATION_REGEX = re.compile(r'[.,]')
+
+# the parser holds only lookup tables and compiled patterns, so threads can
+# share it
+_parser = StreetAddressParser()
+
+
+def parse_address(address):
+    """
+    Parses an address into its parts
+
+    :param address: address string, e.g. "46 Everdean St, Boston 02122"
+    :return: dictionary with house, street_name, street_type, street_full,
+        suite_num, suite_type and other, which callers may modify
+    """
+    return dict(_parse_address(address))
+
+
+@functools.lru_cache(maxsize=MAX_CACHED_ADDRESSES)
+def _parse_address(address):
+    return _parser.parse(address)
+
+
+@functools.lru_cache(maxsize=MAX_CACHED_ADDRESSES)
+def canonicalize_address(address):
+    """
+    Reduces an address to a key that is the same for the ways the address
+    is said or written: case, punctuation, extra spaces and spelled out
+    street types like "Street" for "St" are ignored. Addresses without a
+    house number are only reduced in case, punctuation and spacing.
+
+    :param address: address string
+    :return: canonical address string, e.g. "46 everdean st boston 02122"
+    """
+    parsed = _parse_address(PUNCTUATION_REGEX.sub(' ', address))
+    if not parsed['house'] or not parsed['street_name']:
+        return ' '.join(PUNCTUATION_REGEX.sub(' ', address).lower().split())
+    street_type = (parsed['street_type'] or '').lower()
+    parts = [parsed['house'], parsed['street_name'],
+             USA_ABBREVS.get(street_type, street_type),
+             parsed['suite_type'], parsed['suite_num'], parsed['other']]
+    return ' '.join(' '.join(part for part in parts if part).lower().split())
+
+
+def get_parse_cache_stats():
+    """
+    :return: dictionary with hits, misses and size of the cache of parsed
+        addresses
+    """
+    info = _parse_address.cache_info()
+    return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize}
+
+
+def clear_parse_cache():
+    """
+    Forget every memoized parse and canonical address
+
+    :return: None
+    """
+    _parse_address.cache_clear()
+    canonicalize_address.cache_clear()
+
+
 def build_origin_address(req):
     """
     Builds an address from an Alexa session. Assumes city is Boston if not
@@ -19,10 +93,9 @@ def build_origin_address(req):
     :return: String containing full address
     """
     logger.debug('MyCityRequestDataModel received:' + req.get_logger_string())
-    address_parser = StreetAddressParser()
     current_address = \
         req.session_attributes[intent_constants.CURRENT_ADDRESS_KEY]
-    parsed_address = address_parser.parse(current_address)
+    parsed_address = parse_address(current_address)
     origin_address = " ".join([parsed_address["house"],
                                parsed_address["street_full"]])
     if parsed_address["other"]:
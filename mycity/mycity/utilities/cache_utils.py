@@ -0,0 +1,622 @@
+"""
+Caches shared by the utilities and intents. Caches live in module scope of
+their users so they persist across warm Lambda invocations. PersistentCache
+keeps its entries in a pluggable storage, which can be an sqlite file under
+the temp directory so the entries also survive a new process in the same
+container.
+
+"""
+
+import collections
+import concurrent.futures
+import json
+import os
+import sqlite3
+import threading
+import time
+import mycity.utilities.concurrency_utils as concurrency_utils
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# threads refreshing stale entries in the background. Lambda freezes them
+# once an invocation returns; a refresh running longer than
+# REFRESH_ABANDON_AFTER seconds is taken to have been frozen and is started
+# again by the next stale hit
+REFRESH_MAX_WORKERS = 2
+REFRESH_ABANDON_AFTER = 30
+
+_refresh_executor = None
+_refreshing = {}
+_refresh_lock = threading.Lock()
+
+
+class LRUCache(object):
+
+    """
+    Thread-safe least-recently-used cache whose entries expire after a fixed
+    time to live.
+
+    @property: hits ::= number of lookups that found a live entry
+    @property: misses ::= number of lookups that found nothing or an
+        expired entry
+    @property: evictions ::= number of entries dropped to respect max_size
+
+    """
+
+    def __init__(self, max_size, ttl, clock=time.monotonic):
+        """
+        :param max_size: maximum number of entries to keep
+        :param ttl: seconds an entry stays valid, None for no expiry
+        :param clock: function returning the current time in seconds
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """
+        Return the value stored under key and mark it recently used
+
+        :param key: hashable cache key
+        :param default: value returned on a miss
+        :return: cached value or default
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > self._clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        """
+        Store value under key, evicting the least recently used entries if
+        the cache is full
+
+        :param key: hashable cache key
+        :param value: value to store
+        :return: None
+        """
+        expires_at = None if self.ttl is None else self._clock() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        """
+        Remove key from the cache if present
+
+        :param key: hashable cache key
+        :return: None
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """
+        Remove every entry and reset the counters
+
+        :return: None
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """
+        Return the cache counters so the cache can be sized
+
+        :return: dictionary with hits, misses, evictions and size
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._entries)
+        }
+
+
+class StaleWhileRevalidateCache(object):
+
+    """
+    Thread-safe cache for values that are expensive to load but may be a
+    little out of date. Within fresh_for seconds of being loaded an entry is
+    returned as is. For stale_for seconds after that it is still returned
+    right away, but a refresh is started in the background, so only the
+    first request after an entry expires completely waits for a load.
+    Concurrent lookups of a missing key share that one load.
+
+    @property: hits ::= number of lookups answered with a fresh entry
+    @property: stale_hits ::= number of lookups answered with a stale entry
+    @property: misses ::= number of lookups that had to wait for a load
+    @property: refresh_failures ::= number of background refreshes that
+        failed, leaving the stale entry in place
+    @property: shared_loads ::= number of misses that waited for a load
+        another lookup had started
+
+    """
+
+    def __init__(self, max_size, clock=time.monotonic):
+        """
+        :param max_size: maximum number of entries to keep
+        :param clock: function returning the current time in seconds
+        """
+        self.max_size = max_size
+        self._clock = clock
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._loads = concurrency_utils.SingleFlight()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refresh_failures = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, load, fresh_for, stale_for):
+        """
+        Return the value stored under key, loading it if there is none
+
+        :param key: hashable cache key
+        :param load: function returning the value for key
+        :param fresh_for: seconds a loaded value is used without a refresh
+        :param stale_for: seconds after fresh_for that the value is still
+            used while it is refreshed in the background
+        :return: cached or loaded value
+        :raises: whatever load raises when there is no usable entry
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            age = None
+            if entry is not None:
+                age = self._clock() - entry[0]
+                self._entries.move_to_end(key)
+            if age is not None and age < fresh_for:
+                self.hits += 1
+                return entry[1]
+            if age is not None and age < fresh_for + stale_for:
+                self.stale_hits += 1
+                stale = True
+            else:
+                self.misses += 1
+                stale = False
+
+        if stale:
+            logger.debug('Serving stale entry for ' + str(key))
+            refresh_in_background(key, self._refresh, key, load)
+            return entry[1]
+        return self._loads.do(key, self._load, key, load)
+
+    def _load(self, key, load):
+        value = load()
+        self.set(key, value)
+        return value
+
+    def _refresh(self, key, load):
+        try:
+            value = load()
+        except Exception as e:
+            logger.warning('Could not refresh {}: {}'.format(key, e))
+            with self._lock:
+                self.refresh_failures += 1
+            return
+        self.set(key, value)
+
+    def set(self, key, value):
+        """
+        Store a freshly loaded value under key
+
+        :param key: hashable cache key
+        :param value: value to store
+        :return: None
+        """
+        with self._lock:
+            self._entries[key] = (self._clock(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Remove every entry and reset the counters
+
+        :return: None
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.stale_hits = 0
+            self.misses = 0
+            self.refresh_failures = 0
+            self._loads = concurrency_utils.SingleFlight()
+
+    def stats(self):
+        """
+        Return the cache counters
+
+        :return: dictionary with hits, stale_hits, misses, refresh_failures,
+            shared_loads and size
+        """
+        return {
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'refresh_failures': self.refresh_failures,
+            'shared_loads': self.shared_loads,
+            'size': len(self._entries)
+        }
+
+    @property
+    def shared_loads(self):
+        return self._loads.shared
+
+
+class MemoryStorage(object):
+
+    """
+    Thread-safe in-memory storage for PersistentCache, dropping the least
+    recently used entries once it holds max_size of them.
+
+    """
+
+    def __init__(self, max_size):
+        """
+        :param max_size: maximum number of entries to keep
+        """
+        self.max_size = max_size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        :param key: string key
+        :return: tuple (time stored, value string), or None if key isn't
+            stored
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, stored_at, value):
+        """
+        :param key: string key
+        :param stored_at: time the value was stored
+        :param value: value string
+        :return: None
+        """
+        with self._lock:
+            self._entries[key] = (stored_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteStorage(object):
+
+    """
+    Storage for PersistentCache in an sqlite database file. On Lambda the
+    file belongs under /tmp, which lasts as long as the container. The
+    database is opened on first use. Errors reading or writing it are
+    logged and treated like a missing entry, so a broken file never fails
+    the request that uses the cache. Every set drops the entries older
+    than ttl and then, while there are more than max_size, the oldest ones.
+    The entries are counted once when the database is opened, and the
+    count is kept up to date from then on.
+
+    @property: path ::= path of the database file
+    @property: max_size ::= maximum number of entries to keep
+    @property: ttl ::= seconds after which set drops an entry, None to keep
+        entries until max_size is reached
+
+    """
+
+    def __init__(self, path, max_size, ttl=None):
+        """
+        :param path: path of the database file, created if missing
+        :param max_size: maximum number of entries to keep
+        :param ttl: seconds after which set drops an entry, None to keep
+            entries until max_size is reached
+        """
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self._connection = None
+        self._size = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._run(lambda connection: self._size) or 0
+
+    def _connect(self):
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=1,
+                                         check_same_thread=False)
+            connection.execute('CREATE TABLE IF NOT EXISTS entries ('
+                               'key TEXT PRIMARY KEY, '
+                               'stored_at REAL NOT NULL, '
+                               'value TEXT NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS '
+                               'entries_stored_at ON entries (stored_at)')
+            connection.commit()
+            self._connection = connection
+        if self._size is None:
+            self._size = self._connection.execute(
+                'SELECT COUNT(*) FROM entries'
+            ).fetchone()[0]
+        return self._connection
+
+    def _run(self, function):
+        """
+        Run function(connection) in a transaction
+
+        :param function: function taking an sqlite3.Connection
+        :return: what function returned, None if the database failed
+        """
+        with self._lock:
+            try:
+                connection = self._connect()
+                with connection:
+                    return function(connection)
+            except (sqlite3.Error, OSError) as e:
+                logger.warning('Cache database {} failed: {}'
+                               .format(self.path, e))
+                # the transaction was rolled back, so count again
+                self._size = None
+                return None
+
+    def _execute(self, statement, parameters=()):
+        """
+        :return: list of result rows, None if the database failed
+        """
+        return self._run(lambda connection: connection.execute(
+            statement, parameters
+        ).fetchall())
+
+    def get(self, key):
+        """
+        :param key: string key
+        :return: tuple (time stored, value string), or None if key isn't
+            stored
+        """
+        rows = self._execute(
+            'SELECT stored_at, value FROM entries WHERE key = ?', (key,)
+        )
+        return tuple(rows[0]) if rows else None
+
+    def set(self, key, stored_at, value):
+        """
+        :param key: string key
+        :param stored_at: time the value was stored
+        :param value: value string
+        :return: None
+        """
+        def store(connection):
+            replaced = connection.execute(
+                'SELECT 1 FROM entries WHERE key = ?', (key,)
+            ).fetchone()
+            connection.execute('INSERT OR REPLACE INTO entries '
+                               '(key, stored_at, value) VALUES (?, ?, ?)',
+                               (key, stored_at, value))
+            if replaced is None:
+                self._size += 1
+            if self.ttl is not None:
+                self._size -= connection.execute(
+                    'DELETE FROM entries WHERE stored_at < ?',
+                    (stored_at - self.ttl,)
+                ).rowcount
+            excess = self._size - self.max_size
+            if excess > 0:
+                self._size -= connection.execute(
+                    'DELETE FROM entries WHERE key IN (SELECT key FROM '
+                    'entries ORDER BY stored_at LIMIT ?)', (excess,)
+                ).rowcount
+
+        self._run(store)
+
+    def delete(self, key):
+        def remove(connection):
+            self._size -= connection.execute(
+                'DELETE FROM entries WHERE key = ?', (key,)
+            ).rowcount
+
+        self._run(remove)
+
+    def clear(self):
+        def remove_all(connection):
+            connection.execute('DELETE FROM entries')
+            self._size = 0
+
+        self._run(remove_all)
+
+    def close(self):
+        """
+        Close the database; it is opened again on the next use
+
+        :return: None
+        """
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+                self._size = None
+
+
+class PersistentCache(object):
+
+    """
+    Cache of JSON values for data that practically never changes, with a
+    long time to live and a pluggable storage (MemoryStorage or
+    SQLiteStorage). Values are stored as JSON, so every lookup returns a new
+    copy that callers may modify.
+
+    @property: storage ::= where the entries are kept
+    @property: ttl ::= seconds an entry stays valid
+    @property: hits ::= number of lookups that found a live entry
+    @property: misses ::= number of lookups that found nothing or an
+        expired entry
+
+    """
+
+    def __init__(self, storage, ttl, clock=time.time):
+        """
+        :param storage: MemoryStorage, SQLiteStorage or an object with the
+            same get, set, delete and clear methods
+        :param ttl: seconds an entry stays valid
+        :param clock: function returning the current time in seconds. The
+            wall clock by default, as entries may outlive the process
+        """
+        self.storage = storage
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """
+        :param key: string key
+        :param default: value returned on a miss
+        :return: copy of the cached value, or default
+        """
+        entry = self.storage.get(key)
+        value = default
+        if entry is not None:
+            stored_at, stored = entry
+            if self._clock() - stored_at < self.ttl:
+                try:
+                    value = json.loads(stored)
+                except ValueError:
+                    entry = None
+            else:
+                self.storage.delete(key)
+                entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """
+        :param key: string key
+        :param value: JSON serializable value
+        :return: None
+        """
+        self.storage.set(key, self._clock(), json.dumps(value))
+
+    def delete(self, key):
+        """
+        :param key: string key
+        :return: None
+        """
+        self.storage.delete(key)
+
+    def clear(self):
+        """
+        Remove every entry and reset the counters
+
+        :return: None
+        """
+        self.storage.clear()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        :return: dictionary with hits, misses and size
+        """
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self.storage)}
+
+
+def refresh_in_background(key, function, *args):
+    """
+    Run function(*args) on the refresh threads unless a refresh for key is
+    already running. A refresh started more than REFRESH_ABANDON_AFTER
+    seconds ago, e.g. before Lambda froze the container, doesn't count as
+    running. The refresh doesn't run with the state of the invocation that
+    started it (see invocation_utils): it may outlive that invocation, so
+    its requests have no deadline but their own timeouts, and its metrics
+    go out with the next flush.
+
+    :param key: hashable value naming what is refreshed
+    :param function: function doing the refresh
+    :return: Future of the refresh, or None if one was already running
+    """
+    global _refresh_executor
+
+    def refresh():
+        try:
+            return function(*args)
+        finally:
+            with _refresh_lock:
+                if _refreshing.get(key, (None, None))[1] is future:
+                    del _refreshing[key]
+
+    with _refresh_lock:
+        if key in _refreshing:
+            started, _ = _refreshing[key]
+            if time.time() - started < REFRESH_ABANDON_AFTER:
+                return None
+        if _refresh_executor is None:
+            _refresh_executor = concurrent.futures.ThreadPoolExecutor(
+                REFRESH_MAX_WORKERS
+            )
+        future = _refresh_executor.submit(refresh)
+        _refreshing[key] = (time.time(), future)
+    return future
+
+
+def wait_for_refreshes(timeout=None):
+    """
+    Wait for the refreshes running in the background, e.g. in tests
+
+    :param timeout: seconds to wait at most, None to wait until they are
+        done
+    :return: True if no refresh is left running
+    """
+    with _refresh_lock:
+        pending = [future for _, future in _refreshing.values()]
+    if not pending:
+        return True
+    _, not_done = concurrent.futures.wait(pending, timeout)
+    if not_done:
+        logger.warning('{} refreshes still running'.format(len(not_done)))
+    return not not_done
@@ -0,0 +1,256 @@
+"""
+Helpers for running many upstream requests in parallel without flooding the
+upstream services or holding every result in memory, and for letting
+concurrent requests for the same data share one upstream call
+
+"""
+
+import collections
+import concurrent.futures
+import itertools
+import threading
+import time
+import mycity.utilities.deadline_utils as deadline_utils
+import mycity.utilities.invocation_utils as invocation_utils
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter(object):
+
+    """
+    Thread-safe token bucket that spaces calls out to a steady rate.
+
+    @property: rate ::= calls allowed per second
+    @property: burst ::= calls that may be made back to back after the
+        limiter has been idle
+
+    """
+
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=time.sleep):
+        """
+        :param rate: calls allowed per second
+        :param burst: calls that may be made back to back
+        :param clock: function returning the current time in seconds
+        :param sleep: function that blocks for a number of seconds
+        """
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = burst
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a call may be made. Callers that have to wait reserve
+        their slot before sleeping, so concurrent callers queue up instead
+        of all waking at the same time.
+
+        :return: seconds spent waiting
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(
+                self.burst,
+                self._tokens + (now - self._updated_at) * self.rate
+            )
+            self._updated_at = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            self._sleep(wait)
+        return wait
+
+
+class SingleFlight(object):
+
+    """
+    Thread-safe coalescing of identical calls. While a call for a key is in
+    flight, callers asking for the same key wait for it and get its result
+    (or its exception) instead of making the call again.
+
+    @property: calls ::= number of calls actually made
+    @property: shared ::= number of callers that got the result of a call
+        another caller made
+
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, function, *args):
+        """
+        Return function(*args), or the result of the call already in flight
+        for key. Results are shared between callers, so they must not be
+        modified.
+
+        :param key: hashable value identifying the call
+        :param function: function making the call
+        :return: result of the call
+        :raises: whatever the call raised, or deadline_utils.DeadlineExceeded
+            if the current deadline passes while waiting for another caller
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = concurrent.futures.Future()
+                self._in_flight[key] = future
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            logger.debug('Waiting for the call in flight for ' + str(key))
+            return deadline_utils.get_current_deadline().wait(future)
+        try:
+            result = function(*args)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def stats(self):
+        """
+        :return: dictionary with calls and shared
+        """
+        return {'calls': self.calls, 'shared': self.shared}
+
+
+class CircuitBreaker(object):
+
+    """
+    Thread-safe circuit breaker for an upstream service. After
+    failure_threshold failures in a row the circuit opens and calls are
+    refused, so a service that is down fails fast instead of holding every
+    request until its timeout. Once reset_after seconds have passed a
+    single trial call is let through: if it succeeds the circuit closes,
+    otherwise it opens again.
+
+    @property: failure_threshold ::= failures in a row that open the circuit
+    @property: reset_after ::= seconds the circuit stays open before a trial
+        call is let through
+    @property: state ::= CLOSED, OPEN or HALF_OPEN while a trial call is in
+        flight
+
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold, reset_after, clock=time.monotonic):
+        """
+        :param failure_threshold: failures in a row that open the circuit
+        :param reset_after: seconds before a trial call is let through
+        :param clock: function returning the current time in seconds
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = None
+
+    def allow(self):
+        """
+        :return: True if a call may be made now
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN \
+                    and self._clock() - self._opened_at >= self.reset_after:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        """
+        Close the circuit after a successful call
+
+        :return: None
+        """
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+
+    def record_cancelled(self):
+        """
+        Count nothing for a call whose outcome says nothing about the
+        service, e.g. one cut short by the caller's deadline. If it was the
+        trial call, the next call is let through as a trial instead.
+
+        :return: None
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+    def record_failure(self):
+        """
+        Count a failed call, opening the circuit if it was a trial call or
+        one failure too many
+
+        :return: None
+        """
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN \
+                    or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning('Circuit opened after {} failures'
+                                   .format(self._failures))
+                self.state = self.OPEN
+                self._opened_at = self._clock()
+
+
+def bounded_map(executor, function, items, max_pending):
+    """
+    Lazily apply function to items on executor, keeping at most max_pending
+    calls submitted at a time. Items are only read from the iterable as
+    results are consumed, so neither the inputs nor the results pile up.
+
+    :param executor: concurrent.futures.Executor to run the calls on
+    :param function: function taking one item
+    :param items: iterable of items
+    :param max_pending: maximum number of calls submitted but not yet
+        consumed
+    :return: generator of results in the order of items
+    """
+    pending = collections.deque()
+    for item in items:
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+        pending.append(invocation_utils.submit(executor, function, item))
+    while pending:
+        yield pending.popleft().result()
+
+
+def chunks(iterable, size):
+    """
+    Split an iterable into lists of at most size items without reading it
+    all at once
+
+    :param iterable: any iterable
+    :param size: maximum number of items per chunk
+    :return: generator of lists
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
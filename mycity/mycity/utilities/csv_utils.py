@@ -27,6 +27,65 @@ def create_record_model(model_name, attributes):
     return Model
                                    
 
+def create_mapping_record_model(model_name, attributes):
+    """
+    Spin up a namedtuple class to represent a record from a csv file that
+    can also be read like a dictionary (record["Address"], record.keys(),
+    {**record}), so it can stand in for csv.DictReader rows while storing
+    only a tuple of values per record
+
+    :param model_name: a string representing whatever we want to call
+        this class
+    :param attributes: a list of strings representing the attributes
+        of this container (csv column names, which don't need to be valid
+        identifiers)
+    :return: a constructor for this namedtuple subclass
+    """
+    logger.debug(
+        'model_name: ' + model_name +
+        ', attributes: ' + str(attributes)
+    )
+    attributes = tuple(attributes)
+    positions = {name: position for position, name in enumerate(attributes)}
+    Model = collections.namedtuple(model_name, attributes, rename=True)
+
+    class MappingRecord(Model):
+        __slots__ = ()
+
+        def __getitem__(self, key):
+            if isinstance(key, str):
+                return tuple.__getitem__(self, positions[key])
+            return tuple.__getitem__(self, key)
+
+        def __contains__(self, key):
+            return key in positions
+
+        def keys(self):
+            return attributes
+
+        def items(self):
+            return zip(attributes, self)
+
+        def get(self, key, default=None):
+            position = positions.get(key)
+            if position is None:
+                return default
+            return tuple.__getitem__(self, position)
+
+        def _asdict(self):
+            return dict(zip(attributes, self))
+
+        def _with(self, key, value):
+            """Return a copy of this record with one column changed"""
+            values = list(self)
+            values[positions[key]] = value
+            return self._make(values)
+
+    MappingRecord.__name__ = model_name
+    MappingRecord.__qualname__ = model_name
+    return MappingRecord
+                                   
+
 def csv_to_namedtuples(model, csv_reader):
     """
     Create and return a list of namedtuples representing all records from the 
@@ -49,7 +108,8 @@ def add_city_and_state_to_records(records, address_key, city, state):
     Append '{city}, {state}' to the Address fields of each record 
     in records.
 
-    :param records: filtered CSV.DictReader
+    :param records: filtered CSV.DictReader or records created with
+        create_mapping_record_model
     :param address_key: key to access address field in a record
     :param city: name of city stored as a string
     :param state: name of state stored as a string
@@ -62,7 +122,10 @@ def add_city_and_state_to_records(records, address_key, city, state):
     suffix = " " + city + ", " + state
     ret = []
     for record in records:
-        record[address_key] = record[address_key] + suffix
+        if isinstance(record, tuple):
+            record = record._with(address_key, record[address_key] + suffix)
+        else:
+            record[address_key] = record[address_key] + suffix
         ret.append(record)
     return ret
 
@@ -0,0 +1,144 @@
+"""
+Deadlines shared by the steps of a request, so steps that run one after
+another or side by side all stop waiting at the same point in time.
+
+The platform entry point sets the deadline of the current invocation with
+set_current_deadline, and every outbound call takes its timeout from
+get_timeout. The deadline is invocation state (see invocation_utils), so
+concurrent invocations each keep their own, and work submitted to thread
+pools through invocation_utils.submit sees the deadline of the invocation
+that submitted it.
+
+"""
+
+import concurrent.futures
+import time
+import mycity.utilities.invocation_utils as invocation_utils
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# seconds an outbound call may take when there is no deadline, or when more
+# than this is left
+DEFAULT_TIMEOUT = 10
+DEADLINE_STATE = 'deadline'
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when a request runs out of time before all of its steps finished
+    """
+    pass
+
+
+class Deadline(object):
+
+    """
+    A point in time by which a request has to be answered.
+
+    @property: expires_at ::= clock time the deadline passes, None if the
+        deadline never passes
+
+    """
+
+    def __init__(self, seconds, clock=time.monotonic):
+        """
+        :param seconds: seconds from now until the deadline passes, None for
+            no deadline
+        :param clock: function returning the current time in seconds
+        """
+        self._clock = clock
+        self.expires_at = None if seconds is None else clock() + seconds
+
+    def remaining(self):
+        """
+        :return: seconds left until the deadline passes, 0 once it passed,
+            None if there is no deadline
+        """
+        if self.expires_at is None:
+            return None
+        return max(0, self.expires_at - self._clock())
+
+    @property
+    def expired(self):
+        """
+        :return: True if the deadline has passed
+        """
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def limit(self, seconds):
+        """
+        :param seconds: seconds from now
+        :return: Deadline passing at the earlier of this deadline and seconds
+            from now
+        """
+        deadline = Deadline(seconds, clock=self._clock)
+        if self.expires_at is not None \
+                and self.expires_at < deadline.expires_at:
+            deadline.expires_at = self.expires_at
+        return deadline
+
+    def check(self):
+        """
+        :return: None
+        :raises: DeadlineExceeded if the deadline has passed
+        """
+        if self.expired:
+            raise DeadlineExceeded('Deadline passed')
+
+    def wait(self, future):
+        """
+        Wait for a future until the deadline passes
+
+        :param future: concurrent.futures.Future
+        :return: result of the future
+        :raises: DeadlineExceeded if the future is not done in time, or any
+            exception raised by the future
+        """
+        try:
+            return future.result(timeout=self.remaining())
+        except concurrent.futures.TimeoutError:
+            logger.warning('Deadline passed before a step finished')
+            raise DeadlineExceeded('Deadline passed')
+
+
+def set_current_deadline(deadline):
+    """
+    Set the deadline of the invocation being handled
+
+    :param deadline: Deadline, or None when the invocation is done
+    :return: None
+    """
+    invocation_utils.set_value(DEADLINE_STATE, deadline)
+
+
+def get_current_deadline(limit=None):
+    """
+    Return the deadline of the invocation being handled
+
+    :param limit: if provided, the deadline passes at most limit seconds
+        from now
+    :return: Deadline, one that never passes if no deadline was set and no
+        limit was given
+    """
+    deadline = invocation_utils.get_value(DEADLINE_STATE) or Deadline(None)
+    if limit is not None:
+        deadline = deadline.limit(limit)
+    return deadline
+
+
+def get_timeout(limit=DEFAULT_TIMEOUT):
+    """
+    Return the timeout for an outbound call: what is left of the current
+    deadline, but no more than limit
+
+    :param limit: longest timeout in seconds
+    :return: timeout in seconds
+    :raises: DeadlineExceeded if the current deadline has passed
+    """
+    deadline = get_current_deadline()
+    deadline.check()
+    remaining = deadline.remaining()
+    return limit if remaining is None else min(limit, remaining)
@@ -0,0 +1,155 @@
+"""
+Sources of driving distances and times from an origin to Finder records.
+Finder asks its distance_provider for driving info and, when the request has
+a deadline, falls back to its fallback_provider if the first one is too slow.
+"""
+
+import statistics
+import mycity.utilities.geo_utils as geo_utils
+import mycity.utilities.google_maps_utils as g_maps_utils
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+METERS_PER_MILE = 1609.344
+
+
+class DistanceProvider(object):
+
+    """
+    Interface of the objects Finder gets driving info from.
+
+    @property: approximate ::= True if the driving info is an estimate that
+        speech should not present as exact
+
+    """
+
+    approximate = False
+
+    def get_driving_info(self, finder, records):
+        """
+        Return driving info from the finder's origin to each record
+
+        :param finder: Finder whose origin, address_key and coordinate keys
+            are used
+        :param records: a list of location records
+        :return: list of dictionaries with the finder's address_key and the
+            driving info keys from google_maps_utils, None if no driving info
+            was found
+        :raises: NotImplementedError
+        """
+        logger.error('Not implemented.')
+        raise NotImplementedError
+
+
+class DistanceMatrixProvider(DistanceProvider):
+
+    """
+    Driving info from the Google Maps Distance Matrix API
+    """
+
+    def get_driving_info(self, finder, records):
+        destinations = [record[finder.address_key] for record in records]
+        return g_maps_utils._get_driving_info(finder.origin_address,
+                                              finder.address_key,
+                                              destinations)
+
+
+class EstimatedDistanceProvider(DistanceProvider):
+
+    """
+    Driving info estimated from the great-circle distance to each record:
+    the distance is stretched by road_factor to account for streets not
+    running straight to the destination, and driven at average_speed. No
+    request is made, so an answer is always available in microseconds.
+
+    @property: road_factor ::= ratio of driving distance to great-circle
+        distance
+    @property: average_speed ::= average driving speed in meters per second
+
+    """
+
+    approximate = True
+    # 1.4 is the circuity commonly reported for urban road networks in the
+    # US. The average speed is the median of the Distance Matrix answers in
+    # test/test_data/google_maps_json_response, 8.05 m/s. Use from_samples
+    # to fit both to measured driving info instead
+    DEFAULT_ROAD_FACTOR = 1.4
+    DEFAULT_AVERAGE_SPEED = 8.0
+
+    def __init__(self, road_factor=DEFAULT_ROAD_FACTOR,
+                 average_speed=DEFAULT_AVERAGE_SPEED):
+        """
+        :param road_factor: ratio of driving distance to great-circle
+            distance
+        :param average_speed: average driving speed in meters per second
+        """
+        self.road_factor = road_factor
+        self.average_speed = average_speed
+
+    @classmethod
+    def from_samples(cls, samples):
+        """
+        Calibrate an estimator against measured trips, e.g. Distance Matrix
+        answers for a dataset. The median ratios are used, so a few detours
+        or traffic jams don't skew the estimate.
+
+        :param samples: iterable of (great-circle meters, driving meters,
+            driving seconds) tuples
+        :return: EstimatedDistanceProvider
+        """
+        road_factors, speeds = [], []
+        for straight_line, distance, duration in samples:
+            if straight_line > 0 and distance > 0 and duration > 0:
+                road_factors.append(distance / straight_line)
+                speeds.append(distance / duration)
+        if not road_factors:
+            return cls()
+        return cls(statistics.median(road_factors), statistics.median(speeds))
+
+    def get_driving_info(self, finder, records):
+        origin_coordinates = finder.get_origin_coordinates()
+        if origin_coordinates is None:
+            return None
+        driving_infos = []
+        for record in records:
+            coordinates = geo_utils.get_record_coordinates(
+                record, finder.LATITUDE_KEY, finder.LONGITUDE_KEY
+            )
+            if coordinates is None:
+                continue
+            distance = self.road_factor * geo_utils.great_circle_distance(
+                origin_coordinates, coordinates
+            )
+            duration = distance / self.average_speed
+            driving_infos.append({
+                g_maps_utils.DRIVING_DISTANCE_VALUE_KEY: int(distance),
+                g_maps_utils.DRIVING_DISTANCE_TEXT_KEY:
+                    format_distance(distance),
+                g_maps_utils.DRIVING_TIME_VALUE_KEY: int(duration),
+                g_maps_utils.DRIVING_TIME_TEXT_KEY: format_duration(duration),
+                finder.address_key: record[finder.address_key]
+            })
+        return driving_infos or None
+
+
+def format_distance(meters):
+    """
+    Describe an estimated distance the way it should be spoken
+
+    :param meters: distance in meters
+    :return: string such as "about 1.2 mi"
+    """
+    return 'about {:.1f} mi'.format(meters / METERS_PER_MILE)
+
+
+def format_duration(seconds):
+    """
+    Describe an estimated driving time the way it should be spoken
+
+    :param seconds: driving time in seconds
+    :return: string such as "about 5 mins"
+    """
+    minutes = max(1, int(round(seconds / 60)))
+    return 'about {} {}'.format(minutes, 'min' if minutes == 1 else 'mins')
@@ -3,14 +3,68 @@ Abstract parent class upon which subclasses are built that find location
 based information about city services
 """
 
+import collections
+import concurrent.futures
+import threading
 import mycity.utilities.address_utils as address_utils
+import mycity.utilities.concurrency_utils as concurrency_utils
 import mycity.utilities.csv_utils as csv_utils
+import mycity.utilities.deadline_utils as deadline_utils
+import mycity.utilities.invocation_utils as invocation_utils
+import mycity.utilities.geo_utils as geo_utils
 import mycity.utilities.google_maps_utils as g_maps_utils
+import mycity.utilities.finder.DistanceProvider as distance_providers
+import mycity.utilities.finder.RecordStore as record_store
+import mycity.utilities.finder.SpatialIndex as spatial_index
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+# threads running the steps of start_concurrently. They live in module scope
+# so they are reused across warm Lambda invocations
+PIPELINE_MAX_WORKERS = 4
+# threads asking distance_provider for driving info while a fallback may
+# answer first. A request still running after the fallback answered must
+# not hold a pipeline thread the next invocation needs
+DRIVING_INFO_MAX_WORKERS = 4
+_pipeline_executor = None
+_driving_info_executor = None
+_pipeline_lock = threading.Lock()
+
+
+def _get_pipeline_executor():
+    """
+    Return the thread pool shared by every start_concurrently call
+
+    :return: concurrent.futures.ThreadPoolExecutor
+    """
+    global _pipeline_executor
+    if _pipeline_executor is None:
+        with _pipeline_lock:
+            if _pipeline_executor is None:
+                _pipeline_executor = concurrent.futures.ThreadPoolExecutor(
+                    PIPELINE_MAX_WORKERS
+                )
+    return _pipeline_executor
+
+
+def _get_driving_info_executor():
+    """
+    Return the thread pool get_driving_info_to_records waits on
+
+    :return: concurrent.futures.ThreadPoolExecutor
+    """
+    global _driving_info_executor
+    if _driving_info_executor is None:
+        with _pipeline_lock:
+            if _driving_info_executor is None:
+                _driving_info_executor = concurrent.futures.ThreadPoolExecutor(
+                    DRIVING_INFO_MAX_WORKERS
+                )
+    return _driving_info_executor
+
+
 class Finder(object):
     
     """
@@ -24,6 +78,15 @@ class Finder(object):
         fields in the returned record for output_speech formatted string
     @property: origin_address ::= string that represents the address we will
         calculated driving distances from
+    @property: candidate_count ::= number of records, ranked by straight-line
+        distance from the origin, that are sent to Google Maps. None sends
+        every record
+    @property: distance_provider ::= DistanceProvider driving info comes from
+    @property: fallback_provider ::= DistanceProvider used instead of
+        distance_provider when it does not answer before the deadline, None
+        to always wait for distance_provider
+    @property: approximate ::= True if output_speech was built from
+        estimated driving info
 
     """
 
@@ -31,6 +94,17 @@ class Finder(object):
     CITY = "Boston"
     STATE = "MA"
     ERROR_MESSAGE = "Uh oh. Something went wrong!"
+    # record fields holding the location's coordinates
+    LATITUDE_KEY = "Y"
+    LONGITUDE_KEY = "X"
+    # defaults for find_closest_records
+    BATCH_MAX_WORKERS = 4
+    BATCH_REQUESTS_PER_SECOND = 10
+    BATCH_WINDOW_SIZE = 500
+    # seconds before the deadline at which start_concurrently stops waiting
+    # for distance_provider and answers from fallback_provider
+    FALLBACK_MARGIN = 0.3
+    distance_provider = distance_providers.DistanceMatrixProvider()
 
     def __init__(
             self,
@@ -38,10 +112,13 @@ class Finder(object):
             resource_url,
             address_key,
             output_speech,
-            output_speech_prep_func
+            output_speech_prep_func,
+            candidate_count=None,
+            fallback_provider=None
     ):
         """
-        :param req: MyCityRequestDataModel
+        :param req: MyCityRequestDataModel, or None when the Finder is only
+            used for find_closest_records
         :param resource_url : String that Finder classes will 
             use to GET or query from
         :param address_key: string that names the type of 
@@ -54,13 +131,25 @@ class Finder(object):
         :param output_speech_prep_func: function that will access
             and modify fields in the returned record for output_speech
             formatted string
+        :param candidate_count: if provided, only the candidate_count records
+            closest to the origin in a straight line are sent to Google Maps
+            to calculate driving distances
+        :param fallback_provider: DistanceProvider answering when Google
+            Maps is too slow for the deadline passed to start_concurrently
         """
         self.resource_url = resource_url
         self.address_key = address_key
         self.output_speech = output_speech
         self.field_formatter = output_speech_prep_func
+        self.candidate_count = candidate_count
+        self.fallback_provider = fallback_provider
+        self.approximate = False
         # pull the origin address from request data model
-        self.origin_address = Finder.address_builder(req)
+        self.origin_address = \
+            Finder.address_builder(req) if req is not None else None
+        self._origin_coordinates = None
+        self._origin_geocoded = False
+        self._origin_lock = threading.Lock()
 
     def get_records(self):
         """
@@ -85,28 +174,145 @@ class Finder(object):
         records = self.get_records()
         self._start(records)
 
-    def _start(self, records):
+    def start_concurrently(self, deadline=None, table=None):
+        """
+        Like start, but load the records and resolve the origin at the same
+        time instead of one after the other. One step fetches, parses and
+        indexes the dataset while the other geocodes the origin. Given a
+        table, the origin is looked up in it first and the records are only
+        loaded if that doesn't answer the request; a table hit is answered
+        with the driving info the table keeps for the cell, so it takes no
+        request besides the geocoding. Without a table, Google Maps is asked for driving info once both
+        steps are done, so the time taken is that of the slower step rather
+        than the sum of the two. If Google Maps has
+        not answered FALLBACK_MARGIN seconds before the deadline, the answer
+        comes from fallback_provider.
+
+        :param deadline: deadline_utils.Deadline shared by all steps, None
+            to wait as long as the steps take
+        :param table: NearestTable built for this Finder's dataset, or None
+        :return: None
+        :raises: deadline_utils.DeadlineExceeded if the deadline passes
+            before driving info is requested
+        """
+        logger.debug('')
+        if deadline is None:
+            deadline = deadline_utils.Deadline(None)
+        executor = _get_pipeline_executor()
+        records_step = None
+        if table is None:
+            records_step = invocation_utils.submit(executor,
+                                                   self._load_record_store)
+        if table is not None or self.candidate_count:
+            origin_step = invocation_utils.submit(executor,
+                                                  self._resolve_origin, table)
+            closest_record = deadline.wait(origin_step)
+            if closest_record is not None and \
+                    self._start_from_record(closest_record, deadline):
+                return
+
+        if records_step is None:
+            records_step = invocation_utils.submit(executor,
+                                                   self._load_record_store)
+        store = deadline.wait(records_step)
+        deadline.check()
+        self._start(store, deadline)
+
+    def _load_record_store(self):
+        """
+        Fetch the records and build their RecordStore and, when candidate
+        records will be needed, their spatial index
+
+        :return: RecordStore
+        """
+        store = self.get_record_store(self.get_records())
+        dataset_key = self.get_dataset_key()
+        if dataset_key is not None and self.candidate_count \
+                and len(store) > self.candidate_count:
+            spatial_index.get_index(dataset_key, store.records,
+                                    self.LATITUDE_KEY, self.LONGITUDE_KEY)
+        return store
+
+    def _resolve_origin(self, table):
+        """
+        Geocode the origin and look it up in table
+
+        :param table: NearestTable or None
+        :return: closest record from the table, None if there is no table or
+            the origin is not in it
+        """
+        origin_coordinates = self.get_origin_coordinates()
+        if table is None or origin_coordinates is None:
+            return None
+        return table.lookup(origin_coordinates)
+
+    def start_from_table(self, table, deadline=None):
+        """
+        Set output_speech from a precomputed nearest-location table instead
+        of fetching records. The table says which record is closest to the
+        cell the origin falls in and how far it is from the cell's center;
+        if a table has no driving info for the cell, it is asked for from
+        the origin to that one record.
+
+        :param table: NearestTable built for this Finder's dataset
+        :param deadline: deadline_utils.Deadline of the request, or None
+        :return: True if output_speech was set, False if the origin could
+            not be geocoded, its cell is not in the table or no driving info
+            was found, in which case start should be used
+        """
+        origin_coordinates = self.get_origin_coordinates()
+        if origin_coordinates is None:
+            return False
+        closest_record = table.lookup(origin_coordinates)
+        if closest_record is None:
+            return False
+        return self._start_from_record(closest_record, deadline)
+
+    def _start_from_record(self, record, deadline=None):
+        """
+        Set output_speech for a record known to be the closest, with driving
+        info from the origin to it unless the record already has some, e.g.
+        from a NearestTable
+
+        :param record: location record
+        :param deadline: deadline_utils.Deadline of the request, or None
+        :return: True if output_speech was set, False if no driving info was
+            found
+        """
+        if g_maps_utils.DRIVING_DISTANCE_TEXT_KEY in record:
+            closest_record = dict(record)
+        else:
+            driving_info = self.get_driving_info_to_records([record],
+                                                            deadline)
+            if not driving_info:
+                return False
+            closest_record = {**record, **driving_info[0]}
+        self.field_formatter(closest_record)
+        self.set_output_speech(closest_record)
+        return True
+
+    def _start(self, records, deadline=None):
         """
         Process list of records and set the output_speech field. output_speech
         will be queried by creator of a Finder object and used to 
         construct a MyCityResponseDataModel
         
         :param records: a list of all location records, records are stored as 
-            dictionaries
+            dictionaries, or a RecordStore of already processed records
+        :param deadline: deadline_utils.Deadline of the request, or None
         :return: None
         """
         logger.debug('Last 5 records: ' + str(records[:5]))
-        records = self.add_city_and_state_to_records(records)
-        destinations = self.get_all_destinations(records)
-        driving_info = self.get_driving_info_to_destinations(destinations)
+        store = self.get_record_store(records)
+        records = self.get_candidate_records(store.records)
+        driving_info = self.get_driving_info_to_records(records, deadline)
         closest_dest = \
             min(driving_info, 
                 key=lambda destination: destination[g_maps_utils.
                                                     DRIVING_DISTANCE_VALUE_KEY])
 
         closest_record = \
-            self.get_closest_record_with_driving_info(closest_dest,
-                                                      records)
+            self.get_closest_record_with_driving_info(closest_dest, store)
         formatted_record = self.field_formatter(closest_record)
         # TODO: Should this be called with formatted_record?
         self.set_output_speech(closest_record)
@@ -135,34 +341,309 @@ class Finder(object):
                                 # have
             self.output_speech = Finder.ERROR_MESSAGE
 
-    def get_all_destinations(self, records):
+    def get_record_store(self, records):
         """
-        Return a list of all destinations to pass to Google Maps API
-        
-        :param records: a list of all location records, records are stored as 
+        Add city and state to every record and index the records by address.
+        The store is cached under get_dataset_key() so later requests on the
+        same version of the dataset can skip both steps.
+
+        :param records: a list of all location records or a RecordStore
+            returned by get_records for a cached dataset
+        :return: RecordStore
+        """
+        if isinstance(records, record_store.RecordStore):
+            return records
+        store = record_store.RecordStore(
+            self.add_city_and_state_to_records(records),
+            self.address_key
+        )
+        record_store.cache_store(self.get_dataset_key(), store)
+        return store
+
+    def get_candidate_records(self, records):
+        """
+        Narrow records down to the candidate_count closest to the origin
+        address by great-circle distance. Records are returned unchanged if
+        no candidate_count was given, if the origin cannot be geocoded or if
+        the records have no coordinates.
+
+        :param records: a list of all location records, records are stored as
             dictionaries
-        :return: list of destination address strings
+        :return: list of location records to get driving info for
         """
-        logger.debug('Last 5 records: ' + str(records[:5]))
-        
-        return [record[self.address_key] for record in records]
+        logger.debug('candidate_count: ' + str(self.candidate_count))
+        if not self.candidate_count or len(records) <= self.candidate_count:
+            return records
+
+        origin_coordinates = self.get_origin_coordinates()
+        if origin_coordinates is None:
+            logger.debug('Origin not found, using all records')
+            return records
+
+        dataset_key = self.get_dataset_key()
+        if dataset_key is None:
+            # a one-off ranking is cheaper than building an index we can't
+            # reuse
+            ranked, unranked = geo_utils.rank_records_by_distance(
+                origin_coordinates,
+                records,
+                self.LATITUDE_KEY,
+                self.LONGITUDE_KEY
+            )
+            ranked = ranked[:self.candidate_count]
+            if not ranked:
+                logger.debug('No coordinates available, using all records')
+                return records
+            # records we could not place on the map are always kept as
+            # candidates
+            return ranked + unranked
 
-    def get_driving_info_to_destinations(self, destinations):
+        index = spatial_index.get_index(dataset_key, records,
+                                        self.LATITUDE_KEY,
+                                        self.LONGITUDE_KEY)
+        return self.get_nearest_records(index, records, origin_coordinates)
+
+    def get_nearest_records(self, index, records, origin_coordinates):
         """
-        Return a dictionary with address, distance, and driving time from
-        self.origin_address for all destinations
-        
-        :param destinations: list of destination address strings
+        Use a spatial index to find the candidate_count records closest to
+        origin_coordinates
+
+        :param index: SpatialIndex built over records
+        :param records: a list of all location records
+        :param origin_coordinates: tuple (latitude, longitude)
+        :return: list of the closest records followed by the records that
+            have no coordinates, or all records if none have coordinates
+        """
+        ranked = [records[position] for position in
+                  index.nearest(origin_coordinates, self.candidate_count)]
+        if not ranked:
+            logger.debug('No coordinates available, using all records')
+            return records
+        # records we could not place on the map are always kept as candidates
+        return ranked + [records[position] for position in
+                         index.unindexed_positions]
+
+    def find_closest_records(
+            self,
+            origins,
+            max_workers=BATCH_MAX_WORKERS,
+            requests_per_second=BATCH_REQUESTS_PER_SECOND,
+            window_size=BATCH_WINDOW_SIZE
+    ):
+        """
+        Find the closest record to each of many origin addresses, e.g. for
+        analytics or precomputing answers.
+
+        The dataset is loaded and indexed once. Origins are read window_size
+        at a time; origins in a window that share the same candidate records
+        are sent to Google Maps together in Distance Matrix requests as large
+        as the API allows. Requests run on a pool of max_workers threads and
+        are spaced out to requests_per_second. Results are yielded window by
+        window, so memory use does not grow with the number of origins.
+
+        :param origins: iterable of origin address strings, or of tuples
+            (address, (latitude, longitude)) when the coordinates are already
+            known and the origin doesn't need to be geocoded
+        :param max_workers: number of requests in flight at a time
+        :param requests_per_second: maximum rate of requests to Google Maps
+        :param window_size: number of origins planned together
+        :return: generator of (origin address, closest record) tuples in the
+            order of origins. closest record is the merged dictionary from
+            get_closest_record_with_driving_info, or None if no driving info
+            could be found
+        """
+        logger.debug('max_workers: ' + str(max_workers) +
+                     ', requests_per_second: ' + str(requests_per_second))
+        store = self.get_record_store(self.get_records())
+        index = None
+        if self.candidate_count and len(store) > self.candidate_count:
+            dataset_key = self.get_dataset_key()
+            if dataset_key is None:
+                index = spatial_index.SpatialIndex.from_records(
+                    store.records, self.LATITUDE_KEY, self.LONGITUDE_KEY
+                )
+            else:
+                index = spatial_index.get_index(dataset_key, store.records,
+                                                self.LATITUDE_KEY,
+                                                self.LONGITUDE_KEY)
+        rate_limiter = concurrency_utils.RateLimiter(requests_per_second)
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+            for window in concurrency_utils.chunks(origins, window_size):
+                yield from self._find_closest_records_in_window(
+                    window, store, index, executor, rate_limiter, max_workers
+                )
+
+    def _find_closest_records_in_window(self, window, store, index, executor,
+                                        rate_limiter, max_pending):
+        """
+        Answer find_closest_records for one window of origins
+
+        :param window: list of origins as passed to find_closest_records
+        :param store: RecordStore of all location records
+        :param index: SpatialIndex over store.records, or None to send every
+            record to Google Maps
+        :param executor: executor running the requests
+        :param rate_limiter: RateLimiter shared by all requests
+        :param max_pending: maximum number of requests in flight
+        :return: generator of (origin address, closest record) tuples
+        """
+        origins = [
+            (origin, None) if isinstance(origin, str) else tuple(origin)
+            for origin in window
+        ]
+        coordinates = [None] * len(origins)
+        if index is not None:
+            def locate(origin):
+                address, origin_coordinates = origin
+                if origin_coordinates is None:
+                    rate_limiter.acquire()
+                    origin_coordinates = g_maps_utils.geocode_address(address)
+                return origin_coordinates
+
+            coordinates = list(concurrency_utils.bounded_map(
+                executor, locate, origins, max_pending
+            ))
+
+        # origins with the same candidates can share Distance Matrix requests
+        groups = collections.OrderedDict()
+        for position, origin_coordinates in enumerate(coordinates):
+            if origin_coordinates is None:
+                candidates = store.records
+            else:
+                candidates = self.get_nearest_records(index, store.records,
+                                                      origin_coordinates)
+            destinations = tuple(sorted(
+                {record[self.address_key] for record in candidates}
+            ))
+            groups.setdefault(destinations, []).append(position)
+
+        def get_driving_matrix(batch):
+            positions, destinations = batch
+            rate_limiter.acquire()
+            return g_maps_utils.get_driving_matrix(
+                [origins[position][0] for position in positions],
+                self.address_key,
+                list(destinations)
+            )
+
+        batches = list(self._plan_driving_matrix_batches(groups))
+        distance_key = g_maps_utils.DRIVING_DISTANCE_VALUE_KEY
+        closest = [None] * len(origins)
+        results = concurrency_utils.bounded_map(
+            executor, get_driving_matrix, batches, max_pending
+        )
+        for (positions, _), rows in zip(batches, results):
+            if rows is None:
+                continue
+            for position, driving_infos in zip(positions, rows):
+                for driving_info in driving_infos:
+                    best = closest[position]
+                    if best is None or \
+                            driving_info[distance_key] < best[distance_key]:
+                        closest[position] = driving_info
+
+        for (address, _), driving_info in zip(origins, closest):
+            record = None
+            if driving_info is not None:
+                record = self.get_closest_record_with_driving_info(
+                    driving_info, store
+                )
+            yield address, record
+
+    @staticmethod
+    def _plan_driving_matrix_batches(groups):
+        """
+        Split groups of origins into Distance Matrix requests within the API
+        limits, packing as many origins into each request as possible
+
+        :param groups: dictionary mapping a tuple of destination addresses to
+            the positions of the origins that need driving info to them
+        :return: generator of (origin positions, destination addresses) tuples
+        """
+        for destinations, positions in groups.items():
+            for start in range(0, len(destinations),
+                               g_maps_utils.MAX_MATRIX_DESTINATIONS):
+                chunk = destinations[
+                    start:start + g_maps_utils.MAX_MATRIX_DESTINATIONS
+                ]
+                origin_count = min(
+                    g_maps_utils.MAX_MATRIX_ORIGINS,
+                    g_maps_utils.MAX_MATRIX_ELEMENTS // len(chunk)
+                )
+                for origin_start in range(0, len(positions), origin_count):
+                    yield (positions[origin_start:origin_start + origin_count],
+                           chunk)
+
+    def get_dataset_key(self):
+        """
+        Return a hashable value identifying the version of the dataset the
+        current records were loaded from, so indexes built over it can be
+        reused. Subclasses that can tell dataset versions apart should
+        override this.
+
+        :return: dataset key or None if the version is unknown
+        """
+        return None
+
+    def get_origin_coordinates(self):
+        """
+        Return the latitude and longitude of self.origin_address
+
+        :return: tuple (latitude, longitude) or None if unavailable
+        """
+        logger.debug('origin_address: ' + str(self.origin_address))
+        # the steps of start_concurrently may both need the origin
+        with self._origin_lock:
+            if not self._origin_geocoded:
+                self._origin_coordinates = \
+                    g_maps_utils.geocode_address(self.origin_address)
+                self._origin_geocoded = True
+        return self._origin_coordinates
+
+    def get_driving_info_to_records(self, records, deadline=None):
+        """
+        Return driving info from self.origin_address to each record. With a
+        deadline and a fallback_provider, distance_provider is only waited
+        for until FALLBACK_MARGIN seconds before the deadline; after that the
+        fallback_provider's answer is used and approximate is set. The
+        distance_provider request runs on threads of its own: if it has not
+        started it is cancelled, otherwise it keeps running until its
+        requests time out at the deadline, so whatever it caches is there
+        for the next request.
+
+        :param records: a list of location records
+        :param deadline: deadline_utils.Deadline of the request, or None
         :return: list of dictionaries representing driving data for
-            each address
+            each record
+        :raises: deadline_utils.DeadlineExceeded if neither provider
+            answered before the deadline
         """
-        logger.debug('destinations: ' + str(destinations))
-        
-        return g_maps_utils._get_driving_info(self.origin_address,
-                                             self.address_key,
-                                             destinations)
+        logger.debug('count(records): ' + str(len(records)))
+        if deadline is None or deadline.remaining() is None \
+                or self.fallback_provider is None:
+            return self.distance_provider.get_driving_info(self, records)
 
-    def get_closest_record_with_driving_info(self, driving_info, records):
+        remote = invocation_utils.submit(
+            _get_driving_info_executor(),
+            self.distance_provider.get_driving_info, self, records
+        )
+        try:
+            driving_info = remote.result(
+                timeout=max(0, deadline.remaining() - self.FALLBACK_MARGIN)
+            )
+            if driving_info:
+                return driving_info
+        except concurrent.futures.TimeoutError:
+            logger.warning('Driving info is late, using fallback provider')
+
+        estimate = self.fallback_provider.get_driving_info(self, records)
+        if estimate:
+            remote.cancel()
+            self.approximate = self.fallback_provider.approximate
+            return estimate
+        return deadline.wait(remote)
+
+    def get_closest_record_with_driving_info(self, driving_info, store):
         """
         Find the record corresponding to the destination address
         (driving_info) - which was found to be closest to the origin address.
@@ -172,18 +653,17 @@ class Finder(object):
         :param driving_info: dictionary with address, time to drive to
             address, and distance to the address (representing the closest
             destination to the origin)
-        :param records: a list of all location records, records are stored as 
-            dictionaries
+        :param store: RecordStore of all location records
         :return: a merged dictionary with driving time, driving_distance and all 
-            fields from the closest record
-        """
-        logger.debug('driving_info:' + str(driving_info) +
-                     'records:' + str(records))
-        for record in records:
-            if driving_info[self.address_key] == record[self.address_key]:
-                # NOTE: This will overwrite any common fields (however
-                #       unlikely) between the two dictionaries.
-                return {**record, **driving_info}
+            fields from the closest record, None if no record has the address
+        """
+        logger.debug('driving_info:' + str(driving_info))
+        record = store.find_by_address(driving_info[self.address_key])
+        if record is None:
+            return None
+        # NOTE: This will overwrite any common fields (however
+        #       unlikely) between the two dictionaries.
+        return {**record, **driving_info}
 
     def add_city_and_state_to_records(self, records):
         """
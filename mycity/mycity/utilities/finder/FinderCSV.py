@@ -3,22 +3,41 @@ Uses csv files to find location based information about Boston city services
 """
 
 import csv
-import requests
+import io
+import operator
+import string
+import mycity.utilities.concurrency_utils as concurrency_utils
+import mycity.utilities.csv_utils as csv_utils
+import mycity.utilities.snapshot_utils as snapshot_utils
+import mycity.utilities.finder.RecordStore as record_store
 from mycity.utilities.finder.Finder import Finder
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+# parses of the same csv file in flight, shared by concurrent requests
+_record_store_loads = concurrency_utils.SingleFlight()
+
+
 class FinderCSV(Finder):
     
     """
     Finder subclass that uses csv files to find destination addresses
 
     @property: filter ::= filter function to conditionally remove records
+    @property: dataset_version ::= version (ETag or digest) of the last csv
+        file fetched
+    @property: extra_columns ::= csv columns to keep in each record besides
+        the ones output_speech, address_key and the coordinates need
     
     """
     default_filter = lambda record : record  # filter that filters nothing
+    # seconds a downloaded csv file is used before checking if it changed
+    MAX_DATASET_AGE = snapshot_utils.DEFAULT_MAX_AGE
+    # seconds after MAX_DATASET_AGE that a csv file is still used while it
+    # is checked in the background
+    MAX_DATASET_STALENESS = 24 * 60 * 60
 
     def __init__(
             self,
@@ -27,7 +46,10 @@ class FinderCSV(Finder):
             address_key,
             output_speech,
             output_speech_prep_func,
-            filter = default_filter
+            filter = default_filter,
+            candidate_count=None,
+            extra_columns=(),
+            fallback_provider=None
     ):
         """
         Call super constructor and save filter
@@ -48,6 +70,13 @@ class FinderCSV(Finder):
         :param filter: filter that we can use to remove records from csv
             file before using google_maps to find distances and 
             driving_times
+        :param candidate_count: number of records closest to the origin
+            (in a straight line) to get driving info for
+        :param extra_columns: names of csv columns to keep in each record
+            besides the ones output_speech, address_key and the coordinates
+            need. The filter only sees the columns that are kept.
+        :param fallback_provider: DistanceProvider answering when Google
+            Maps is too slow for the deadline passed to start_concurrently
         """
 
         super().__init__(
@@ -55,9 +84,13 @@ class FinderCSV(Finder):
             resource_url,
             address_key,
             output_speech,
-            output_speech_prep_func
+            output_speech_prep_func,
+            candidate_count,
+            fallback_provider
         )
         self._filter = filter
+        self.extra_columns = tuple(extra_columns)
+        self.dataset_version = None
 
     def get_records(self):
         """
@@ -66,44 +99,123 @@ class FinderCSV(Finder):
         Subclasses must provide a get_records method. Base class will
         handle all processing
 
-        :return: list of dictionaries representing the resource csv file
+        :return: list of records representing the resource csv file, or the
+            RecordStore of this version of the file if it was already parsed
+            or is parsed for a concurrent request
         """
         logger.debug('')
-        return self.file_to_filtered_records(self.fetch_resource())
+        file_contents = self.fetch_resource()
+        dataset_key = self.get_dataset_key()
+        store = record_store.get_cached_store(dataset_key)
+        if store is not None:
+            logger.debug('Using cached records for ' + self.resource_url)
+            return store
+        if dataset_key is None:
+            return self.file_to_filtered_records(file_contents)
+        return _record_store_loads.do(dataset_key, self._parse_record_store,
+                                      file_contents)
+
+    def _parse_record_store(self, file_contents):
+        """
+        :param file_contents: iterator over the lines of the csv file
+        :return: RecordStore of the file, which get_record_store caches
+        """
+        return self.get_record_store(
+            self.file_to_filtered_records(file_contents)
+        )
 
     def fetch_resource(self):
         """
-        Make api call to get csv resource and return it as a string
+        Get the csv resource and return an iterator over its lines. The file
+        is only downloaded again when it is older than MAX_DATASET_AGE and the
+        server reports that it changed. Up to MAX_DATASET_STALENESS after
+        that, the old file is used while the check runs in the background.
         
-        :return: a string representation of the csv file
+        :return: iterator over the lines of the csv file, None if it could
+            not be fetched
         """
         logger.debug('')
 
-        r = requests.get(self.resource_url)
-        if r.status_code == 200:
-            file_contents = r.content.decode(r.apparent_encoding)
-        else:
-            file_contents = None
-        r.close()
-        return file_contents
+        snapshot = snapshot_utils.get_snapshot(self.resource_url,
+                                               self.MAX_DATASET_AGE,
+                                               self.MAX_DATASET_STALENESS)
+        if snapshot is None:
+            self.dataset_version = None
+            return None
+        self.dataset_version = snapshot.version
+        return snapshot.iter_lines()
+
+    def get_dataset_key(self):
+        """
+        Identify the fetched csv file by url, version, filter and kept
+        columns, as those determine which records we end up with
+
+        :return: dataset key or None if no file has been fetched
+        """
+        if self.dataset_version is None:
+            return None
+        return (self.resource_url, self.dataset_version, self._filter,
+                self.get_required_columns())
+
+    def get_required_columns(self):
+        """
+        Return the csv columns records need: the fields output_speech is
+        formatted with, the address and coordinates, and any extra_columns
+
+        :return: frozenset of column names
+        """
+        columns = {self.address_key, self.LATITUDE_KEY, self.LONGITUDE_KEY}
+        columns.update(self.extra_columns)
+        for _, field_name, _, _ in string.Formatter().parse(
+                self.output_speech):
+            if field_name:
+                # "{Name.title}" and "{Name[0]}" both need the Name column
+                columns.add(field_name.split('.')[0].split('[')[0])
+        return frozenset(columns)
 
     def file_to_filtered_records(self, file_contents):
         """
-        Convert the string representation of the csv file into a list of
-        dictionaries, each representing one record
+        Convert the csv file into a list of records. Rows are parsed one at
+        a time, only the columns from get_required_columns are kept and the
+        filter is applied before the next row is read. Records are compact
+        namedtuples (see csv_utils.create_mapping_record_model) that can be
+        read like dictionaries.
         
         :param file_contents: contents from successful GET on resource_url,
-            a string representation of the csv file
-        :return: a list of dictionaries (OrderedDict) each representing one
-            row from the csv
+            either an iterator over the lines of the csv file or a string
+        :return: a list of records each representing one row from the csv
         """
-        logger.debug('file_contents:' + str(file_contents).replace('\n', '\r'))
-        return list(
-            filter(
-                self._filter,
-                csv.DictReader(
-                   file_contents.splitlines(),
-                   delimiter=','
-                )
-            )
-        )
+        logger.debug('')
+        if isinstance(file_contents, str):
+            file_contents = io.StringIO(file_contents, newline='')
+        reader = csv.reader(file_contents, delimiter=',')
+        header = next(reader, None)
+        if header is None:
+            return []
+
+        required_columns = self.get_required_columns()
+        kept_columns = [
+            (column, name) for column, name in enumerate(header)
+            if name in required_columns
+        ]
+        if not kept_columns:
+            return []
+        make_record = csv_utils.create_mapping_record_model(
+            'Record', [name for _, name in kept_columns]
+        )._make
+        project = operator.itemgetter(*[column for column, _ in kept_columns])
+        if len(kept_columns) == 1:
+            get_value = project
+            project = lambda row: (get_value(row),)
+        width = len(header)
+        records = []
+        for row in reader:
+            if not row:
+                continue
+            if len(row) < width:
+                row += [None] * (width - len(row))
+            record = make_record(project(row))
+            if self._filter(record):
+                records.append(record)
+        logger.debug('count(records): ' + str(len(records)))
+        return records
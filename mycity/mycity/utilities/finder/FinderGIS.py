@@ -3,7 +3,9 @@ Uses ArcGIS to find location based information about Boston city services
 """
 
 from mycity.utilities.finder.Finder import Finder
-from mycity.utilities.gis_utils import get_features_from_feature_server
+from mycity.utilities.finder.RecordStore import RecordStore
+from mycity.utilities.gis_utils import ALL_FIELDS, feature_to_record, \
+    get_features_from_feature_server
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,10 +15,17 @@ class FinderGIS(Finder):
     """
     Finder subclass to find Feature locations from ArcGIS Feature Server
     @property: query ::= parameter for call to ArcGIS server
+    @property: out_fields ::= fields to fetch for each feature
+    @property: search_radius ::= meters around the origin to search for
+        features first, None to fetch every feature matching query
 
     """
     # default query returns all records
     DEFAULT_QUERY = "1=1"
+    # the search radius is multiplied by this each time nothing is found...
+    SEARCH_RADIUS_GROWTH = 2
+    # ...until it passes this many meters, then every feature is fetched
+    MAX_SEARCH_RADIUS = 16000
 
     def __init__(
             self,
@@ -25,7 +34,11 @@ class FinderGIS(Finder):
             address_key,
             output_speech,
             output_speech_prep_func,
-            query=DEFAULT_QUERY
+            query=DEFAULT_QUERY,
+            candidate_count=None,
+            out_fields=ALL_FIELDS,
+            search_radius=None,
+            fallback_provider=None
     ):
         """
         Call super constructor and save query
@@ -44,25 +57,77 @@ class FinderGIS(Finder):
             and modify fields in the returned record for output_speech
             formatted string
         :param query: parameter for call to ArcGIS server 
+        :param candidate_count: number of records closest to the origin
+            (in a straight line) to get driving info for
+        :param out_fields: fields to fetch for each feature, either "*" or a
+            list of field names
+        :param search_radius: if provided, the origin is geocoded and the
+            FeatureServer only returns features within search_radius meters
+            of it. The radius is widened until features are found.
+        :param fallback_provider: DistanceProvider answering when Google
+            Maps is too slow for the deadline passed to start_concurrently
         """
         super().__init__(
             req,
             resource_url,
             address_key,
             output_speech,
-            output_speech_prep_func
+            output_speech_prep_func,
+            candidate_count,
+            fallback_provider
         )
         self.query = query
+        self.out_fields = out_fields
+        self.search_radius = search_radius
 
     def get_records(self):
         """
-        Query City of Boston Feature Server, and return a list of features
+        Query City of Boston Feature Server, and return a list of features.
+        With a search_radius only features near the origin are fetched.
         
         :return: list of features corresponding to query
         """
-        logger.debug('')
+        logger.debug('search_radius: ' + str(self.search_radius))
+
+        origin_coordinates = None
+        if self.search_radius and self.origin_address:
+            origin_coordinates = self.get_origin_coordinates()
+        if origin_coordinates is not None:
+            radius = self.search_radius
+            while radius <= self.MAX_SEARCH_RADIUS:
+                features = get_features_from_feature_server(
+                    self.resource_url,
+                    self.query,
+                    self.out_fields,
+                    origin=origin_coordinates,
+                    distance=radius
+                )
+                if features:
+                    logger.debug('count(features) within ' + str(radius) +
+                                 'm: ' + str(len(features)))
+                    return features
+                radius *= self.SEARCH_RADIUS_GROWTH
+            logger.debug('No features near origin, fetching all features')
 
         return get_features_from_feature_server(
             self.resource_url,
-            self.query
+            self.query,
+            self.out_fields
         )
+
+    def get_record_store(self, records):
+        """
+        Flatten features into records, with point geometry stored under
+        LATITUDE_KEY and LONGITUDE_KEY, so they are processed like csv
+        records
+
+        :param records: list of features from get_records, or a RecordStore
+            already built from them
+        :return: RecordStore
+        """
+        if isinstance(records, RecordStore):
+            return records
+        return super().get_record_store([
+            feature_to_record(feature, self.LATITUDE_KEY, self.LONGITUDE_KEY)
+            for feature in records
+        ])
@@ -0,0 +1,106 @@
+"""
+Read-only store of the records of one dataset, indexed by address so the
+record for a destination can be found without scanning the whole dataset
+"""
+
+import collections
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# stores are kept in module scope so they survive warm Lambda invocations
+MAX_CACHED_STORES = 8
+_store_cache = collections.OrderedDict()
+_store_cache_lock = threading.Lock()
+
+
+def get_cached_store(dataset_key):
+    """
+    Return the RecordStore built for a dataset, if any
+
+    :param dataset_key: hashable value identifying one version of a dataset,
+        None if the version is unknown
+    :return: RecordStore or None
+    """
+    if dataset_key is None:
+        return None
+    with _store_cache_lock:
+        store = _store_cache.get(dataset_key)
+        if store is not None:
+            _store_cache.move_to_end(dataset_key)
+    return store
+
+
+def cache_store(dataset_key, store):
+    """
+    Keep store for later requests on the same version of a dataset
+
+    :param dataset_key: hashable value identifying one version of a dataset
+    :param store: RecordStore built from that dataset
+    :return: None
+    """
+    if dataset_key is None:
+        return
+    with _store_cache_lock:
+        _store_cache[dataset_key] = store
+        _store_cache.move_to_end(dataset_key)
+        while len(_store_cache) > MAX_CACHED_STORES:
+            _store_cache.popitem(last=False)
+
+
+def clear_store_cache():
+    """
+    Forget every cached store
+
+    :return: None
+    """
+    with _store_cache_lock:
+        _store_cache.clear()
+
+
+class RecordStore(object):
+
+    """
+    Records of one dataset plus an index from address to record position.
+
+    @property: records ::= list of records, either dictionaries or records
+        created with csv_utils.create_mapping_record_model
+    @property: address_key ::= key to access the address field in a record
+
+    """
+
+    def __init__(self, records, address_key):
+        """
+        :param records: a list of location records
+        :param address_key: key to access the address field in a record
+        """
+        self.records = records
+        self.address_key = address_key
+        self._positions = {}
+        for position, record in enumerate(records):
+            # the first record with an address wins, like a linear scan
+            self._positions.setdefault(record[address_key], position)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __getitem__(self, position):
+        return self.records[position]
+
+    def find_by_address(self, address):
+        """
+        Return the first record whose address is address
+
+        :param address: address string as it appears in the records
+        :return: record or None if no record has that address
+        """
+        position = self._positions.get(address)
+        if position is None:
+            logger.debug('No record found for ' + str(address))
+            return None
+        return self.records[position]
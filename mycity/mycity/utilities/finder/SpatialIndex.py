@@ -0,0 +1,197 @@
+"""
+KD-tree over the coordinates of Finder records, used to answer k-nearest
+queries without rescanning a whole dataset on every request
+"""
+
+import collections
+import heapq
+import math
+import threading
+import mycity.utilities.geo_utils as geo_utils
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# indexes are kept in module scope so they survive warm Lambda invocations
+MAX_CACHED_INDEXES = 8
+_index_cache = collections.OrderedDict()
+_index_cache_lock = threading.Lock()
+
+
+def get_index(dataset_key, records, latitude_key, longitude_key):
+    """
+    Return the SpatialIndex for a dataset, building it only if this version
+    of the dataset has not been indexed yet
+
+    :param dataset_key: hashable value identifying one version of a dataset
+    :param records: a list of all location records, records are stored as
+        dictionaries
+    :param latitude_key: key to access the latitude field in a record
+    :param longitude_key: key to access the longitude field in a record
+    :return: SpatialIndex over records
+    """
+    with _index_cache_lock:
+        index = _index_cache.get(dataset_key)
+        if index is not None and index.record_count == len(records):
+            _index_cache.move_to_end(dataset_key)
+            return index
+
+    logger.debug('Building spatial index for ' + str(dataset_key))
+    index = SpatialIndex.from_records(records, latitude_key, longitude_key)
+    with _index_cache_lock:
+        _index_cache[dataset_key] = index
+        while len(_index_cache) > MAX_CACHED_INDEXES:
+            _index_cache.popitem(last=False)
+    return index
+
+
+def clear_index_cache():
+    """
+    Forget every cached index
+
+    :return: None
+    """
+    with _index_cache_lock:
+        _index_cache.clear()
+
+
+def _to_unit_vector(coordinates):
+    """
+    Convert (latitude, longitude) into a point on the unit sphere. Euclidean
+    distance between these points grows with great-circle distance, so the
+    tree can work in plain 3D space.
+
+    :param coordinates: tuple (latitude, longitude) in degrees
+    :return: tuple (x, y, z)
+    """
+    latitude, longitude = map(math.radians, coordinates)
+    cos_latitude = math.cos(latitude)
+    return (cos_latitude * math.cos(longitude),
+            cos_latitude * math.sin(longitude),
+            math.sin(latitude))
+
+
+class SpatialIndex(object):
+
+    """
+    Static KD-tree of record positions keyed by their coordinates.
+
+    @property: record_count ::= number of records the index was built from
+    @property: unindexed_positions ::= positions of records that had no
+        coordinates and therefore are not in the tree
+
+    """
+
+    def __init__(self, points, record_count=None):
+        """
+        :param points: list of (position, (latitude, longitude)) tuples
+        :param record_count: number of records the points were taken from
+        """
+        self.record_count = len(points) if record_count is None \
+            else record_count
+        indexed = set()
+        # the tree is stored in flat lists; node i splits on _axes[i] and its
+        # children are _left[i] and _right[i] (-1 when absent)
+        self._vectors = []
+        self._positions = []
+        self._axes = []
+        self._left = []
+        self._right = []
+        nodes = [(_to_unit_vector(coordinates), position)
+                 for position, coordinates in points]
+        for _, position in nodes:
+            indexed.add(position)
+        self._root = self._build(nodes, 0)
+        self.unindexed_positions = [
+            position for position in range(self.record_count)
+            if position not in indexed
+        ]
+
+    @classmethod
+    def from_records(cls, records, latitude_key, longitude_key):
+        """
+        Build an index over every record that has coordinates
+
+        :param records: a list of location records stored as dictionaries
+        :param latitude_key: key to access the latitude field in a record
+        :param longitude_key: key to access the longitude field in a record
+        :return: SpatialIndex
+        """
+        points = []
+        for position, record in enumerate(records):
+            coordinates = geo_utils.get_record_coordinates(
+                record, latitude_key, longitude_key
+            )
+            if coordinates is not None:
+                points.append((position, coordinates))
+        return cls(points, record_count=len(records))
+
+    def __len__(self):
+        return len(self._positions)
+
+    def _build(self, nodes, depth):
+        """
+        Recursively build the subtree for nodes and return its node id
+
+        :param nodes: list of (vector, position) tuples
+        :param depth: depth of the subtree root
+        :return: id of the subtree root, -1 if nodes is empty
+        """
+        if not nodes:
+            return -1
+        axis = depth % 3
+        nodes.sort(key=lambda node: node[0][axis])
+        median = len(nodes) // 2
+        node_id = len(self._vectors)
+        self._vectors.append(nodes[median][0])
+        self._positions.append(nodes[median][1])
+        self._axes.append(axis)
+        self._left.append(-1)
+        self._right.append(-1)
+        self._left[node_id] = self._build(nodes[:median], depth + 1)
+        self._right[node_id] = self._build(nodes[median + 1:], depth + 1)
+        return node_id
+
+    def nearest(self, origin, k):
+        """
+        Find the k indexed records closest to origin
+
+        :param origin: tuple (latitude, longitude)
+        :param k: number of records to return
+        :return: list of record positions, closest first
+        """
+        if k <= 0 or self._root == -1:
+            return []
+        target = _to_unit_vector(origin)
+        # max-heap (by negated distance) of the best k found so far
+        best = []
+        # each entry is (node id, squared distance from target to the node's
+        # splitting plane); far branches are skipped once that bound is
+        # worse than the k-th best distance
+        stack = [(self._root, 0.0)]
+        vectors, axes = self._vectors, self._axes
+        lefts, rights, positions = self._left, self._right, self._positions
+        while stack:
+            node_id, bound = stack.pop()
+            if len(best) == k and bound >= -best[0][0]:
+                continue
+            vector = vectors[node_id]
+            distance = ((vector[0] - target[0]) ** 2 +
+                        (vector[1] - target[1]) ** 2 +
+                        (vector[2] - target[2]) ** 2)
+            if len(best) < k:
+                heapq.heappush(best, (-distance, positions[node_id]))
+            elif distance < -best[0][0]:
+                heapq.heapreplace(best, (-distance, positions[node_id]))
+
+            axis = axes[node_id]
+            difference = target[axis] - vector[axis]
+            near, far = (lefts[node_id], rights[node_id]) \
+                if difference < 0 else (rights[node_id], lefts[node_id])
+            # push far first so the near side is explored first
+            if far != -1:
+                stack.append((far, max(bound, difference * difference)))
+            if near != -1:
+                stack.append((near, bound))
+        return [position for _, position in sorted(best, reverse=True)]
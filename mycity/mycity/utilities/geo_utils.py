@@ -0,0 +1,197 @@
+"""
+Utility functions for working with latitude/longitude coordinates
+
+"""
+
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+EARTH_RADIUS_METERS = 6371008.8
+
+
+def great_circle_distance(origin, destination):
+    """
+    Calculates the great-circle (straight-line) distance between two points
+    using the haversine formula
+
+    :param origin: tuple (latitude, longitude) in degrees
+    :param destination: tuple (latitude, longitude) in degrees
+    :return: distance between the two points in meters
+    """
+    origin_lat, origin_lon = map(math.radians, origin)
+    dest_lat, dest_lon = map(math.radians, destination)
+    half_chord = (
+        math.sin((dest_lat - origin_lat) / 2) ** 2 +
+        math.cos(origin_lat) * math.cos(dest_lat) *
+        math.sin((dest_lon - origin_lon) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(half_chord))
+
+
+def get_record_coordinates(record, latitude_key, longitude_key):
+    """
+    Reads the coordinates stored in a record
+
+    :param record: dictionary representing one location record
+    :param latitude_key: key to access the latitude field in a record
+    :param longitude_key: key to access the longitude field in a record
+    :return: tuple (latitude, longitude) or None if the record has no
+        usable coordinates
+    """
+    try:
+        latitude = float(record[latitude_key])
+        longitude = float(record[longitude_key])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return latitude, longitude
+
+
+def rank_records_by_distance(origin, records, latitude_key, longitude_key):
+    """
+    Orders records by their great-circle distance from the origin.
+
+    :param origin: tuple (latitude, longitude) of the starting point
+    :param records: a list of all location records, records are stored as
+        dictionaries
+    :param latitude_key: key to access the latitude field in a record
+    :param longitude_key: key to access the longitude field in a record
+    :return: tuple (ranked, unranked) where ranked is the list of records
+        with coordinates, closest first, and unranked is the list of records
+        without coordinates in their original order
+    """
+    logger.debug('origin: ' + str(origin) +
+                 ', count(records): ' + str(len(records)))
+    distances = []
+    unranked = []
+    for position, record in enumerate(records):
+        coordinates = get_record_coordinates(record, latitude_key,
+                                             longitude_key)
+        if coordinates is None:
+            unranked.append(record)
+        else:
+            distances.append(
+                (great_circle_distance(origin, coordinates), position)
+            )
+    distances.sort()
+    return [records[position] for _, position in distances], unranked
+
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+_GEOHASH_VALUES = {char: value for value, char in enumerate(GEOHASH_ALPHABET)}
+
+
+def encode_geohash(latitude, longitude, precision):
+    """
+    Encode a point as a geohash: a string naming the cell of a grid over the
+    earth that contains the point. Longer geohashes name smaller cells.
+
+    :param latitude: latitude in degrees
+    :param longitude: longitude in degrees
+    :param precision: number of characters in the geohash
+    :return: geohash string
+    """
+    latitude_range = [-90.0, 90.0]
+    longitude_range = [-180.0, 180.0]
+    chars = []
+    value = 0
+    bits = 0
+    even_bit = True
+    while len(chars) < precision:
+        # bits alternate between longitude and latitude, starting with
+        # longitude
+        if even_bit:
+            coordinate, interval = longitude, longitude_range
+        else:
+            coordinate, interval = latitude, latitude_range
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even_bit = not even_bit
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            value = 0
+            bits = 0
+    return "".join(chars)
+
+
+def decode_geohash(geohash):
+    """
+    Find the bounds of the cell a geohash names
+
+    :param geohash: geohash string
+    :return: tuple (south, west, north, east) in degrees
+    """
+    latitude_range = [-90.0, 90.0]
+    longitude_range = [-180.0, 180.0]
+    even_bit = True
+    for char in geohash:
+        value = _GEOHASH_VALUES[char]
+        for shift in range(4, -1, -1):
+            interval = longitude_range if even_bit else latitude_range
+            middle = (interval[0] + interval[1]) / 2
+            if (value >> shift) & 1:
+                interval[0] = middle
+            else:
+                interval[1] = middle
+            even_bit = not even_bit
+    return (latitude_range[0], longitude_range[0],
+            latitude_range[1], longitude_range[1])
+
+
+def get_geohash_center(geohash):
+    """
+    :param geohash: geohash string
+    :return: tuple (latitude, longitude) of the center of the cell
+    """
+    south, west, north, east = decode_geohash(geohash)
+    return (south + north) / 2, (west + east) / 2
+
+
+def geohash_to_int(geohash):
+    """
+    Pack a geohash into an integer (5 bits per character). Geohashes of the
+    same precision keep their order, so packed cells can be binary searched.
+
+    :param geohash: geohash string
+    :return: integer
+    """
+    value = 0
+    for char in geohash:
+        value = (value << 5) | _GEOHASH_VALUES[char]
+    return value
+
+
+def get_geohashes_in_bounds(south, west, north, east, precision):
+    """
+    List the geohash cells covering a bounding box
+
+    :param south: southern edge of the box in degrees
+    :param west: western edge of the box in degrees
+    :param north: northern edge of the box in degrees
+    :param east: eastern edge of the box in degrees
+    :param precision: number of characters in each geohash
+    :return: sorted list of geohash strings
+    """
+    cell_south, cell_west, cell_north, cell_east = \
+        decode_geohash(encode_geohash(south, west, precision))
+    cell_height = cell_north - cell_south
+    cell_width = cell_east - cell_west
+    geohashes = set()
+    latitude = cell_south + cell_height / 2
+    while latitude - cell_height / 2 <= north:
+        longitude = cell_west + cell_width / 2
+        while longitude - cell_width / 2 <= east:
+            geohashes.add(encode_geohash(latitude, longitude, precision))
+            longitude += cell_width
+        latitude += cell_height
+    return sorted(geohashes)
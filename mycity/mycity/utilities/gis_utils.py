@@ -6,13 +6,30 @@ kill any computation that takes longer than 3 secs.
 
 """
 
-from arcgis.features import FeatureLayer
+import concurrent.futures
+import requests
+import mycity.utilities.concurrency_utils as concurrency_utils
+import mycity.utilities.http_utils as http_utils
 import mycity.utilities.google_maps_utils as g_maps_utils
+from mycity.intents.custom_errors import BadAPIResponse
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+# query that selects every feature of a layer
+ALL_FEATURES = "1=1"
+ALL_FIELDS = "*"
+# WKID of WGS 84 latitude/longitude, used for geometry in and out of queries
+WGS84_WKID = "4326"
+# features asked for per page; servers cap this at their maxRecordCount
+DEFAULT_PAGE_SIZE = 1000
+MAX_CONCURRENT_PAGES = 4
+# ways iter_features can split a layer into pages
+PAGINATE_BY_OFFSET = "offset"
+PAGINATE_BY_OBJECT_ID = "object_id"
+
+
 def get_closest_feature(origin, feature_address_index, 
                         feature_type, error_message, features):
     """
@@ -66,24 +83,264 @@ def get_closest_feature(origin, feature_address_index,
     return closest_location_info
 
 
-def get_features_from_feature_server(url, query):
+def get_features_from_feature_server(url, query, out_fields=ALL_FIELDS,
+                                     origin=None, distance=None):
     """
     Given a url to a City of Boston Feature Server, return a list
-    of Features (for example, parking lots that are not full)
+    of Features (for example, parking lots that are not full). Layers with
+    more features than the server returns at once are fetched page by page.
     
     :param url: url for Feature Server
     :param query: query to select features (example: "Spaces > 0")
+    :param out_fields: fields to return for each feature, either "*" or a
+        list of field names
+    :param origin: optional tuple (latitude, longitude); only features
+        within distance meters of it are returned
+    :param distance: search radius around origin in meters
     :return: list of all features returned from the query
     """
 
     logger.debug('url received: ' + url + ', query received: ' + query)
 
-    features = []
-    f = FeatureLayer(url = url)
-    feature_set = f.query(where = query)
-    for feature in feature_set:
-        features.append(feature.as_dict)
-    return features
+    return list(iter_features(url, where=query, out_fields=out_fields,
+                              origin=origin, distance=distance))
+
+
+def query_feature_server(url, where=ALL_FEATURES, out_fields=ALL_FIELDS,
+                         return_geometry=True, origin=None, distance=None):
+    """
+    Query a FeatureServer layer through the ArcGIS REST API with a single
+    request. The server returns at most its maxRecordCount features; use
+    iter_features to get every feature of larger layers.
+
+    :param url: url of the FeatureServer layer, e.g.
+        ".../FeatureServer/0"
+    :param where: SQL where clause selecting the features
+    :param out_fields: fields to return for each feature, either "*" or a
+        list of field names
+    :param return_geometry: False to leave out each feature's geometry,
+        which is usually most of the response
+    :param origin: optional tuple (latitude, longitude); when given, only
+        features within distance meters of it are returned, which the
+        server works out with its spatial index
+    :param distance: search radius around origin in meters
+    :return: list of features, each a dictionary with the feature's
+        "attributes" and, if requested, its "geometry" in latitude and
+        longitude
+    :raises: BadAPIResponse if the FeatureServer can't run the query
+    """
+    logger.debug(
+        'url received: ' + url +
+        ', where received: ' + where +
+        ', out_fields received: ' + str(out_fields)
+    )
+    feature_set = _query(url, _get_query_parameters(
+        where, out_fields, return_geometry, origin, distance
+    ))
+    if feature_set.get("exceededTransferLimit"):
+        logger.warning('FeatureServer returned only part of the features')
+    return feature_set.get("features", [])
+
+
+def iter_features(url, where=ALL_FEATURES, out_fields=ALL_FIELDS,
+                  return_geometry=True, origin=None, distance=None,
+                  page_size=DEFAULT_PAGE_SIZE, partition=PAGINATE_BY_OFFSET,
+                  max_workers=MAX_CONCURRENT_PAGES):
+    """
+    Lazily fetch every feature matching a query, page by page, with up to
+    max_workers pages requested at once. Features are yielded as their page
+    arrives, so the whole layer never has to be held in memory.
+
+    Two ways of splitting the layer into pages are supported:
+        PAGINATE_BY_OFFSET asks for the first page and, if the server says
+            there are more, counts the features and requests every page
+            with resultOffset/resultRecordCount, ordered by object ID so
+            the pages neither overlap nor leave features out. Small layers
+            take a single request.
+        PAGINATE_BY_OBJECT_ID asks for the object IDs of every matching
+            feature (which the server doesn't truncate) and requests ranges
+            of page_size IDs. Use it for very large layers, or servers where
+            deep offsets are slow or unsupported.
+
+    :param url: url of the FeatureServer layer
+    :param where: SQL where clause selecting the features
+    :param out_fields: fields to return for each feature, either "*" or a
+        list of field names
+    :param return_geometry: False to leave out each feature's geometry
+    :param origin: optional tuple (latitude, longitude) to only return
+        features within distance meters of
+    :param distance: search radius around origin in meters
+    :param page_size: features to ask for per request. With
+        PAGINATE_BY_OFFSET it shrinks to the server's limit if that is
+        smaller.
+    :param partition: PAGINATE_BY_OFFSET or PAGINATE_BY_OBJECT_ID
+    :param max_workers: maximum number of pages requested at once
+    :return: generator of features, as returned by query_feature_server
+    :raises: BadAPIResponse if the FeatureServer can't run a query
+    """
+    logger.debug(
+        'url received: ' + url +
+        ', where received: ' + where +
+        ', partition received: ' + partition
+    )
+    url_parameters = _get_query_parameters(where, out_fields, return_geometry,
+                                           origin, distance)
+    if partition == PAGINATE_BY_OBJECT_ID:
+        pages = _get_object_id_pages(url, url_parameters, where, page_size)
+    else:
+        first_page = _query(url, dict(url_parameters, resultOffset=0,
+                                      resultRecordCount=page_size))
+        features = first_page.get("features", [])
+        if not first_page.get("exceededTransferLimit") or not features:
+            yield from features
+            return
+        # the server caps pages at its maxRecordCount, which may be less
+        # than we asked for
+        page_size = len(features)
+        count = _query(url, dict(url_parameters,
+                                 returnCountOnly="true")).get("count", 0)
+        logger.debug('count(features): ' + str(count))
+        object_id_field = _get_object_id_field(first_page)
+        if object_id_field is None:
+            logger.warning('FeatureServer has no object ID field, pages may '
+                           'overlap')
+            yield from features
+            first_offset = page_size
+        else:
+            # the server only keeps the order of the features from page to
+            # page when asked to sort them, so the unsorted first page is
+            # asked for again
+            url_parameters["orderByFields"] = object_id_field
+            first_offset = 0
+        pages = (dict(url_parameters, resultOffset=offset,
+                      resultRecordCount=page_size)
+                 for offset in range(first_offset, count, page_size))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        feature_sets = concurrency_utils.bounded_map(
+            executor, lambda page: _query(url, page), pages, max_workers
+        )
+        for feature_set in feature_sets:
+            if partition == PAGINATE_BY_OBJECT_ID and \
+                    feature_set.get("exceededTransferLimit"):
+                logger.warning('FeatureServer truncated a page, use a '
+                               'smaller page_size')
+            yield from feature_set.get("features", [])
+
+
+def _get_object_id_field(feature_set):
+    """
+    :param feature_set: decoded JSON response to a query
+    :return: name of the layer's object ID field, None if the response
+        doesn't say
+    """
+    if feature_set.get("objectIdFieldName"):
+        return feature_set["objectIdFieldName"]
+    for field in feature_set.get("fields", []):
+        if field.get("type") == "esriFieldTypeOID":
+            return field.get("name")
+    return None
+
+
+def _get_object_id_pages(url, url_parameters, where, page_size):
+    """
+    Split the features matching a query into ranges of object IDs
+
+    :param url: url of the FeatureServer layer
+    :param url_parameters: query parameters from _get_query_parameters
+    :param where: SQL where clause of the query
+    :param page_size: maximum number of object IDs per range
+    :return: generator of query parameters, one per range
+    """
+    id_set = _query(url, dict(url_parameters, returnIdsOnly="true"))
+    object_id_field = id_set.get("objectIdFieldName")
+    object_ids = sorted(id_set.get("objectIds") or [])
+    logger.debug('count(object ids): ' + str(len(object_ids)))
+    for object_id_range in concurrency_utils.chunks(object_ids, page_size):
+        yield dict(url_parameters, where="({}) AND {} >= {} AND {} <= {}"
+                   .format(where, object_id_field, object_id_range[0],
+                           object_id_field, object_id_range[-1]))
+
+
+def _get_query_parameters(where, out_fields, return_geometry, origin,
+                          distance):
+    """
+    Build the url parameters of a FeatureServer query, see
+    query_feature_server
+
+    :return: dictionary of url parameters
+    """
+    if not isinstance(out_fields, str):
+        out_fields = ",".join(out_fields)
+    url_parameters = {
+        "where": where,
+        "outFields": out_fields,
+        "returnGeometry": "true" if return_geometry else "false",
+        "outSR": WGS84_WKID,
+        "f": "json"
+    }
+    if origin is not None:
+        latitude, longitude = origin
+        url_parameters.update({
+            "geometry": "{},{}".format(longitude, latitude),
+            "geometryType": "esriGeometryPoint",
+            "inSR": WGS84_WKID,
+            "spatialRel": "esriSpatialRelIntersects",
+            "distance": distance or 0,
+            "units": "esriSRUnit_Meter"
+        })
+    return url_parameters
+
+
+def _query(url, url_parameters):
+    """
+    Send one query to a FeatureServer layer
+
+    :param url: url of the FeatureServer layer
+    :param url_parameters: dictionary of url parameters
+    :return: decoded JSON response
+    :raises: BadAPIResponse if the FeatureServer can't run the query
+    """
+    try:
+        response = http_utils.get(url.rstrip("/") + "/query",
+                                  params=url_parameters)
+    except requests.exceptions.RequestException as e:
+        logger.error('Could not query FeatureServer: {}'.format(e))
+        raise BadAPIResponse
+    if response.status_code != requests.codes.ok:
+        logger.error('Could not query FeatureServer, got response: {}'
+                     .format(response.status_code))
+        raise BadAPIResponse
+
+    try:
+        feature_set = response.json()
+    except ValueError:
+        logger.error('FeatureServer response is not JSON')
+        raise BadAPIResponse
+    # the REST API reports errors in the body of a 200 response
+    if "error" in feature_set:
+        logger.error('FeatureServer error: {}'.format(feature_set["error"]))
+        raise BadAPIResponse
+    return feature_set
+
+
+def feature_to_record(feature, latitude_key, longitude_key):
+    """
+    Flatten a feature into a record dictionary like the rows of a csv
+    dataset: the feature's attributes plus, for point features, its
+    coordinates under latitude_key and longitude_key
+
+    :param feature: dictionary with "attributes" and optionally "geometry"
+    :param latitude_key: key to store the latitude under
+    :param longitude_key: key to store the longitude under
+    :return: record dictionary
+    """
+    record = dict(feature.get("attributes", {}))
+    geometry = feature.get("geometry") or {}
+    if "x" in geometry and "y" in geometry:
+        record.setdefault(latitude_key, geometry["y"])
+        record.setdefault(longitude_key, geometry["x"])
+    return record
 
 
 def _get_dest_addresses_from_features(feature_address_index, features):
@@ -3,8 +3,15 @@ Utility functions using Google Maps to find driving distances/times from
 an origin address to a list of destinations
 """
 
+import concurrent.futures
 import os
+import threading
+import urllib.parse
 import requests
+import mycity.utilities.address_utils as address_utils
+import mycity.utilities.cache_utils as cache_utils
+import mycity.utilities.http_utils as http_utils
+import mycity.utilities.invocation_utils as invocation_utils
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,16 +19,40 @@ logger = logging.getLogger(__name__)
 
 GOOGLE_MAPS_API_KEY = os.environ['GOOGLE_MAPS_API_KEY']
 GOOGLE_MAPS_URL = "https://maps.googleapis.com/maps/api/distancematrix/json"
+GOOGLE_GEOCODING_URL = "https://maps.googleapis.com/maps/api/geocode/json"
 DRIVING_DISTANCE_VALUE_KEY = "Driving distance"
 DRIVING_DISTANCE_TEXT_KEY = "Driving distance text"
 DRIVING_TIME_VALUE_KEY = "Driving time"
 DRIVING_TIME_TEXT_KEY = "Driving time text"
 
+# limits on a single Distance Matrix request
+MAX_MATRIX_ORIGINS = 25
+MAX_MATRIX_DESTINATIONS = 25
+MAX_MATRIX_ELEMENTS = 100
+# Google rejects Distance Matrix urls longer than this
+MAX_URL_LENGTH = 8192
+# Distance Matrix requests in flight at once for a single origin
+MAX_CONCURRENT_REQUESTS = 8
+
+# the thread pool lives in module scope so threads are reused across warm
+# Lambda invocations
+_executor = None
+_pool_lock = threading.Lock()
+
+# Distance Matrix elements are cached per (origin, destination) pair. Driving
+# times depend on traffic, so entries expire after a few minutes.
+DRIVING_INFO_CACHE_SIZE = 4096
+DRIVING_INFO_CACHE_TTL = 10 * 60
+_driving_info_cache = cache_utils.LRUCache(DRIVING_INFO_CACHE_SIZE,
+                                           DRIVING_INFO_CACHE_TTL)
+
 
 def _get_driving_info(origin, location_type, destinations):
     """
     Gets the driving info from the provided origin address to each destination
-    address
+    address. Destinations that aren't cached are split into chunks that fit
+    in one Distance Matrix request, and the chunks are requested
+    concurrently.
     
     :param origin: string containing driving starting address
     :param location_type: string that identifies type of location we're getting 
@@ -30,7 +61,9 @@ def _get_driving_info(origin, location_type, destinations):
         driving info from origin address)
     :return: list of dictionaries representing driving data for each
         destination address with address, distance, and driving time
-        from origin address
+        from origin address, in the order of destinations. None if the
+        request for any chunk failed, as the closest destination could be
+        among the ones left out.
     """
     logger.debug(
         'origin received: ' + str(origin) +
@@ -39,22 +72,254 @@ def _get_driving_info(origin, location_type, destinations):
         ', count(destinations): ' + str(len(destinations))
     )
 
+    cached_elements = _get_cached_driving_elements(origin, destinations)
+    missing_destinations = [destination for destination in destinations
+                            if destination not in cached_elements]
+    logger.debug('count(cached destinations): ' + str(len(cached_elements)))
+    if not missing_destinations:
+        return combine_driving_data_with_destinations(
+            None,
+            location_type,
+            destinations,
+            cached_elements
+        )
+
+    chunks = _chunk_destinations(origin, missing_destinations)
+    logger.debug('count(chunks): ' + str(len(chunks)))
+    if len(chunks) == 1:
+        chunk_results = [_get_driving_elements(origin, chunks[0])]
+    else:
+        chunk_results = list(_get_executor().map(
+            invocation_utils.bind(
+                lambda chunk: _get_driving_elements(origin, chunk)
+            ),
+            chunks
+        ))
+    if any(elements is None for elements in chunk_results):
+        # the chunks that did succeed are cached for the next request
+        logger.warning('Driving info is missing for some destinations')
+        return None
+
+    elements = dict(cached_elements)
+    for chunk_elements in chunk_results:
+        elements.update(chunk_elements)
+    return combine_driving_data_with_destinations(
+        None,
+        location_type,
+        destinations,
+        elements
+    )
+
+
+def _get_driving_elements(origin, destinations):
+    """
+    Request driving info from origin to one chunk of destinations and cache
+    the elements of the response
+
+    :param origin: string containing driving starting address
+    :param destinations: list of destination address strings that fits in
+        one Distance Matrix request
+    :return: dictionary mapping each destination to its Distance Matrix
+        element, or None if the request failed
+    """
     url_parameters = _setup_google_maps_query_params(origin, destinations)
-    driving_directions_url = GOOGLE_MAPS_URL
-    driving_infos = None
-    with requests.Session() as session:
-        response = session.get(driving_directions_url, params=url_parameters)
-        if response.status_code == requests.codes.ok:
-            all_driving_data = response.json()
-            driving_infos = combine_driving_data_with_destinations(
-                all_driving_data,
-                location_type,
-                destinations
-            )
-        else:
-            logger.warning("Failed to get driving directions")
+    try:
+        response = http_utils.get(GOOGLE_MAPS_URL, params=url_parameters)
+    except requests.exceptions.RequestException:
+        logger.warning("Failed to get driving directions")
+        return None
+    if response.status_code != requests.codes.ok:
+        logger.warning("Failed to get driving directions")
+        return None
+    try:
+        all_driving_data = response.json()
+    except ValueError:
+        # e.g. an HTML error page from a proxy
+        logger.warning("Failed to get driving directions")
+        return None
+    _cache_driving_elements(origin, destinations, all_driving_data)
+    try:
+        elements = all_driving_data["rows"][0]["elements"]
+    except (KeyError, IndexError, TypeError):
+        logger.warning("Failed to get driving directions")
+        return None
+    return dict(zip(destinations, elements))
+
+
+def _chunk_destinations(origin, destinations):
+    """
+    Split destinations into chunks that each fit in one Distance Matrix
+    request: at most MAX_MATRIX_DESTINATIONS destinations and a url no
+    longer than MAX_URL_LENGTH
+
+    :param origin: string containing driving starting address
+    :param destinations: list of destination address strings
+    :return: list of lists of destination address strings, in order
+    """
+    base_length = len(GOOGLE_MAPS_URL) + 1 + len(urllib.parse.urlencode(
+        _setup_google_maps_query_params(origin, [])
+    ))
+    # destinations are joined with "|", which is encoded as "%7C"
+    separator_length = 3
+    chunks = []
+    chunk = []
+    length = base_length
+    for destination in destinations:
+        destination_length = len(urllib.parse.quote_plus(destination))
+        if chunk and (len(chunk) == MAX_MATRIX_DESTINATIONS or
+                      length + separator_length + destination_length
+                      > MAX_URL_LENGTH):
+            chunks.append(chunk)
+            chunk = []
+            length = base_length
+        if chunk:
+            length += separator_length
+        chunk.append(destination)
+        length += destination_length
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def _get_executor():
+    """
+    Return the thread pool that runs chunked Distance Matrix requests
+
+    :return: concurrent.futures.ThreadPoolExecutor
+    """
+    global _executor
+    if _executor is None:
+        with _pool_lock:
+            if _executor is None:
+                _executor = concurrent.futures.ThreadPoolExecutor(
+                    MAX_CONCURRENT_REQUESTS
+                )
+    return _executor
+
+
+def get_driving_matrix(origins, location_type, destinations):
+    """
+    Gets the driving info from each origin address to each destination
+    address with a single Distance Matrix request. The caller must keep the
+    request within MAX_MATRIX_ORIGINS, MAX_MATRIX_DESTINATIONS and
+    MAX_MATRIX_ELEMENTS. Results are not cached.
+
+    :param origins: list of driving starting address strings
+    :param location_type: string that identifies type of location we're
+        getting directions to
+    :param destinations: list of destination address strings
+    :return: list with, for each origin, a list of dictionaries representing
+        driving data for each destination address (see _get_driving_info),
+        or None if the request failed
+    """
+    logger.debug(
+        'count(origins): ' + str(len(origins)) +
+        ', count(destinations): ' + str(len(destinations))
+    )
+    url_parameters = _setup_google_maps_query_params("|".join(origins),
+                                                     destinations)
+    try:
+        response = http_utils.get(GOOGLE_MAPS_URL, params=url_parameters)
+    except requests.exceptions.RequestException:
+        logger.warning("Failed to get driving directions")
+        return None
+    if response.status_code != requests.codes.ok:
+        logger.warning("Failed to get driving directions")
+        return None
+    try:
+        all_driving_data = response.json()
+    except ValueError:
+        # e.g. an HTML error page from a proxy
+        logger.warning("Failed to get driving directions")
+        return None
+    return [
+        combine_driving_data_with_destinations(all_driving_data,
+                                               location_type,
+                                               destinations,
+                                               row=row)
+        for row in range(len(origins))
+    ]
+
+
+def get_driving_info_cache_stats():
+    """
+    Return hit/miss counters for the driving info cache. Every destination
+    looked up counts as one hit or miss.
+
+    :return: dictionary with hits, misses, evictions and size
+    """
+    return _driving_info_cache.stats()
+
+
+def _driving_cache_key(origin, destination):
+    return (address_utils.canonicalize_address(origin),
+            address_utils.canonicalize_address(destination))
+
+
+def _get_cached_driving_elements(origin, destinations):
+    """
+    Look up cached Distance Matrix elements from origin to each destination
+
+    :param origin: string containing driving starting address
+    :param destinations: list of destination address strings
+    :return: dictionary mapping destination to its cached element
+    """
+    cached_elements = {}
+    for destination in destinations:
+        element = _driving_info_cache.get(
+            _driving_cache_key(origin, destination)
+        )
+        if element is not None:
+            cached_elements[destination] = element
+    return cached_elements
 
-    return driving_infos
+
+def _cache_driving_elements(origin, destinations, all_driving_data):
+    """
+    Store the elements of a Distance Matrix response that have usable
+    driving data
+
+    :param origin: string containing driving starting address
+    :param destinations: destinations the response was requested for
+    :param all_driving_data: JSON blob returned from Google Maps query
+    :return: None
+    """
+    try:
+        elements = all_driving_data["rows"][0]["elements"]
+    except (KeyError, IndexError, TypeError):
+        return
+    for (element, destination) in zip(elements, destinations):
+        if "distance" in element and "duration" in element:
+            _driving_info_cache.set(_driving_cache_key(origin, destination),
+                                    element)
+
+
+def geocode_address(address):
+    """
+    Looks up the latitude and longitude of an address
+
+    :param address: string containing the address to geocode
+    :return: tuple (latitude, longitude) or None if the address could not be
+        geocoded
+    """
+    logger.debug('address received: ' + str(address))
+
+    url_parameters = {"address": address, "key": GOOGLE_MAPS_API_KEY}
+    try:
+        response = http_utils.get(GOOGLE_GEOCODING_URL, params=url_parameters)
+    except requests.exceptions.RequestException:
+        logger.warning("Failed to geocode address")
+        return None
+    if response.status_code != requests.codes.ok:
+        logger.warning("Failed to geocode address")
+        return None
+
+    try:
+        location = response.json()["results"][0]["geometry"]["location"]
+        return location["lat"], location["lng"]
+    except (KeyError, IndexError, ValueError):
+        logger.debug("Could not parse geocoding response")
+        return None
 
 
 def _setup_google_maps_query_params(origin, destinations):
@@ -79,17 +344,24 @@ def _setup_google_maps_query_params(origin, destinations):
 def combine_driving_data_with_destinations(
         all_driving_data,
         location_type,
-        destinations
+        destinations,
+        cached_elements=None,
+        row=0
 ):
     """
     Retrieve data from Google Maps query into dictionary with data stored as
     key, value pairs (our keys being the constants defined at beginning
     of file) and append
     
-    :param all_driving_data: JSON blob returned from Google Maps query
+    :param all_driving_data: JSON blob returned from Google Maps query, or
+        None if every destination was cached
     :param location_type: string that identifies type of location
         we're driving to
     :param destinations: list of strings representing destination addresses
+    :param cached_elements: optional dictionary mapping destinations to
+        cached Distance Matrix elements. all_driving_data only holds
+        elements for the destinations that are not in it
+    :param row: which origin's row of all_driving_data to use
     :return: list of dictionaries representing driving data for
         each address
     """
@@ -100,33 +372,37 @@ def combine_driving_data_with_destinations(
         ', count(destinations): ' + str(len(destinations))
     )
 
-    driving_infos = []
+    cached_elements = cached_elements or {}
     try:
-        driving_data_row = all_driving_data["rows"][0]
-        for (driving_data, address) in zip(
-                driving_data_row["elements"],
-                destinations
-        ):
-            try:
-                driving_info = {
-                    DRIVING_DISTANCE_VALUE_KEY:
-                        driving_data["distance"]["value"],
-                    DRIVING_DISTANCE_TEXT_KEY:
-                        driving_data["distance"]["text"],
-                    DRIVING_TIME_VALUE_KEY:
-                        driving_data["duration"]["value"],
-                    DRIVING_TIME_TEXT_KEY:
-                        driving_data["duration"]["text"],
-                    location_type: address}
-                driving_infos.append(driving_info)
-            except KeyError:
-                logger.debug(
-                    "Could not parse driving info {}".format(driving_data)
-                )
-    except KeyError:
-        pass
-    finally:
-        return driving_infos
+        fresh_elements = iter(all_driving_data["rows"][row]["elements"])
+    except (KeyError, IndexError, TypeError):
+        fresh_elements = iter(())
+
+    driving_infos = []
+    for address in destinations:
+        if address in cached_elements:
+            driving_data = cached_elements[address]
+        else:
+            driving_data = next(fresh_elements, None)
+            if driving_data is None:
+                continue
+        try:
+            driving_info = {
+                DRIVING_DISTANCE_VALUE_KEY:
+                    driving_data["distance"]["value"],
+                DRIVING_DISTANCE_TEXT_KEY:
+                    driving_data["distance"]["text"],
+                DRIVING_TIME_VALUE_KEY:
+                    driving_data["duration"]["value"],
+                DRIVING_TIME_TEXT_KEY:
+                    driving_data["duration"]["text"],
+                location_type: address}
+            driving_infos.append(driving_info)
+        except KeyError:
+            logger.debug(
+                "Could not parse driving info {}".format(driving_data)
+            )
+    return driving_infos
 
 
 def parse_closest_location_info(location_type, closest_location_info):
@@ -0,0 +1,488 @@
+"""
+HTTP client shared by every upstream request of the skill.
+
+Connections are pooled per host in module scope, so warm Lambda invocations
+reuse open keep-alive connections instead of looking the host up and
+negotiating TLS again. Responses are gzip compressed when the server
+supports it, every request gets a timeout from the invocation deadline (see
+deadline_utils) and each host has a limit on requests in flight, so a burst
+of parallel work never opens more connections than its pool keeps.
+
+Data that changes on the scale of minutes or more can be fetched with
+get_cached, which answers from a stale-while-revalidate cache. Requests on
+the critical path can be hedged with get_hedged, and hosts listed in
+CIRCUIT_BREAKER_HOSTS fail fast with CircuitOpen while they are down.
+For offline tests and benchmarks, set_host_override sends the requests for
+an upstream host to a local stand-in server instead.
+
+"""
+
+import collections
+import concurrent.futures
+import threading
+import time
+import urllib.parse
+import requests
+import mycity.utilities.cache_utils as cache_utils
+import mycity.utilities.concurrency_utils as concurrency_utils
+import mycity.utilities.deadline_utils as deadline_utils
+import mycity.utilities.invocation_utils as invocation_utils
+import mycity.utilities.metrics_utils as metrics_utils
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# connections kept open to a host, which is also the number of requests
+# that may be in flight to it, unless HOST_LIMITS says otherwise
+MAX_CONNECTIONS_PER_HOST = 8
+# hosts whose connection pools are kept open
+MAX_POOLED_HOSTS = 16
+# requests in flight to a host, for hosts that differ from the default
+HOST_LIMITS = {}
+DEFAULT_HEADERS = {'Accept-Encoding': 'gzip, deflate'}
+# responses kept by get_cached
+RESPONSE_CACHE_SIZE = 64
+# hosts that get a circuit breaker, see concurrency_utils.CircuitBreaker
+CIRCUIT_BREAKER_HOSTS = {'recollect.net'}
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_AFTER = 30
+# get_hedged sends a second request once the first has taken longer than
+# this percentile of the host's recent response times
+HEDGE_PERCENTILE = 0.9
+# response times kept per host, and how many are needed before the
+# percentile is used instead of DEFAULT_HEDGE_DELAY
+LATENCY_WINDOW = 100
+LATENCY_MIN_SAMPLES = 10
+DEFAULT_HEDGE_DELAY = 1.0
+# never hedge sooner than this, so fast hosts don't get every request twice
+MIN_HEDGE_DELAY = 0.05
+HEDGE_MAX_WORKERS = 8
+
+_session = None
+_host_semaphores = {}
+_circuit_breakers = {}
+_latencies = {}
+_host_overrides = {}
+_hedge_executor = None
+_lock = threading.Lock()
+_response_cache = cache_utils.StaleWhileRevalidateCache(RESPONSE_CACHE_SIZE)
+
+
+class CircuitOpen(requests.exceptions.ConnectionError):
+    """
+    Raised instead of sending a request to a host whose circuit is open
+    """
+    pass
+
+
+def get_session():
+    """
+    Return the requests.Session holding the connection pools
+
+    :return: requests.Session
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=MAX_POOLED_HOSTS,
+                    pool_maxsize=MAX_CONNECTIONS_PER_HOST
+                )
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update(DEFAULT_HEADERS)
+                _session = session
+    return _session
+
+
+def get_host_limit(host):
+    """
+    :param host: host name, with the port if it is not the default one
+    :return: number of requests that may be in flight to host at once
+    """
+    return HOST_LIMITS.get(host, MAX_CONNECTIONS_PER_HOST)
+
+
+def _get_host_semaphore(host):
+    """
+    :param host: host name, with the port if it is not the default one
+    :return: semaphore limiting the requests in flight to host
+    """
+    semaphore = _host_semaphores.get(host)
+    if semaphore is None:
+        with _lock:
+            semaphore = _host_semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(get_host_limit(host))
+                _host_semaphores[host] = semaphore
+    return semaphore
+
+
+def set_host_override(host, base_url):
+    """
+    Send every request for host to base_url instead, keeping its path and
+    query. Limits, circuit breakers and response times still belong to host.
+
+    :param host: host name as it appears in request urls
+    :param base_url: scheme and host to use instead, e.g.
+        "http://127.0.0.1:8080", None to remove the override
+    :return: None
+    """
+    with _lock:
+        if base_url is None:
+            _host_overrides.pop(host.lower(), None)
+        else:
+            _host_overrides[host.lower()] = urllib.parse.urlsplit(base_url)
+
+
+def clear_host_overrides():
+    """
+    Remove every override set with set_host_override
+
+    :return: None
+    """
+    with _lock:
+        _host_overrides.clear()
+
+
+def _override_host(url):
+    """
+    :param url: url to request
+    :return: url with its scheme and host replaced if its host has an
+        override
+    """
+    parts = urllib.parse.urlsplit(url)
+    override = _host_overrides.get(parts.netloc.lower())
+    if override is None:
+        return url
+    return urllib.parse.urlunsplit(
+        (override.scheme, override.netloc) + tuple(parts[2:])
+    )
+
+
+def get_circuit_breaker(host):
+    """
+    :param host: host name, with the port if it is not the default one
+    :return: concurrency_utils.CircuitBreaker of host, None if host is not
+        in CIRCUIT_BREAKER_HOSTS
+    """
+    if host not in CIRCUIT_BREAKER_HOSTS:
+        return None
+    breaker = _circuit_breakers.get(host)
+    if breaker is None:
+        with _lock:
+            breaker = _circuit_breakers.get(host)
+            if breaker is None:
+                breaker = concurrency_utils.CircuitBreaker(
+                    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_AFTER
+                )
+                _circuit_breakers[host] = breaker
+    return breaker
+
+
+def _record_latency(host, seconds):
+    with _lock:
+        latencies = _latencies.get(host)
+        if latencies is None:
+            latencies = collections.deque(maxlen=LATENCY_WINDOW)
+            _latencies[host] = latencies
+        latencies.append(seconds)
+
+
+def get_latency_percentile(host, percentile):
+    """
+    :param host: host name, with the port if it is not the default one
+    :param percentile: fraction between 0 and 1, e.g. 0.9
+    :return: seconds within which that fraction of the host's recent
+        responses arrived, None if there are fewer than LATENCY_MIN_SAMPLES
+    """
+    with _lock:
+        latencies = sorted(_latencies.get(host, ()))
+    if len(latencies) < LATENCY_MIN_SAMPLES:
+        return None
+    return latencies[min(len(latencies) - 1,
+                         int(percentile * len(latencies)))]
+
+
+def get_hedge_delay(host):
+    """
+    :param host: host name, with the port if it is not the default one
+    :return: seconds get_hedged waits for a response from host before
+        sending a second request
+    """
+    delay = get_latency_percentile(host, HEDGE_PERCENTILE)
+    if delay is None:
+        return DEFAULT_HEDGE_DELAY
+    return max(MIN_HEDGE_DELAY, delay)
+
+
+def request(method, url, **kwargs):
+    """
+    Send a request over the shared connection pools. Callers wait for a
+    free slot if the host already has as many requests in flight as its
+    limit allows. Connection errors and 5xx responses count as failures for
+    the host's circuit breaker, if it has one, and so do timeouts, unless
+    the deadline left the request less than the full timeout: a host is not
+    down for failing to answer in the last moments of an invocation. Every
+    request sent is recorded in metrics_utils.
+
+    :param method: HTTP method, e.g. "GET"
+    :param url: url to request
+    :param kwargs: arguments for requests.Session.request. The timeout
+        defaults to what is left of the invocation deadline
+    :return: requests.Response
+    :raises: deadline_utils.DeadlineExceeded if the deadline passes before
+        the request could be sent, CircuitOpen if the host's circuit is
+        open, requests.exceptions.RequestException if the request failed
+    """
+    host = urllib.parse.urlsplit(url).netloc.lower()
+    semaphore = _get_host_semaphore(host)
+    if not semaphore.acquire(
+            timeout=deadline_utils.get_current_deadline().remaining()):
+        logger.warning('Deadline passed waiting for a connection to ' + host)
+        raise deadline_utils.DeadlineExceeded('Deadline passed')
+    try:
+        full_timeout = kwargs.get('timeout')
+        if full_timeout is None:
+            full_timeout = deadline_utils.DEFAULT_TIMEOUT
+            kwargs['timeout'] = deadline_utils.get_timeout(full_timeout)
+        breaker = get_circuit_breaker(host)
+        if breaker is not None and not breaker.allow():
+            raise CircuitOpen('Circuit to {} is open'.format(host))
+        start = time.monotonic()
+        try:
+            response = get_session().request(method, _override_host(url),
+                                             **kwargs)
+        except requests.exceptions.Timeout:
+            metrics_utils.record_request(host, time.monotonic() - start)
+            if breaker is not None:
+                if kwargs['timeout'] < full_timeout:
+                    breaker.record_cancelled()
+                else:
+                    breaker.record_failure()
+            raise
+        except requests.exceptions.RequestException:
+            metrics_utils.record_request(host, time.monotonic() - start)
+            if breaker is not None:
+                breaker.record_failure()
+            raise
+        except BaseException:
+            metrics_utils.record_request(host, time.monotonic() - start)
+            if breaker is not None:
+                breaker.record_cancelled()
+            raise
+        seconds = time.monotonic() - start
+        _record_latency(host, seconds)
+        metrics_utils.record_request(
+            host, seconds, response.status_code,
+            _response_size(response, kwargs.get('stream', False))
+        )
+        if breaker is not None:
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+        return response
+    finally:
+        semaphore.release()
+
+
+def _response_size(response, stream=False):
+    """
+    :param response: requests.Response
+    :param stream: True if the body has not been read yet
+    :return: bytes of the response body as sent, from its Content-Length
+        header, else the length of the body already read. 0 if the header
+        is missing from a streamed response, whose body is left unread
+    """
+    try:
+        return int(response.headers['Content-Length'])
+    except (KeyError, TypeError, ValueError):
+        pass
+    if stream:
+        return 0
+    return len(response.content or b'')
+
+
+def get(url, params=None, **kwargs):
+    """
+    Send a GET request, see request
+
+    :param url: url to request
+    :param params: dictionary of url parameters
+    :return: requests.Response
+    """
+    return request('GET', url, params=params, **kwargs)
+
+
+def post(url, data=None, json=None, **kwargs):
+    """
+    Send a POST request, see request
+
+    :param url: url to request
+    :param data: body of the request
+    :param json: object sent as the JSON body of the request
+    :return: requests.Response
+    """
+    return request('POST', url, data=data, json=json, **kwargs)
+
+
+def _get_hedge_executor():
+    global _hedge_executor
+    with _lock:
+        if _hedge_executor is None:
+            _hedge_executor = concurrent.futures.ThreadPoolExecutor(
+                HEDGE_MAX_WORKERS
+            )
+        return _hedge_executor
+
+
+def _close_when_done(future):
+    """
+    Close the response of a request nobody waits for any more, so its
+    connection goes back to the pool
+    """
+    def close_response(done):
+        if not done.cancelled() and done.exception() is None:
+            done.result().close()
+    future.add_done_callback(close_response)
+
+
+def get_hedged(url, params=None, **kwargs):
+    """
+    Send a GET request, and an identical second one if the first has not
+    been answered within get_hedge_delay, i.e. about the 90th percentile of
+    the host's response times. Whichever response arrives first is
+    returned. Only use this for idempotent requests.
+
+    :param url: url to request
+    :param params: dictionary of url parameters
+    :param kwargs: arguments for request
+    :return: requests.Response
+    :raises: see request
+    """
+    host = urllib.parse.urlsplit(url).netloc.lower()
+    deadline = deadline_utils.get_current_deadline()
+    delay = get_hedge_delay(host)
+    executor = _get_hedge_executor()
+    first = invocation_utils.submit(executor, get, url, params, **kwargs)
+    done, _ = concurrent.futures.wait([first], timeout=delay)
+    remaining = deadline.remaining()
+    if done or (remaining is not None and remaining <= delay):
+        return deadline.wait(first)
+
+    logger.debug('Hedging request to ' + host + ' after ' + str(delay) + 's')
+    metrics_utils.record_retry(host)
+    pending = [first, invocation_utils.submit(executor, get, url, params,
+                                              **kwargs)]
+    error = None
+    while pending:
+        done, _ = concurrent.futures.wait(
+            pending, timeout=deadline.remaining(),
+            return_when=concurrent.futures.FIRST_COMPLETED
+        )
+        if not done:
+            for future in pending:
+                _close_when_done(future)
+            raise deadline_utils.DeadlineExceeded('Deadline passed')
+        for future in done:
+            pending.remove(future)
+            if future.exception() is None:
+                for other in pending:
+                    _close_when_done(other)
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+def get_text(response):
+    """
+    :param response: requests.Response
+    :return: body of the response as a string
+    """
+    return response.text
+
+
+def get_json(response):
+    """
+    :param response: requests.Response
+    :return: body of the response parsed as JSON
+    :raises: ValueError if the body is not JSON
+    """
+    return response.json()
+
+
+def get_cached(url, fresh_for, stale_for, params=None, parse=get_text,
+               **kwargs):
+    """
+    Send a GET request unless a recent enough response to the same request
+    is cached, and return its parsed body. See
+    cache_utils.StaleWhileRevalidateCache: a body younger than fresh_for
+    seconds is returned as is, one up to stale_for seconds older than that
+    is returned right away while it is fetched again in the background.
+    Concurrent identical requests that miss the cache share one request.
+    Only the bodies of 200 responses are cached. A body is shared between
+    callers, so a parsed one must not be modified.
+
+    :param url: url to request
+    :param fresh_for: seconds a body is used without fetching it again
+    :param stale_for: seconds after fresh_for that a body is still used
+        while it is fetched again
+    :param params: dictionary of url parameters
+    :param parse: function turning the response into the value cached, e.g.
+        get_text or get_json
+    :param kwargs: arguments for request. They are not part of the cache key
+    :return: value parse returned for the response
+    :raises: requests.exceptions.HTTPError if the response is not a 200
+    """
+    key = (url, tuple(sorted((params or {}).items())), parse)
+
+    def load():
+        response = get(url, params=params, **kwargs)
+        if response.status_code != requests.codes.ok:
+            raise requests.exceptions.HTTPError(
+                '{} response from {}'.format(response.status_code, url),
+                response=response
+            )
+        return parse(response)
+
+    return _response_cache.get(key, load, fresh_for, stale_for)
+
+
+def get_cache_stats():
+    """
+    Return the counters of the get_cached response cache
+
+    :return: dictionary with hits, stale_hits, misses, refresh_failures,
+        shared_loads and size
+    """
+    return _response_cache.stats()
+
+
+def clear_cache():
+    """
+    Forget every response cached by get_cached
+
+    :return: None
+    """
+    _response_cache.clear()
+
+
+def close():
+    """
+    Close every pooled connection and forget the per-host limits, circuit
+    breakers and response times
+
+    :return: None
+    """
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+        _host_semaphores.clear()
+        _circuit_breakers.clear()
+        _latencies.clear()
@@ -0,0 +1,83 @@
+"""
+State of the invocation being handled, such as its deadline and the metrics
+of its outbound calls.
+
+A host may handle several invocations at once, each on its own thread, so
+the state is kept per thread. Work an invocation hands to a thread pool has
+to be submitted with submit, or wrapped with bind, to run with the state of
+that invocation.
+
+"""
+
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+_state = threading.local()
+
+
+def _get_values():
+    values = getattr(_state, 'values', None)
+    if values is None:
+        values = {}
+        _state.values = values
+    return values
+
+
+def get_value(name, default=None):
+    """
+    :param name: name of a piece of invocation state, e.g. "deadline"
+    :param default: value returned if it isn't set
+    :return: the value set for the invocation running on this thread
+    """
+    return _get_values().get(name, default)
+
+
+def set_value(name, value):
+    """
+    Set a piece of state of the invocation running on this thread
+
+    :param name: name of the state
+    :param value: its value, None to remove it
+    :return: None
+    """
+    values = _get_values()
+    if value is None:
+        values.pop(name, None)
+    else:
+        values[name] = value
+
+
+def bind(function):
+    """
+    Wrap function to run with the state the current invocation has now,
+    whichever thread calls it
+
+    :param function: any function
+    :return: function taking the same arguments
+    """
+    values = dict(_get_values())
+
+    def bound(*args, **kwargs):
+        previous = getattr(_state, 'values', None)
+        _state.values = dict(values)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _state.values = previous
+
+    return bound
+
+
+def submit(executor, function, *args, **kwargs):
+    """
+    Submit function(*args, **kwargs) to executor, to run with the state of
+    the current invocation
+
+    :param executor: concurrent.futures.Executor
+    :param function: function to run
+    :return: concurrent.futures.Future
+    """
+    return executor.submit(bind(function), *args, **kwargs)
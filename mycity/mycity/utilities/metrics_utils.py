@@ -0,0 +1,286 @@
+"""
+Per-upstream metrics for the outbound calls of an invocation, written as
+CloudWatch Embedded Metric Format (EMF) log lines.
+
+http_utils records every request here. At the end of an invocation the
+platform entry point calls flush, which prints one JSON line per upstream
+called. CloudWatch turns those lines into metrics, with percentiles of the
+latency values, without any call to the CloudWatch API. The entry point
+starts each invocation with start_recording, which keeps its metrics apart
+as invocation state (see invocation_utils), so concurrent invocations each
+flush their own. Requests made outside any invocation are recorded in
+module scope and go out with the next flush.
+
+"""
+
+import json
+import sys
+import threading
+import time
+import mycity.utilities.invocation_utils as invocation_utils
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+NAMESPACE = 'BostonInfo'
+UPSTREAM_DIMENSION = 'Upstream'
+CACHE_DIMENSION = 'Cache'
+# names the metrics of each upstream host are reported under
+UPSTREAM_NAMES = {
+    'recollect.net': 'ReCollect',
+    'maps.googleapis.com': 'Google',
+    'data.boston.gov': 'CKAN',
+    'www.boston.gov': 'BostonGov',
+    'api.amazonalexa.com': 'AlexaDeviceAPI',
+    'hooks.slack.com': 'Slack'
+}
+# hosts ending in one of these are reported under its name
+UPSTREAM_DOMAINS = {'arcgis.com': 'ArcGIS'}
+# EMF takes at most 100 values per metric in one line
+MAX_VALUES_PER_METRIC = 100
+METRICS_STATE = 'metrics'
+# responses are counted per status class, e.g. Status4xx
+STATUS_CLASSES = ('2xx', '3xx', '4xx', '5xx')
+
+_last_cache_counts = {}
+_lock = threading.Lock()
+
+
+class _Recording(object):
+
+    """
+    Metrics recorded for one invocation, or outside of any
+
+    @property: upstreams ::= dictionary mapping upstream names to their
+        metrics
+    @property: caches ::= dictionary mapping cache names to their metrics
+
+    """
+
+    def __init__(self):
+        self.upstreams = {}
+        self.caches = {}
+        self.lock = threading.Lock()
+
+    def get_upstream(self, host):
+        name = get_upstream_name(host)
+        metrics = self.upstreams.get(name)
+        if metrics is None:
+            metrics = {'Latency': [], 'Requests': 0, 'Errors': 0,
+                       'Bytes': 0, 'Retries': 0}
+            for status_class in STATUS_CLASSES:
+                metrics['Status' + status_class] = 0
+            self.upstreams[name] = metrics
+        return metrics
+
+    def take(self):
+        """
+        :return: tuple (upstreams, caches) recorded so far, which are
+            forgotten
+        """
+        with self.lock:
+            taken = self.upstreams, self.caches
+            self.upstreams = {}
+            self.caches = {}
+        return taken
+
+
+_unattributed = _Recording()
+
+
+def start_recording():
+    """
+    Record the metrics of the invocation running on this thread, and of the
+    work it submits through invocation_utils, apart from any other
+
+    :return: None
+    """
+    invocation_utils.set_value(METRICS_STATE, _Recording())
+
+
+def _get_recording():
+    return invocation_utils.get_value(METRICS_STATE, _unattributed)
+
+
+def get_upstream_name(host):
+    """
+    :param host: host name of a request url
+    :return: name the host's metrics are reported under, the host itself
+        if it isn't a known upstream
+    """
+    host = host.lower().split(':')[0]
+    if host in UPSTREAM_NAMES:
+        return UPSTREAM_NAMES[host]
+    for domain, name in UPSTREAM_DOMAINS.items():
+        if host == domain or host.endswith('.' + domain):
+            return name
+    return host
+
+
+def record_request(host, seconds, status_code=None, size=0):
+    """
+    Record one request to an upstream
+
+    :param host: host name of the request url
+    :param seconds: time until the response arrived, or the request failed
+    :param status_code: status code of the response, None if there was no
+        response, which counts as an error. Responses are counted per
+        status class.
+    :param size: bytes in the response body
+    :return: None
+    """
+    recording = _get_recording()
+    with recording.lock:
+        metrics = recording.get_upstream(host)
+        metrics['Requests'] += 1
+        if len(metrics['Latency']) < MAX_VALUES_PER_METRIC:
+            metrics['Latency'].append(round(seconds * 1000, 1))
+        if status_code is None:
+            metrics['Errors'] += 1
+        else:
+            status_metric = 'Status{}xx'.format(status_code // 100)
+            if status_metric in metrics:
+                metrics[status_metric] += 1
+        metrics['Bytes'] += size
+
+
+def record_retry(host):
+    """
+    Record a repeated request to an upstream, e.g. a hedged request
+
+    :param host: host name of the request url
+    :return: None
+    """
+    recording = _get_recording()
+    with recording.lock:
+        recording.get_upstream(host)['Retries'] += 1
+
+
+def record_cache_stats(name, stats):
+    """
+    Record the counters of a cache that counts from the start of the
+    container, e.g. http_utils.get_cache_stats(). What they grew by since
+    the last call is reported; size is reported as it is.
+
+    :param name: name the cache's metrics are reported under
+    :param stats: dictionary of counters, and optionally size
+    :return: None
+    """
+    with _lock:
+        last = _last_cache_counts.get(name, {})
+        metrics = {}
+        for counter, value in stats.items():
+            if counter == 'size':
+                metrics['Size'] = value
+            else:
+                # counters start again from 0 when a cache is cleared
+                growth = value - last.get(counter, 0)
+                metrics[_metric_name(counter)] = growth if growth >= 0 \
+                    else value
+        _last_cache_counts[name] = dict(stats)
+    recording = _get_recording()
+    with recording.lock:
+        recording.caches[name] = metrics
+
+
+def _metric_name(counter):
+    """
+    :param counter: counter name, e.g. "stale_hits"
+    :return: metric name, e.g. "StaleHits"
+    """
+    return ''.join(word.capitalize() for word in counter.split('_'))
+
+
+def _unit(metric):
+    if metric == 'Latency':
+        return 'Milliseconds'
+    if metric == 'Bytes':
+        return 'Bytes'
+    return 'Count'
+
+
+def _emf_record(dimension, value, metrics, timestamp):
+    return dict({
+        '_aws': {
+            'Timestamp': timestamp,
+            'CloudWatchMetrics': [{
+                'Namespace': NAMESPACE,
+                'Dimensions': [[dimension]],
+                'Metrics': [{'Name': metric, 'Unit': _unit(metric)}
+                            for metric in sorted(metrics)]
+            }]
+        },
+        dimension: value
+    }, **metrics)
+
+
+def _merge_upstreams(upstreams, other):
+    """
+    Add the upstream metrics of other to upstreams
+
+    :return: None
+    """
+    for name, metrics in other.items():
+        merged = upstreams.get(name)
+        if merged is None:
+            upstreams[name] = metrics
+            continue
+        for metric, value in metrics.items():
+            merged[metric] += value
+        del merged['Latency'][MAX_VALUES_PER_METRIC:]
+
+
+def get_emf_records(timestamp=None):
+    """
+    Return the metrics the current invocation recorded since the last
+    flush, and those recorded outside of any invocation, as EMF records and
+    start recording anew
+
+    :param timestamp: milliseconds since the epoch, now if None
+    :return: list of dictionaries, one per upstream and cache
+    """
+    if timestamp is None:
+        timestamp = int(time.time() * 1000)
+    recording = _get_recording()
+    upstreams, caches = recording.take()
+    if recording is not _unattributed:
+        unattributed_upstreams, unattributed_caches = _unattributed.take()
+        _merge_upstreams(upstreams, unattributed_upstreams)
+        caches = dict(unattributed_caches, **caches)
+    records = [_emf_record(UPSTREAM_DIMENSION, name, metrics, timestamp)
+               for name, metrics in sorted(upstreams.items())]
+    records.extend(_emf_record(CACHE_DIMENSION, name, metrics, timestamp)
+                   for name, metrics in sorted(caches.items()))
+    return records
+
+
+def flush(stream=None):
+    """
+    Write the metrics recorded since the last flush as EMF lines. They go
+    to stdout, which Lambda sends to CloudWatch Logs, without the prefix
+    the log format would add.
+
+    :param stream: file to write to, sys.stdout if None
+    :return: number of lines written
+    """
+    stream = stream or sys.stdout
+    records = get_emf_records()
+    for record in records:
+        stream.write(json.dumps(record, separators=(',', ':')) + '\n')
+    stream.flush()
+    logger.debug('Flushed metrics for ' + str(len(records)) + ' upstreams '
+                 'and caches')
+    return len(records)
+
+
+def clear_metrics():
+    """
+    Forget everything recorded, including the cache counters seen so far
+
+    :return: None
+    """
+    _get_recording().take()
+    _unattributed.take()
+    with _lock:
+        _last_cache_counts.clear()
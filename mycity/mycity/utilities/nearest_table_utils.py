@@ -0,0 +1,270 @@
+"""
+Utility functions for precomputed nearest-location tables: compact binary
+files mapping each geohash cell of the city to the closest record from a
+Finder dataset. Tables are built offline when the Lambda bundle is packaged
+(see deploy_tools) so common answers need neither a dataset download nor a
+Distance Matrix request. Each cell also keeps the driving distance and time
+from its center to the record. A cell spans about 1.2 km by 0.6 km at
+precision 6, so those can be off by as much for an origin near its edge,
+and lookup describes them as estimates ("about 1.2 mi").
+
+File layout, all little-endian:
+    header: magic, format version, geohash precision, cell count,
+        length of the JSON block, build time (see HEADER)
+    JSON block: {"records": [...]} holding each distinct record
+    one column per cell field, in CELL_COLUMNS order, sorted by geohash
+
+"""
+
+import array
+import bisect
+import json
+import os
+import struct
+import sys
+import time
+import mycity.utilities.geo_utils as geo_utils
+import mycity.utilities.google_maps_utils as g_maps_utils
+import mycity.utilities.finder.DistanceProvider as distance_providers
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+MAGIC = b'MCNT'
+FORMAT_VERSION = 3
+HEADER = struct.Struct('<4sBBIId')
+# (name, array typecode) of each per-cell column
+CELL_COLUMNS = (
+    ('geohashes', 'Q'),
+    ('record_positions', 'H'),
+    ('distances', 'I'),
+    ('durations', 'I'),
+)
+# distance and duration of a cell whose driving info is not known
+UNKNOWN = 2 ** 32 - 1
+
+_tables = {}
+
+
+class NearestTable(object):
+
+    """
+    Closest record for every geohash cell of an area, with the driving
+    distance and time from the center of the cell to it.
+
+    @property: precision ::= length of the geohashes naming the cells
+    @property: records ::= list of distinct record dictionaries
+    @property: built_at ::= time (seconds since the epoch) the table was built
+
+    """
+
+    def __init__(self, precision, columns, records, built_at=None):
+        """
+        :param precision: length of the geohashes naming the cells
+        :param columns: dictionary mapping each name in CELL_COLUMNS to an
+            array of values, sorted by geohash
+        :param records: list of distinct record dictionaries
+        :param built_at: time the table was built, defaults to now
+        """
+        self.precision = precision
+        self.records = records
+        self.built_at = time.time() if built_at is None else built_at
+        self._columns = columns
+
+    def __len__(self):
+        return len(self._columns['geohashes'])
+
+    @classmethod
+    def from_closest_records(cls, precision, cells):
+        """
+        Build a table from the results of Finder.find_closest_records
+
+        :param precision: length of the geohashes naming the cells
+        :param cells: iterable of (geohash, closest record) tuples, where
+            closest record is a dictionary, or None if no record was found.
+            The driving distance and time values from google_maps_utils are
+            kept per cell, the other driving info keys are left out of the
+            table.
+        :return: NearestTable
+        """
+        driving_keys = (
+            g_maps_utils.DRIVING_DISTANCE_VALUE_KEY,
+            g_maps_utils.DRIVING_DISTANCE_TEXT_KEY,
+            g_maps_utils.DRIVING_TIME_VALUE_KEY,
+            g_maps_utils.DRIVING_TIME_TEXT_KEY
+        )
+        records, record_positions = [], {}
+        rows = []
+        for geohash, closest_record in cells:
+            if closest_record is None:
+                continue
+            record = {key: value for key, value in closest_record.items()
+                      if key not in driving_keys}
+            record = json.dumps(record, sort_keys=True)
+            if record not in record_positions:
+                record_positions[record] = len(records)
+                records.append(record)
+            rows.append((
+                geo_utils.geohash_to_int(geohash),
+                record_positions[record],
+                _get_driving_value(closest_record,
+                                   g_maps_utils.DRIVING_DISTANCE_VALUE_KEY),
+                _get_driving_value(closest_record,
+                                   g_maps_utils.DRIVING_TIME_VALUE_KEY)
+            ))
+        rows.sort()
+        columns = {
+            name: array.array(typecode, [row[column] for row in rows])
+            for column, (name, typecode) in enumerate(CELL_COLUMNS)
+        }
+        return cls(precision, columns, [json.loads(record)
+                                        for record in records])
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Load a table written by to_bytes
+
+        :param data: bytes of the table file
+        :return: NearestTable
+        :raises: ValueError if data is not a table in this format
+        """
+        if len(data) < HEADER.size:
+            raise ValueError('Truncated nearest table')
+        magic, version, precision, cell_count, json_length, built_at = \
+            HEADER.unpack_from(data)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError('Not a version {} nearest table'
+                             .format(FORMAT_VERSION))
+        offset = HEADER.size
+        blob = json.loads(data[offset:offset + json_length].decode('utf-8'))
+        offset += json_length
+        columns = {}
+        for name, typecode in CELL_COLUMNS:
+            column = array.array(typecode)
+            end = offset + column.itemsize * cell_count
+            if end > len(data):
+                raise ValueError('Truncated nearest table')
+            column.frombytes(data[offset:end])
+            if sys.byteorder == 'big':
+                column.byteswap()
+            columns[name] = column
+            offset = end
+        return cls(precision, columns, blob['records'], built_at=built_at)
+
+    def to_bytes(self):
+        """
+        :return: bytes of the table in the file format described above
+        """
+        blob = json.dumps({'records': self.records},
+                          separators=(',', ':')).encode('utf-8')
+        parts = [HEADER.pack(MAGIC, FORMAT_VERSION, self.precision, len(self),
+                             len(blob), self.built_at), blob]
+        for name, _ in CELL_COLUMNS:
+            column = self._columns[name]
+            if sys.byteorder == 'big':
+                column = array.array(column.typecode, column)
+                column.byteswap()
+            parts.append(column.tobytes())
+        return b''.join(parts)
+
+    def lookup(self, coordinates):
+        """
+        Find the closest record for the cell containing coordinates
+
+        :param coordinates: tuple (latitude, longitude)
+        :return: dictionary with the record's fields and, if the table has
+            them, the driving info keys from google_maps_utils for the
+            distance and time from the cell's center. None if the cell is
+            not in the table
+        """
+        geohash = geo_utils.encode_geohash(coordinates[0], coordinates[1],
+                                           self.precision)
+        key = geo_utils.geohash_to_int(geohash)
+        geohashes = self._columns['geohashes']
+        position = bisect.bisect_left(geohashes, key)
+        if position == len(geohashes) or geohashes[position] != key:
+            logger.debug('Cell not in nearest table: ' + geohash)
+            return None
+
+        record = dict(
+            self.records[self._columns['record_positions'][position]]
+        )
+        distance = self._columns['distances'][position]
+        duration = self._columns['durations'][position]
+        if distance != UNKNOWN and duration != UNKNOWN:
+            record.update({
+                g_maps_utils.DRIVING_DISTANCE_VALUE_KEY: distance,
+                g_maps_utils.DRIVING_DISTANCE_TEXT_KEY:
+                    distance_providers.format_distance(distance),
+                g_maps_utils.DRIVING_TIME_VALUE_KEY: duration,
+                g_maps_utils.DRIVING_TIME_TEXT_KEY:
+                    distance_providers.format_duration(duration)
+            })
+        return record
+
+
+def _get_driving_value(record, key):
+    """
+    :param record: closest record with driving info
+    :param key: DRIVING_DISTANCE_VALUE_KEY or DRIVING_TIME_VALUE_KEY
+    :return: the value as a column entry, UNKNOWN if it is missing
+    """
+    value = record.get(key)
+    if value is None:
+        return UNKNOWN
+    return min(int(value), UNKNOWN - 1)
+
+
+def write_table(path, table):
+    """
+    Write a table to path, replacing any existing file atomically
+
+    :param path: path of the table file
+    :param table: NearestTable
+    :return: None
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(table.to_bytes())
+    os.replace(temp_path, path)
+
+
+def read_table(path):
+    """
+    Read a table file
+
+    :param path: path of the table file
+    :return: NearestTable or None if the file is missing or invalid
+    """
+    try:
+        with open(path, 'rb') as f:
+            return NearestTable.from_bytes(f.read())
+    except (OSError, ValueError) as e:
+        logger.debug('Could not read nearest table {}: {}'.format(path, e))
+        return None
+
+
+def get_table(path):
+    """
+    Return the table at path, reading it only once per process
+
+    :param path: path of the table file
+    :return: NearestTable or None if the file is missing or invalid
+    """
+    if path not in _tables:
+        _tables[path] = read_table(path)
+    return _tables[path]
+
+
+def clear_tables():
+    """
+    Forget every table read by get_table
+
+    :return: None
+    """
+    _tables.clear()
@@ -0,0 +1,379 @@
+"""
+Utility functions that keep snapshots of remote datasets (like the open
+data csv files) in memory and under the temp directory, and revalidate them
+with conditional GETs so unchanged datasets are not downloaded again
+
+"""
+
+import codecs
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import requests
+import mycity.utilities.cache_utils as cache_utils
+import mycity.utilities.concurrency_utils as concurrency_utils
+import mycity.utilities.deadline_utils as deadline_utils
+import mycity.utilities.http_utils as http_utils
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# seconds a snapshot is used without asking the server whether it changed
+DEFAULT_MAX_AGE = 5 * 60
+# /tmp on Lambda, which survives for as long as the container does
+SNAPSHOT_DIR = os.path.join(tempfile.gettempdir(), 'mycity_snapshots')
+DEFAULT_ENCODING = 'utf-8'
+CHARSET_REGEX = re.compile(r'charset\s*=\s*"?([\w.:-]+)', re.IGNORECASE)
+# a byte order mark at the start of a body settles its encoding, whatever
+# charset the server declared
+BOM_ENCODINGS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+_snapshots = {}
+_stats = {'hits': 0, 'stale_hits': 0, 'misses': 0}
+_revalidations = concurrency_utils.SingleFlight()
+_lock = threading.Lock()
+
+
+class Snapshot(object):
+
+    """
+    The last body fetched from a url and the validators needed to ask the
+    server whether it has changed since
+
+    @property: url ::= url the body was fetched from
+    @property: body ::= raw bytes of the response body
+    @property: etag ::= ETag header of the response, if any
+    @property: last_modified ::= Last-Modified header of the response, if any
+    @property: content_type ::= Content-Type header of the response, if any
+    @property: fetched_at ::= time (seconds since the epoch) the body was
+        last fetched or revalidated
+
+    """
+
+    def __init__(self, url, body, etag=None, last_modified=None,
+                 content_type=None, fetched_at=None):
+        self.url = url
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_type = content_type
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+        self._text = None
+        self._digest = None
+
+    @property
+    def version(self):
+        """
+        A string that changes whenever the body changes: the ETag when the
+        server sends one, otherwise a digest of the body
+        """
+        if self.etag:
+            return self.etag
+        return self.digest
+
+    @property
+    def digest(self):
+        """SHA-1 hex digest of the body."""
+        if self._digest is None:
+            self._digest = hashlib.sha1(self.body).hexdigest()
+        return self._digest
+
+    @property
+    def encoding(self):
+        """
+        Encoding of the body, taken from the declared charset or a UTF-8
+        byte order mark. The body is never sniffed.
+        """
+        return get_encoding(self.content_type, self.body)
+
+    @property
+    def text(self):
+        """The body decoded to a string."""
+        if self._text is None:
+            self._text = self.body.decode(self.encoding, errors='replace')
+        return self._text
+
+    def iter_lines(self):
+        """
+        Decode the body incrementally, one line at a time, so the whole
+        decoded text never has to be held in memory
+
+        :return: iterator over the lines of the body, line endings included
+        """
+        return io.TextIOWrapper(io.BytesIO(self.body), encoding=self.encoding,
+                                errors='replace', newline='')
+
+    def age(self):
+        """
+        :return: seconds since the snapshot was fetched or revalidated
+        """
+        return time.time() - self.fetched_at
+
+    def conditional_headers(self):
+        """
+        :return: dictionary of headers that ask the server to only send the
+            body if it changed
+        """
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def metadata(self):
+        return {
+            'url': self.url,
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'content_type': self.content_type,
+            'fetched_at': self.fetched_at,
+            'digest': self.digest
+        }
+
+
+def get_encoding(content_type, body):
+    """
+    Pick the encoding of a response body without running chardet over it:
+    the one its byte order mark names, else the declared charset if Python
+    knows it as a text encoding, else DEFAULT_ENCODING
+
+    :param content_type: Content-Type header value or None
+    :param body: raw bytes of the body
+    :return: name of a codec
+    """
+    for bom, encoding in BOM_ENCODINGS:
+        if body.startswith(bom):
+            return encoding
+    if content_type:
+        match = CHARSET_REGEX.search(content_type)
+        if match:
+            declared = _get_text_codec(match.group(1))
+            if declared is not None:
+                return declared
+            logger.warning('Unknown charset in {}, decoding as {}'
+                           .format(content_type, DEFAULT_ENCODING))
+    return DEFAULT_ENCODING
+
+
+def _get_text_codec(name):
+    """
+    :param name: name or alias of an encoding, e.g. "ISO-8859-1"
+    :return: the codec's canonical name, None if there is no such codec or
+        it does not decode bytes to text (e.g. "base64")
+    """
+    try:
+        name = codecs.lookup(name).name
+        # decoding nothing always succeeds, so decode a little
+        b'  '.decode(name, 'replace')
+    except (LookupError, ValueError):
+        return None
+    return name
+
+
+def get_snapshot(url, max_age=DEFAULT_MAX_AGE, stale_for=0):
+    """
+    Return the current snapshot of url. A snapshot younger than max_age is
+    returned without any request; an older one is revalidated with a
+    conditional GET and only downloaded again if it changed. A snapshot up
+    to stale_for seconds older than max_age is returned right away and
+    revalidated in the background. Concurrent calls that have to wait for
+    the server share one request. If the server can't be reached the last
+    snapshot is returned.
+
+    :param url: url of the dataset
+    :param max_age: seconds a snapshot is used without revalidating it
+    :param stale_for: seconds after max_age that a snapshot is still used
+        while it is revalidated in the background
+    :return: Snapshot or None if the dataset has never been fetched
+    """
+    logger.debug('url: ' + str(url) + ', max_age: ' + str(max_age))
+    snapshot = _snapshots.get(url)
+    if snapshot is None:
+        snapshot = _load_snapshot(url)
+        if snapshot is not None:
+            with _lock:
+                _snapshots[url] = snapshot
+    if snapshot is not None and snapshot.age() < max_age:
+        logger.debug('Using fresh snapshot of ' + url)
+        _count('hits')
+        return snapshot
+    if snapshot is not None and snapshot.age() < max_age + stale_for:
+        logger.debug('Using stale snapshot of ' + url + ' while revalidating')
+        _count('stale_hits')
+        cache_utils.refresh_in_background(('snapshot', url), _revalidate,
+                                          url, snapshot)
+        return snapshot
+    _count('misses')
+    return _revalidations.do(url, _revalidate, url, snapshot)
+
+
+def get_snapshot_stats():
+    """
+    Return how often get_snapshot answered with a fresh snapshot, with a
+    stale one while revalidating it, or had to wait for the server
+
+    :return: dictionary with hits, stale_hits and misses
+    """
+    with _lock:
+        return dict(_stats)
+
+
+def _count(counter):
+    with _lock:
+        _stats[counter] += 1
+
+
+def _revalidate(url, snapshot):
+    """
+    Ask the server whether the dataset changed since snapshot was fetched
+    and download it again if it did
+
+    :param url: url of the dataset
+    :param snapshot: last Snapshot of url, or None
+    :return: current Snapshot, or snapshot if the server can't be reached
+    """
+    headers = snapshot.conditional_headers() if snapshot else {}
+    body_changed = True
+    try:
+        response = http_utils.get(url, headers=headers)
+    except deadline_utils.DeadlineExceeded:
+        if snapshot is None:
+            raise
+        logger.warning('Out of time, using stale snapshot of ' + url)
+        return snapshot
+    except requests.exceptions.RequestException as e:
+        logger.warning('Could not fetch {}: {}'.format(url, e))
+        return snapshot
+
+    try:
+        if response.status_code == requests.codes.not_modified and snapshot:
+            logger.debug('Snapshot of ' + url + ' not modified')
+            snapshot.fetched_at = time.time()
+            body_changed = False
+        elif response.status_code == requests.codes.ok:
+            snapshot = Snapshot(
+                url,
+                response.content,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified'),
+                content_type=response.headers.get('Content-Type')
+            )
+        else:
+            logger.warning('Could not fetch {}, got response: {}'
+                           .format(url, response.status_code))
+            return snapshot
+    finally:
+        response.close()
+
+    with _lock:
+        _snapshots[url] = snapshot
+    _save_snapshot(snapshot, save_body=body_changed)
+    return snapshot
+
+
+def clear_snapshots(remove_files=False):
+    """
+    Forget every snapshot held in memory and reset the counters
+
+    :param remove_files: also delete the snapshots saved to disk
+    :return: None
+    """
+    with _lock:
+        urls = list(_snapshots)
+        _snapshots.clear()
+        for counter in _stats:
+            _stats[counter] = 0
+    if remove_files:
+        for url in urls:
+            for path in _snapshot_paths(url):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def _snapshot_paths(url):
+    """
+    :param url: url of the dataset
+    :return: tuple (body path, metadata path) for the snapshot of url
+    """
+    name = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    return (os.path.join(SNAPSHOT_DIR, name + '.body'),
+            os.path.join(SNAPSHOT_DIR, name + '.json'))
+
+
+def _save_snapshot(snapshot, save_body=True):
+    """
+    Write a snapshot to disk so a new process in the same container can
+    revalidate it instead of downloading it again. The metadata is replaced
+    before the body and carries the body's digest, so a reader that finds
+    the new metadata with the old body, or the other way around, sees they
+    don't match instead of revalidating the wrong body.
+
+    :param snapshot: Snapshot to save
+    :param save_body: False if only the metadata changed
+    :return: None
+    """
+    body_path, metadata_path = _snapshot_paths(snapshot.url)
+    files = [(metadata_path, 'w', json.dumps(snapshot.metadata()))]
+    if save_body:
+        files.append((body_path, 'wb', snapshot.body))
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        for path, mode, data in files:
+            # a file of its own per writer, so concurrent saves of the same
+            # snapshot never write into each other's temporary file
+            with tempfile.NamedTemporaryFile(mode, dir=SNAPSHOT_DIR,
+                                             delete=False) as f:
+                temp_path = f.name
+                f.write(data)
+            try:
+                os.replace(temp_path, path)
+            except OSError:
+                os.remove(temp_path)
+                raise
+    except OSError as e:
+        logger.warning('Could not save snapshot: {}'.format(e))
+
+
+def _load_snapshot(url):
+    """
+    Read the snapshot of url saved to disk, if any
+
+    :param url: url of the dataset
+    :return: Snapshot or None, also if the body is not the one the
+        metadata describes
+    """
+    body_path, metadata_path = _snapshot_paths(url)
+    try:
+        with open(metadata_path) as f:
+            metadata = json.load(f)
+        with open(body_path, 'rb') as f:
+            body = f.read()
+    except (OSError, ValueError):
+        return None
+    if metadata.get('url') != url:
+        return None
+    snapshot = Snapshot(
+        url,
+        body,
+        etag=metadata.get('etag'),
+        last_modified=metadata.get('last_modified'),
+        content_type=metadata.get('content_type'),
+        fetched_at=metadata.get('fetched_at')
+    )
+    if snapshot.digest != metadata.get('digest'):
+        logger.debug('Saved snapshot of ' + url + ' is incomplete')
+        return None
+    return snapshot
@@ -7,10 +7,28 @@ This module is the entry point for processing voice data from an Alexa device.
 import logging
 from mycity.mycity_request_data_model import MyCityRequestDataModel
 from mycity.mycity_controller import execute_request
+import mycity.intents.trash_intent as trash_intent
+import mycity.utilities.address_utils as address_utils
+import mycity.utilities.cache_utils as cache_utils
+import mycity.utilities.deadline_utils as deadline_utils
+import mycity.utilities.google_maps_utils as g_maps_utils
+import mycity.utilities.http_utils as http_utils
+import mycity.utilities.metrics_utils as metrics_utils
+import mycity.utilities.snapshot_utils as snapshot_utils
 
 logger = logging.getLogger(__name__)
 
 
+# seconds kept back from the invocation's remaining time to translate and
+# return the response
+RESPONSE_MARGIN = 0.2
+
+# seconds the response waits for background cache refreshes. A refresh that
+# takes longer is frozen with the container and started again on a later
+# stale hit, so the user never waits for it
+REFRESH_WAIT = 0.03
+
+
 def lambda_handler(event, context):
     """
     Translate the Amazon request to a MC_Request_Model and call main.
@@ -29,8 +47,62 @@ def lambda_handler(event, context):
     )
     logger.debug('Amazon request received: ' + str(event))
 
-    model = platform_to_mycity_request(event)
-    return mycity_response_to_platform(execute_request(model))
+    deadline_utils.set_current_deadline(get_invocation_deadline(context))
+    metrics_utils.start_recording()
+    try:
+        model = platform_to_mycity_request(event)
+        return mycity_response_to_platform(execute_request(model))
+    finally:
+        wait_for_refreshes()
+        flush_metrics()
+        deadline_utils.set_current_deadline(None)
+
+
+def wait_for_refreshes():
+    """
+    Give the cache entries being refreshed in the background a moment to
+    finish before Lambda freezes the container
+
+    :return: None
+    """
+    cache_utils.wait_for_refreshes(REFRESH_WAIT)
+
+
+def flush_metrics():
+    """
+    Write the metrics of this invocation's outbound calls and of the caches
+    in front of them to stdout as CloudWatch EMF lines
+
+    :return: None
+    """
+    metrics_utils.record_cache_stats('address_parses',
+                                     address_utils.get_parse_cache_stats())
+    metrics_utils.record_cache_stats('http', http_utils.get_cache_stats())
+    metrics_utils.record_cache_stats('snapshots',
+                                     snapshot_utils.get_snapshot_stats())
+    metrics_utils.record_cache_stats(
+        'driving_info', g_maps_utils.get_driving_info_cache_stats()
+    )
+    metrics_utils.record_cache_stats('recollect_addresses',
+                                     trash_intent.get_address_cache_stats())
+    place_zones, zone_schedules = trash_intent.get_schedule_cache_stats()
+    metrics_utils.record_cache_stats('trash_place_zones', place_zones)
+    metrics_utils.record_cache_stats('trash_zone_schedules', zone_schedules)
+    metrics_utils.flush()
+
+
+def get_invocation_deadline(context):
+    """
+    Derive the deadline every outbound call of this invocation shares from
+    the time AWS gives the function to run
+
+    :param context: a LambdaContext object containing runtime info
+    :return: Deadline, or None if the context doesn't tell the time left
+    """
+    if not hasattr(context, 'get_remaining_time_in_millis'):
+        return None
+    remaining = context.get_remaining_time_in_millis() / 1000
+    return deadline_utils.Deadline(max(0, remaining - RESPONSE_MARGIN))
 
 
 def platform_to_mycity_request(event):